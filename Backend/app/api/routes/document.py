@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Form, UploadFile, File, HTTPException, Depends, Query, Body
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 from uuid import UUID
 from sqlalchemy.orm import Session
 from urllib.parse import quote
@@ -31,7 +32,9 @@ async def upload_document(
 ):
     try:
         file_bytes = await file.read()
-        document = handle_document_upload(
+        # Run off the event loop so concurrent uploads overlap (and share embedding batches)
+        document = await run_in_threadpool(
+            handle_document_upload,
             db=db,
             file_bytes=file_bytes,
             filename=file.filename,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path, UploadFile, File, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, UploadFile, File, Body, BackgroundTasks
 from sqlalchemy.orm import Session
 from app.schemas.question import (
     QuestionCreate, QuestionUpdate, QuestionOut,
@@ -17,6 +17,7 @@ from app.crud.question import (
 )
 from app.database import get_db
 from app.services.storage import storage_service
+from app.services.question_context import precompute_question_contexts_background
 from app.models.question import Question, QuestionStatus
 from app.models.module import Module
 from uuid import UUID
@@ -228,10 +229,11 @@ def delete_question_image(question_id: UUID, db: Session = Depends(get_db)):
 
 # ✅ Approve a single question (change status from unreviewed to active)
 @router.put("/questions/{question_id}/approve", response_model=QuestionOut)
-def approve_question_api(question_id: UUID, db: Session = Depends(get_db)):
+def approve_question_api(question_id: UUID, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Approve a question by changing its status from 'unreviewed' to 'active'.
-    This makes the question visible to students.
+    This makes the question visible to students. Its retrieval context
+    (stem and MCQ options) is precomputed in the background.
 
     Args:
         question_id: UUID of the question to approve
@@ -247,18 +249,21 @@ def approve_question_api(question_id: UUID, db: Session = Depends(get_db)):
     approved_question = approve_question(db, question_id)
     if not approved_question:
         raise HTTPException(status_code=404, detail="Question not found")
+    background_tasks.add_task(precompute_question_contexts_background, [approved_question.id])
     return approved_question
 
 
 # ✅ Bulk approve multiple questions
 @router.post("/questions/bulk-approve", response_model=BulkApproveResponse)
 def bulk_approve_questions_api(
+    background_tasks: BackgroundTasks,
     request: BulkApproveRequest = Body(...),
     db: Session = Depends(get_db)
 ):
     """
     Approve multiple questions at once by changing their status to 'active'.
     Useful for batch approving AI-generated questions after review.
+    Retrieval contexts of the approved questions are precomputed in the background.
 
     Args:
         request: BulkApproveRequest with list of question IDs
@@ -272,6 +277,8 @@ def bulk_approve_questions_api(
         500: Database error
     """
     result = bulk_approve_questions(db, request.question_ids)
+    if result["approved_count"]:
+        background_tasks.add_task(precompute_question_contexts_background, list(request.question_ids))
 
     return BulkApproveResponse(
         approved_count=result["approved_count"],
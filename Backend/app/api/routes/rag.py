@@ -0,0 +1,24 @@
+"""
+RAG diagnostics API routes
+"""
+from fastapi import APIRouter
+
+from app.services.embedding_cache import query_embedding_cache
+from app.services.embedding_pipeline import shared_embedding_batcher
+from app.services.retrieval_cache import retrieval_cache
+
+router = APIRouter(prefix="/rag", tags=["RAG"])
+
+
+@router.get("/metrics")
+def get_rag_metrics():
+    """
+    Retrieval cache metrics for this worker
+
+    Counters are per process; with several uvicorn workers each reports its own.
+    """
+    return {
+        "query_embedding_cache": query_embedding_cache.get_stats(),
+        "embedding_batcher": shared_embedding_batcher.get_stats(),
+        "retrieval_cache": retrieval_cache.get_stats()
+    }
@@ -27,58 +27,6 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-# 🎯 Background task to generate feedback asynchronously
-def generate_feedback_background(student_id: str, module_id: str, attempt: int, answer_ids: List[str]):
-    """
-    Background task to generate AI feedback for multiple answers.
-    This runs asynchronously so the user doesn't have to wait.
-    """
-    from app.database import SessionLocal
-    from app.services.ai_feedback import AIFeedbackService
-    from app.models.student_answer import StudentAnswer
-
-    # Create a new database session for this background task
-    db = SessionLocal()
-
-    try:
-        logger.info(f"🎯 Starting background feedback generation for {len(answer_ids)} answers")
-        feedback_service = AIFeedbackService()
-
-        for answer_id in answer_ids:
-            try:
-                # Get the answer
-                answer = db.query(StudentAnswer).filter(StudentAnswer.id == answer_id).first()
-                if not answer:
-                    logger.error(f"❌ Answer {answer_id} not found")
-                    continue
-
-                logger.info(f"🔄 Generating feedback for question {answer.question_id}, answer {answer_id}")
-
-                # Generate feedback
-                feedback = feedback_service.generate_instant_feedback(
-                    db=db,
-                    student_answer=answer,
-                    question_id=str(answer.question_id),
-                    module_id=module_id
-                )
-
-                logger.info(f"✅ Feedback generated for question {answer.question_id}")
-
-            except Exception as e:
-                logger.error(f"❌ Failed to generate feedback for answer {answer_id}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-
-        logger.info(f"✅ Background feedback generation completed for attempt {attempt}")
-
-    except Exception as e:
-        logger.error(f"❌ Background feedback generation failed: {str(e)}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        db.close()
-
-
 # 🔍 Join module with access code
 @router.post("/join-module", response_model=ModuleOut)
 def join_module_with_code(
@@ -681,20 +629,21 @@ def submit_test(
 
     logger.info(f"✅ Test submitted - {len(answers)} questions")
 
-    # Trigger async feedback generation ONLY if not final attempt
+    # Queue feedback generation ONLY if not final attempt
     if attempt < max_attempts:
-        answer_ids = [str(answer.id) for answer in answers]
-        logger.info(f"🚀 Triggering background feedback generation for {len(answer_ids)} answers")
+        from app.core.config import FEEDBACK_WORKER_ENABLED
+        from app.services.feedback_queue import enqueue_feedback_jobs, start_inline_drain
 
-        # Add background task
-        if background_tasks:
-            background_tasks.add_task(
-                generate_feedback_background,
-                student_id=student_id,
-                module_id=str(module_id),
-                attempt=attempt,
-                answer_ids=answer_ids
-            )
+        # Durable jobs: feedback workers pick them up even if this instance goes away
+        queued = enqueue_feedback_jobs(db, answers)
+        logger.info(f"🚀 Queued {queued} feedback jobs for {len(answers)} answers")
+
+        # Deployments without a feedback worker process the queue in the web process
+        draining = bool(background_tasks) and start_inline_drain(
+            background_tasks, answer_ids=[answer.id for answer in answers]
+        )
+        if not draining and not FEEDBACK_WORKER_ENABLED:
+            logger.warning("⚠️ No inline drain slot and no feedback worker; jobs wait for the next drain")
 
         return {
             "success": True,
@@ -770,6 +719,24 @@ def get_submission_status(
     }
 
 
+# 📈 Cheap feedback progress for polling (aggregate counts only)
+@router.get("/modules/{module_id}/feedback-progress")
+def get_feedback_progress(
+    module_id: UUID,
+    student_id: str = Query(..., description="Student ID"),
+    attempt: int = Query(1, description="Attempt number", ge=1),
+    db: Session = Depends(get_db)
+):
+    """
+    Progress of feedback generation for one test attempt.
+    Returns answer, feedback and job counts without per-question details,
+    so the frontend can poll it frequently; use /feedback-status once complete.
+    """
+    from app.services.feedback_queue import get_attempt_feedback_progress
+
+    return get_attempt_feedback_progress(db, student_id, module_id, attempt)
+
+
 # 🔄 Check feedback generation status (for real-time updates)
 @router.get("/modules/{module_id}/feedback-status")
 def get_feedback_status(
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
 from sqlalchemy.orm import Session
 from uuid import UUID
 from typing import List, Optional
@@ -303,80 +303,103 @@ def generate_feedback_for_answer(
 @router.post("/modules/{module_id}/feedback/batch")
 def generate_batch_feedback(
     module_id: UUID,
+    background_tasks: BackgroundTasks,
     student_id: Optional[str] = Query(None, description="Filter by student ID"),
     attempt: int = Query(1, description="Attempt number", ge=1, le=5),
+    concurrency: Optional[int] = Query(None, description="Answers processed concurrently", ge=1, le=32),
+    group_by: Optional[str] = Query(
+        None,
+        description="Grade open-ended answers across students per question ('question') or per submission ('submission')",
+        pattern="^(question|submission)$"
+    ),
     db: Session = Depends(get_db)
 ):
     """
     Generate feedback for multiple student answers in a module (batch operation)
     Useful for generating feedback for all students after they submit
+
+    Answers that already have feedback are skipped. The rest are queued as one
+    batch and processed in the background with bounded concurrency (one
+    database session per job) when an inline drain slot is free, otherwise by
+    the feedback worker; the response's "processing" field says which.
+    With group_by=question (default FEEDBACK_BATCH_GROUP_BY), short and long
+    answers to the same question are graded several students per LLM call.
+    Returns immediately; poll the returned progress_url.
     """
+    from app.core.config import (
+        FEEDBACK_BATCH_PARALLELISM,
+        FEEDBACK_BATCH_GROUP_BY,
+        FEEDBACK_QUEUE_INLINE_DRAIN,
+        FEEDBACK_WORKER_ENABLED
+    )
+    from app.services.feedback_queue import start_feedback_batch, start_inline_drain
+
     try:
-        # Get all answers for this module
-        from app.models.student_answer import StudentAnswer
-        query = db.query(StudentAnswer).filter(
-            StudentAnswer.module_id == module_id,
-            StudentAnswer.attempt == attempt
+        batch = start_feedback_batch(db, module_id, attempt, student_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to queue batch feedback: {str(e)}"
         )
 
-        if student_id:
-            query = query.filter(StudentAnswer.student_id == student_id)
-
-        answers = query.all()
-
-        if not answers:
-            return {
-                "message": "No answers found",
-                "feedback_generated": 0,
-                "results": []
-            }
-
-        # Generate feedback for each answer
-        feedback_service = AIFeedbackService()
-        results = []
-        success_count = 0
-
-        for answer in answers:
-            try:
-                feedback = feedback_service.generate_instant_feedback(
-                    db=db,
-                    student_answer=answer,
-                    question_id=str(answer.question_id),
-                    module_id=str(answer.module_id)
-                )
-
-                results.append({
-                    "answer_id": str(answer.id),
-                    "student_id": answer.student_id,
-                    "question_id": str(answer.question_id),
-                    "success": not feedback.get("error", False),
-                    "feedback": feedback
-                })
-
-                if not feedback.get("error"):
-                    success_count += 1
-
-            except Exception as e:
-                results.append({
-                    "answer_id": str(answer.id),
-                    "student_id": answer.student_id,
-                    "question_id": str(answer.question_id),
-                    "success": False,
-                    "error": str(e)
-                })
-
+    if batch['batch_id'] is None:
         return {
-            "message": f"Generated feedback for {success_count}/{len(answers)} answers",
-            "feedback_generated": success_count,
-            "total_answers": len(answers),
-            "results": results
+            "message": "No answers need feedback" if batch['total_answers'] else "No answers found",
+            "batch_id": None,
+            "total_answers": batch['total_answers'],
+            "already_have_feedback": batch['already_have_feedback'],
+            "queued": 0
         }
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to generate batch feedback: {str(e)}"
-        )
+    draining = start_inline_drain(
+        background_tasks,
+        batch_id=batch['batch_id'],
+        parallelism=concurrency or FEEDBACK_BATCH_PARALLELISM,
+        group_by=group_by or FEEDBACK_BATCH_GROUP_BY
+    )
+
+    message = f"Queued feedback for {batch['queued']}/{batch['total_answers']} answers"
+    if not draining and not FEEDBACK_WORKER_ENABLED:
+        if FEEDBACK_QUEUE_INLINE_DRAIN:
+            message += (
+                "; another feedback run is in progress on this server and no feedback worker is configured, "
+                "so processing starts after it (or retry this request later)"
+            )
+        else:
+            message += (
+                "; in-process feedback is disabled and no feedback worker is configured, "
+                "so nothing will process it until scripts/feedback_worker.py runs"
+            )
+
+    return {
+        "message": message,
+        "batch_id": str(batch['batch_id']),
+        "total_answers": batch['total_answers'],
+        "already_have_feedback": batch['already_have_feedback'],
+        "queued": batch['queued'],
+        "group_by": group_by or FEEDBACK_BATCH_GROUP_BY,
+        # "inline": this server started processing the batch; "worker": left to the feedback
+        # worker; "waiting": neither (no free inline slot and no worker configured)
+        "processing": "inline" if draining else "worker" if FEEDBACK_WORKER_ENABLED else "waiting",
+        "progress_url": f"/api/student-answers/feedback/batches/{batch['batch_id']}"
+    }
+
+
+# Progress of a batch feedback request
+@router.get("/feedback/batches/{batch_id}")
+def get_batch_feedback_progress(
+    batch_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """
+    Job counts of a feedback batch (queued, running, succeeded, failed)
+    """
+    from app.services.feedback_queue import get_feedback_batch_progress
+
+    progress = get_feedback_batch_progress(db, batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return progress
 
 
 
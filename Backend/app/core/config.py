@@ -12,12 +12,132 @@ load_dotenv()
 
 # === Environment Variables ===
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-ada-002")
+# "openai" embeds through the OpenAI API; "local" embeds on CPU with a deterministic hashing
+# projection in a process pool (no network; self-hosted deployments and load tests)
+EMBED_PROVIDER = os.getenv("EMBED_PROVIDER", "openai").lower()
+EMBED_MODEL = os.getenv("EMBED_MODEL", "local-hashing-v1" if EMBED_PROVIDER == "local" else "text-embedding-ada-002")
+# Processes of the local provider's pool (0 embeds inline in the calling thread)
+EMBED_LOCAL_WORKERS = int(os.getenv("EMBED_LOCAL_WORKERS", "2"))
+# Target embedding size for models that accept a `dimensions` parameter (text-embedding-3-*);
+# unset uses the model's native size. Changing EMBED_MODEL/EMBED_DIMENSIONS takes effect
+# through scripts/reembed_generation.py, which builds and switches to a new generation
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS")) if os.getenv("EMBED_DIMENSIONS") else None
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4")
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 INDEX_DIR = os.getenv("INDEX_DIR", "index_store")
 PARSED_DOC_DIR = os.getenv("PARSED_DOC_DIR", "parsed_docs")
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+# === Vector Search Configuration ===
+# "pgvector" runs top-k inside Postgres using the HNSW index,
+# "numpy" scores in-process against a cached per-module float32 matrix
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "pgvector")
+PGVECTOR_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "100"))
+# Module- and document-scoped searches rank their rows exactly; unscoped searches use HNSW.
+# "relaxed_order"/"strict_order" enable pgvector >= 0.8 iterative scans for those, so the
+# generation filter cannot starve the top-k ("off" for older pgvector versions)
+PGVECTOR_ITERATIVE_SCAN = os.getenv("PGVECTOR_ITERATIVE_SCAN", "off").lower()
+# "int8" scores a quantized copy first and rescores the top candidates exactly, "none" scores float32 only
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")
+QUANTIZED_RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", "4"))
+# How long a worker trusts its cached copy of the active embedding generation
+ACTIVE_GENERATION_TTL_SECONDS = int(os.getenv("ACTIVE_GENERATION_TTL_SECONDS", "30"))
+
+# === Embedding Pipeline ===
+# Batches in flight per document and the account's OpenAI rate limits (requests / tokens per minute)
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_RPM_LIMIT = int(os.getenv("EMBED_RPM_LIMIT", "3000"))
+EMBED_TPM_LIMIT = int(os.getenv("EMBED_TPM_LIMIT", "1000000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+# Batches are packed by token count: OpenAI accepts up to 300k tokens / 2048 inputs per request
+# and 8191 tokens per input. The default budget stays well below the request cap so large
+# documents still spread over several concurrent requests
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "50000"))
+EMBED_MAX_BATCH_INPUTS = int(os.getenv("EMBED_MAX_BATCH_INPUTS", "2048"))
+EMBED_MAX_INPUT_TOKENS = int(os.getenv("EMBED_MAX_INPUT_TOKENS", "8191"))
+# Chunks from concurrent uploads are pooled for up to this long to fill batches (0 disables pooling)
+EMBED_COALESCE_WINDOW_MS = int(os.getenv("EMBED_COALESCE_WINDOW_MS", "200"))
+
+# Coarse-to-fine retrieval: modules with at least MIN retrievable documents first pick the
+# TOP documents by their centroid vector and only score those documents' chunks (0 disables)
+COARSE_RETRIEVAL_MIN_DOCUMENTS = int(os.getenv("COARSE_RETRIEVAL_MIN_DOCUMENTS", "20"))
+COARSE_RETRIEVAL_TOP_DOCUMENTS = int(os.getenv("COARSE_RETRIEVAL_TOP_DOCUMENTS", "8"))
+
+# === Lexical / Hybrid Retrieval ===
+# Defaults for rag_settings.retrieval_mode ("vector", "hybrid", "lexical_first") and its tuning:
+# hybrid ranks by weight * vector similarity + (1 - weight) * lexical coverage over the top
+# limit * factor candidates of each; lexical_first answers from BM25 alone (no embedding call)
+# when the best chunk covers at least the confidence share of the query terms
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "vector")
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "0.7"))
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+LEXICAL_CONFIDENCE_THRESHOLD = float(os.getenv("LEXICAL_CONFIDENCE_THRESHOLD", "0.8"))
+
+# === RAG Context Budget ===
+# Tokens of course material (including its instructions) per prompt, by question type;
+# chunks are packed by similarity per token and cut at sentence boundaries to fit.
+# rag_settings.max_context_tokens overrides per module; 0 sends max_context_chunks chunks in full
+RAG_CONTEXT_TOKENS_MCQ = int(os.getenv("RAG_CONTEXT_TOKENS_MCQ", "600"))
+RAG_CONTEXT_TOKENS_SHORT = int(os.getenv("RAG_CONTEXT_TOKENS_SHORT", "900"))
+RAG_CONTEXT_TOKENS_ESSAY = int(os.getenv("RAG_CONTEXT_TOKENS_ESSAY", "1400"))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1400"))
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1200"))
+# A chunk is only truncated into the remaining budget if at least this many tokens are left
+CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", "40"))
+
+# === Retrieval Result Cache ===
+# Per-worker LRU of assembled RAG contexts, keyed by module embedding version (0 disables)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+
+# === Feedback Memo ===
+# Reuse generated feedback for identical MCQ choices and normalized short answers
+# (same question, rubric, model and module documents) instead of calling the LLM again
+FEEDBACK_MEMO_ENABLED = os.getenv("FEEDBACK_MEMO_ENABLED", "true").lower() == "true"
+# Memo hits are counted in memory and written to feedback_memos at most this often per worker
+FEEDBACK_MEMO_HIT_FLUSH_SECONDS = int(os.getenv("FEEDBACK_MEMO_HIT_FLUSH_SECONDS", "60"))
+
+# === Feedback Job Queue ===
+# Submitted tests enqueue one feedback job per answer (feedback_jobs table), processed by
+# `python scripts/feedback_worker.py`. Set FEEDBACK_WORKER_ENABLED once a worker (or a periodic
+# `feedback_worker.py --once`) is deployed next to the app.
+# Until then FEEDBACK_QUEUE_INLINE_DRAIN defaults to on: after a submission or batch request the
+# web process drains those jobs in the background, then every other runnable job (retries past
+# their backoff, expired leases); jobs a worker already holds are skipped. Inline drains run at
+# most FEEDBACK_INLINE_DRAINS_MAX at a time per process; a busy slot leaves the jobs to the
+# running drain's sweep or the next one
+FEEDBACK_WORKER_ENABLED = os.getenv("FEEDBACK_WORKER_ENABLED", "false").lower() == "true"
+FEEDBACK_QUEUE_INLINE_DRAIN = os.getenv(
+    "FEEDBACK_QUEUE_INLINE_DRAIN", "false" if FEEDBACK_WORKER_ENABLED else "true"
+).lower() == "true"
+FEEDBACK_INLINE_DRAINS_MAX = int(os.getenv("FEEDBACK_INLINE_DRAINS_MAX", "1"))
+FEEDBACK_WORKER_PARALLELISM = int(os.getenv("FEEDBACK_WORKER_PARALLELISM", "4"))
+FEEDBACK_WORKER_POLL_SECONDS = float(os.getenv("FEEDBACK_WORKER_POLL_SECONDS", "2"))
+FEEDBACK_JOB_LEASE_SECONDS = int(os.getenv("FEEDBACK_JOB_LEASE_SECONDS", "300"))
+FEEDBACK_JOB_MAX_ATTEMPTS = int(os.getenv("FEEDBACK_JOB_MAX_ATTEMPTS", "3"))
+FEEDBACK_JOB_BACKOFF_SECONDS = float(os.getenv("FEEDBACK_JOB_BACKOFF_SECONDS", "30"))
+# Concurrent jobs when a teacher batch request (/student-answers/modules/{id}/feedback/batch) is drained in-process
+FEEDBACK_BATCH_PARALLELISM = int(os.getenv("FEEDBACK_BATCH_PARALLELISM", "8"))
+
+# === Grouped Feedback Grading ===
+# Queued answers of one submission are graded up to FEEDBACK_GROUP_SIZE per LLM call, sharing one
+# rubric/tone block and the deduplicated course material (1 grades every answer on its own).
+# Groups also stay within the prompt budget; the output budget is reserved per item by type.
+# Items missing or malformed in the returned JSON array are regraded with a single-answer call
+FEEDBACK_GROUP_SIZE = int(os.getenv("FEEDBACK_GROUP_SIZE", "8"))
+FEEDBACK_GROUP_MAX_PROMPT_TOKENS = int(os.getenv("FEEDBACK_GROUP_MAX_PROMPT_TOKENS", "4000"))
+FEEDBACK_GROUP_MAX_OUTPUT_TOKENS = int(os.getenv("FEEDBACK_GROUP_MAX_OUTPUT_TOKENS", "3500"))
+FEEDBACK_GROUP_ITEM_TOKENS_MCQ = int(os.getenv("FEEDBACK_GROUP_ITEM_TOKENS_MCQ", "300"))
+FEEDBACK_GROUP_ITEM_TOKENS_TEXT = int(os.getenv("FEEDBACK_GROUP_ITEM_TOKENS_TEXT", "550"))
+# Teacher batches ("question", the default) grade open-ended answers by question instead: up to
+# FEEDBACK_QUESTION_GROUP_SIZE students' answers to one short/long question per LLM call, with the
+# question, reference answer, rubric and the question's course material sent once
+# ("submission" groups batch jobs like queued submissions). The token budgets above still apply
+FEEDBACK_BATCH_GROUP_BY = os.getenv("FEEDBACK_BATCH_GROUP_BY", "question").lower()
+FEEDBACK_QUESTION_GROUP_SIZE = int(os.getenv("FEEDBACK_QUESTION_GROUP_SIZE", "6"))
+
+# === Query Embedding Cache ===
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_PERSIST = os.getenv("QUERY_EMBEDDING_CACHE_PERSIST", "false").lower() == "true"
 ENV = os.getenv("ENV", "development")
 JWT_SECRET = os.getenv("JWT_SECRET")
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
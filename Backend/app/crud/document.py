@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from app.models.document import Document
+from app.models.document import Document, ProcessingStatus
 from app.schemas.document import DocumentCreate, DocumentUpdate
 from datetime import datetime, timezone
 import uuid
@@ -53,11 +53,29 @@ def update_document(db: Session, document_id: str, update_data: DocumentUpdate)
     if not doc:
         return None
 
-    for field, value in update_data.dict(exclude_unset=True).items():
+    changes = update_data.dict(exclude_unset=True)
+    previous_module_id = doc.module_id
+    was_retrievable = doc.is_retrievable
+
+    for field, value in changes.items():
         setattr(doc, field, value)
 
+    # Title, module or status changes alter what retrieval returns for a retrievable document
+    affects_retrieval = (was_retrievable or doc.is_retrievable) and bool(
+        {'title', 'module_id', 'processing_status'} & set(changes)
+    )
+    if affects_retrieval:
+        from app.services.document_status import sync_document_retrieval_scope
+        sync_document_retrieval_scope(db, doc)
+
     db.commit()
     db.refresh(doc)
+
+    # Cached module indexes and retrieval results are keyed by embedding version
+    if affects_retrieval:
+        from app.services.vector_index import bump_module_embedding_version
+        for module_id in {previous_module_id, doc.module_id}:
+            bump_module_embedding_version(db, module_id)
     return doc
 
 
@@ -115,6 +133,19 @@ def delete_document(db: Session, document_id: str, delete_questions: bool = Fals
     except Exception as e:
         print(f"[WARNING] Failed to delete local file at {doc.storage_path}: {e}")
 
+    # 🧹 Delete the document's vector index files
+    from app.services.vector_index import remove_document_index
+    remove_document_index(doc)
+
+    was_retrievable = doc.processing_status == ProcessingStatus.EMBEDDED
+    module_id = doc.module_id
+
     db.delete(doc)
     db.commit()
+
+    # Deleted embeddings must not be served from any worker's vector index
+    if was_retrievable:
+        from app.services.vector_index import bump_module_embedding_version
+        bump_module_embedding_version(db, module_id)
+
     return doc
\ No newline at end of file
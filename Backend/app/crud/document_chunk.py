@@ -5,6 +5,16 @@ from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 from app.models.document_chunk import DocumentChunk
+from app.models.document import Document
+from app.utils.tokens import count_tokens
+
+
+def _document_scope(db: Session, document_id: str) -> Dict[str, Any]:
+    """module_id and retrievable flag to denormalize onto a document's chunks"""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if document is None:
+        return {'module_id': None, 'retrievable': False}
+    return {'module_id': document.module_id, 'retrievable': document.is_retrievable}
 
 
 def create_chunk(
@@ -29,9 +39,11 @@ def create_chunk(
     """
     chunk = DocumentChunk(
         document_id=document_id,
+        **_document_scope(db, document_id),
         chunk_index=chunk_index,
         chunk_text=chunk_text,
         chunk_size=len(chunk_text),
+        token_count=count_tokens(chunk_text),
         chunk_metadata=chunk_metadata or {}
     )
     db.add(chunk)
@@ -52,17 +64,22 @@ def bulk_create_chunks(
         db: Database session
         document_id: UUID of parent document
         chunks: List of dicts with 'text', 'index', 'chunk_metadata'
+            (and optionally 'token_count', counted here otherwise)
 
     Returns:
         List of created DocumentChunk objects
     """
+    scope = _document_scope(db, document_id)
+
     chunk_objects = []
     for chunk_data in chunks:
         chunk = DocumentChunk(
             document_id=document_id,
+            **scope,
             chunk_index=chunk_data['index'],
             chunk_text=chunk_data['text'],
             chunk_size=len(chunk_data['text']),
+            token_count=chunk_data.get('token_count') or count_tokens(chunk_data['text']),
             chunk_metadata=chunk_data.get('chunk_metadata', {})
         )
         chunk_objects.append(chunk)
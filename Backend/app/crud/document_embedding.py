@@ -2,22 +2,57 @@
 CRUD operations for DocumentEmbedding
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, text, cast
+from pgvector.sqlalchemy import Vector
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 
 from app.models.document_embedding import DocumentEmbedding
+from app.models.document_chunk import DocumentChunk
+from app.models.document import Document
+from app.core.config import PGVECTOR_EF_SEARCH, PGVECTOR_ITERATIVE_SCAN
+from app.utils.vector_codec import decode_embedding
 from app.schemas.document_embedding import DocumentEmbeddingCreate
 
 
+def encode_embedding_columns(vector: List[float]) -> Dict[str, Any]:
+    """
+    Column values for storing one embedding vector
+
+    Writes only the pgvector column (the exact copy). The legacy float[] and
+    packed float32 columns are not written; the numpy backend quantizes its
+    in-memory matrix itself (see app/services/vector_index.py).
+    """
+    return {
+        'embedding': list(vector)
+    }
+
+
+def get_document_scopes(db: Session, document_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+    """
+    module_id and retrievable flag to denormalize onto embedding rows
+
+    Returns:
+        Dict of document_id -> {'module_id', 'retrievable'}
+    """
+    documents = db.query(Document).filter(Document.id.in_(set(document_ids))).all() if document_ids else []
+    return {
+        str(document.id): {'module_id': document.module_id, 'retrievable': document.is_retrievable}
+        for document in documents
+    }
+
+
 def create_embedding(db: Session, embedding_data: DocumentEmbeddingCreate) -> DocumentEmbedding:
     """
     Create a single embedding record
     """
+    scope = get_document_scopes(db, [embedding_data.document_id]).get(str(embedding_data.document_id), {})
     embedding = DocumentEmbedding(
         chunk_id=embedding_data.chunk_id,
         document_id=embedding_data.document_id,
-        embedding_vector=embedding_data.embedding_vector,
+        module_id=scope.get('module_id'),
+        retrievable=scope.get('retrievable', False),
+        **encode_embedding_columns(embedding_data.embedding_vector),
         embedding_model=embedding_data.embedding_model,
         embedding_dimensions=embedding_data.embedding_dimensions,
         token_count=embedding_data.token_count
@@ -44,20 +79,28 @@ def bulk_create_embeddings(
             - embedding_model: str
             - embedding_dimensions: int
             - token_count: int (optional)
+            - content_hash: str (optional, see embedding.compute_content_hash)
 
     Returns:
         List of created DocumentEmbedding objects
     """
+    # Copy the parent documents' module and retrievability onto the rows
+    scopes = get_document_scopes(db, [data['document_id'] for data in embeddings_data])
+
     embedding_objects = []
 
     for data in embeddings_data:
+        scope = scopes.get(str(data['document_id']), {})
         embedding = DocumentEmbedding(
             chunk_id=data['chunk_id'],
             document_id=data['document_id'],
-            embedding_vector=data['embedding_vector'],
+            module_id=scope.get('module_id'),
+            retrievable=scope.get('retrievable', False),
+            **encode_embedding_columns(data['embedding_vector']),
             embedding_model=data.get('embedding_model', 'text-embedding-ada-002'),
             embedding_dimensions=data.get('embedding_dimensions', 1536),
-            token_count=data.get('token_count')
+            token_count=data.get('token_count'),
+            content_hash=data.get('content_hash')
         )
         embedding_objects.append(embedding)
         db.add(embedding)
@@ -88,6 +131,56 @@ def get_embedding_by_chunk(db: Session, chunk_id: str) -> Optional[DocumentEmbed
     ).first()
 
 
+def get_embeddings_by_content_hashes(
+    db: Session,
+    content_hashes: List[str],
+    embedding_model: str,
+    embedding_dimensions: Optional[int] = None,
+    batch_size: int = 500
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Look up existing embeddings by content hash (model + normalized chunk text)
+
+    Args:
+        db: Database session
+        content_hashes: Hashes to look up
+        embedding_model: Only reuse vectors produced by this model
+        embedding_dimensions: Only reuse vectors of this size (None = any)
+        batch_size: Hashes per IN (...) query
+
+    Returns:
+        Dict of content_hash -> {'embedding_vector', 'embedding_dimensions', 'token_count'}
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+
+    for i in range(0, len(content_hashes), batch_size):
+        batch = content_hashes[i:i + batch_size]
+        query = db.query(
+            DocumentEmbedding.content_hash,
+            DocumentEmbedding.embedding,
+            DocumentEmbedding.embedding_f32,
+            DocumentEmbedding.embedding_vector,
+            DocumentEmbedding.embedding_dimensions,
+            DocumentEmbedding.token_count
+        ).filter(
+            DocumentEmbedding.content_hash.in_(batch),
+            DocumentEmbedding.embedding_model == embedding_model
+        )
+        if embedding_dimensions is not None:
+            query = query.filter(DocumentEmbedding.embedding_dimensions == embedding_dimensions)
+
+        rows = query.distinct(DocumentEmbedding.content_hash).all()
+
+        for row in rows:
+            found[row.content_hash] = {
+                'embedding_vector': decode_embedding(row.embedding, row.embedding_f32, row.embedding_vector).tolist(),
+                'embedding_dimensions': row.embedding_dimensions,
+                'token_count': row.token_count
+            }
+
+    return found
+
+
 def delete_embeddings_by_document(db: Session, document_id: str) -> int:
     """
     Delete all embeddings for a document
@@ -138,32 +231,102 @@ def similarity_search(
     db: Session,
     query_vector: List[float],
     limit: int = 5,
-    document_id: Optional[str] = None
-) -> List[tuple]:
+    document_id: Optional[str] = None,
+    module_id: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    embedding_dimensions: Optional[int] = None,
+    document_ids: Optional[List[Any]] = None
+) -> List[Any]:
     """
-    Perform similarity search using cosine similarity
-    (Basic implementation - will be improved with pgvector)
+    Perform top-k cosine similarity search inside Postgres using pgvector
+
+    Runs ``ORDER BY embedding::vector(N) <=> :q LIMIT k`` restricted to
+    ``embedding_dimensions = N``. Unscoped searches are ranked by the partial
+    HNSW index for that size; searches limited to a module or documents are
+    ranked exactly over their own rows. Only the top rows leave the database.
 
     Args:
         db: Database session
         query_vector: The query embedding vector
         limit: Number of results to return
         document_id: Optional document ID to limit search scope
+        module_id: Optional module ID to limit search scope to retrievable
+            (embedded, non-testbank) chunks of that module; filters on the
+            denormalized embedding columns, so no documents lookup is needed
+        embedding_model: Generation model to search (None = any model)
+        embedding_dimensions: Generation size (default: len(query_vector))
+        document_ids: Optional list of documents to limit the search to
 
     Returns:
-        List of (embedding, similarity_score) tuples
+        List of rows with chunk_id, document_id, document_title, chunk_text,
+        chunk_index, chunk_metadata and similarity (1 - cosine distance)
     """
-    # TODO: Implement with pgvector for better performance
-    # For now, this is a placeholder that returns empty results
-    # Once pgvector is set up, use: embedding_vector <=> query_vector
+    dimensions = int(embedding_dimensions or len(query_vector))
+    distance = cast(DocumentEmbedding.embedding, Vector(dimensions)).cosine_distance(query_vector)
 
-    query = db.query(DocumentEmbedding)
+    filters = [
+        DocumentEmbedding.embedding.isnot(None),
+        DocumentEmbedding.embedding_dimensions == dimensions
+    ]
+
+    if embedding_model:
+        filters.append(DocumentEmbedding.embedding_model == embedding_model)
 
     if document_id:
-        query = query.filter(DocumentEmbedding.document_id == document_id)
+        filters.append(DocumentEmbedding.document_id == document_id)
+
+    if module_id:
+        filters.append(DocumentEmbedding.module_id == module_id)
+        filters.append(DocumentEmbedding.retrievable == True)  # Embedded, non-testbank documents only
+
+    if document_ids is not None:
+        filters.append(DocumentEmbedding.document_id.in_(document_ids))
+
+    if module_id or document_id or document_ids is not None:
+        # HNSW applies WHERE after its candidate scan over the whole table, so a small
+        # module in a large table comes back with fewer than `limit` rows (or none).
+        # Scoped searches rank their rows exactly instead: the MATERIALIZED CTE is
+        # filtered through the module/document indexes and keeps the planner from
+        # ordering by the HNSW index
+        candidates = db.query(
+            DocumentEmbedding.chunk_id,
+            DocumentEmbedding.document_id,
+            distance.label('distance')
+        ).filter(*filters).cte('scoped_embeddings').prefix_with('MATERIALIZED')
+
+        return db.query(
+            candidates.c.chunk_id,
+            candidates.c.document_id,
+            Document.title.label('document_title'),
+            DocumentChunk.chunk_text,
+            DocumentChunk.chunk_index,
+            DocumentChunk.chunk_metadata,
+            (1 - candidates.c.distance).label('similarity')
+        ).join(
+            DocumentChunk, candidates.c.chunk_id == DocumentChunk.id
+        ).join(
+            Document, candidates.c.document_id == Document.id
+        ).order_by(candidates.c.distance).limit(limit).all()
+
+    # Unscoped searches use the HNSW index; ef_search must cover the top-k, and with
+    # iterative scans (pgvector >= 0.8) a generation filter still fills it
+    db.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(PGVECTOR_EF_SEARCH), limit)}"))
+    if PGVECTOR_ITERATIVE_SCAN != "off":
+        db.execute(text(f"SET LOCAL hnsw.iterative_scan = {PGVECTOR_ITERATIVE_SCAN}"))
 
-    # Placeholder - will implement proper vector similarity with pgvector
-    embeddings = query.limit(limit).all()
+    rows = db.query(
+        DocumentEmbedding.chunk_id,
+        DocumentEmbedding.document_id,
+        Document.title.label('document_title'),
+        DocumentChunk.chunk_text,
+        DocumentChunk.chunk_index,
+        DocumentChunk.chunk_metadata,
+        (1 - distance).label('similarity')
+    ).join(
+        DocumentChunk, DocumentEmbedding.chunk_id == DocumentChunk.id
+    ).join(
+        Document, DocumentEmbedding.document_id == Document.id
+    ).filter(*filters).order_by(distance).limit(limit).all()
 
-    # Return with placeholder similarity scores
-    return [(emb, 0.0) for emb in embeddings]
+    # relaxed_order may return rows slightly out of order
+    return sorted(rows, key=lambda row: row.similarity, reverse=True)
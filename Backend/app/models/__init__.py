@@ -16,6 +16,12 @@ from app.models.student_enrollment import StudentEnrollment  # ✅ NEW: Student
 from app.models.survey_response import SurveyResponse  # ✅ NEW: Student survey responses
 from app.models.chat_conversation import ChatConversation  # ✅ NEW: Chat conversations
 from app.models.chat_message import ChatMessage  # ✅ NEW: Chat messages
+from app.models.query_embedding_cache import QueryEmbeddingCacheEntry  # ✅ NEW: Cached query embeddings
+from app.models.embedding_generation import EmbeddingGeneration  # ✅ NEW: Embedding model/dimension generations
+from app.models.document_summary_embedding import DocumentSummaryEmbedding  # ✅ NEW: Per-document centroid vectors
+from app.models.question_context import QuestionContext  # ✅ NEW: Precomputed question retrieval context
+from app.models.feedback_memo import FeedbackMemo  # ✅ NEW: Feedback shared by identical answers
+from app.models.feedback_job import FeedbackJob  # ✅ NEW: AI feedback work queue
 # from app.models.autosave import Autosave
 # from app.models.attempt_summary import AttemptSummary
 # from app.models.audio_explanation import AudioExplanation
@@ -53,4 +53,9 @@ class Document(Base):
 
     __table_args__ = (
         UniqueConstraint('teacher_id', 'file_hash', 'module_id', name='uix_teacher_filehash'),
-    )
\ No newline at end of file
+    )
+
+    @property
+    def is_retrievable(self) -> bool:
+        """Whether RAG retrieval may use this document's chunks (embedded, not a testbank)"""
+        return self.processing_status == ProcessingStatus.EMBEDDED and not self.is_testbank
\ No newline at end of file
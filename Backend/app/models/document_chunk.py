@@ -2,7 +2,7 @@
 Document Chunks Model
 Stores text chunks extracted from documents for RAG retrieval
 """
-from sqlalchemy import Column, String, Integer, Text, ForeignKey, TIMESTAMP, UniqueConstraint, Index
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, TIMESTAMP, UniqueConstraint, Index, Boolean
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -25,10 +25,16 @@ class DocumentChunk(Base):
         index=True
     )
 
+    # Denormalized from the parent document so module-scoped retrieval needs no join to documents
+    # (kept in sync by update_document_status)
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=True)
+    retrievable = Column(Boolean, nullable=False, default=False, server_default="false")  # Document embedded and not a testbank
+
     # Chunk ordering and content
     chunk_index = Column(Integer, nullable=False)  # Order within document (0, 1, 2, ...)
     chunk_text = Column(Text, nullable=False)      # The actual text content
     chunk_size = Column(Integer, nullable=False)    # Character count
+    token_count = Column(Integer, nullable=True)    # cl100k_base tokens (batch packing, prompt budgets, cost)
 
     # Metadata for context (renamed from 'metadata' to avoid SQLAlchemy conflict)
     chunk_metadata = Column(JSONB, default={})  # Store: page_num, section, start_pos, end_pos, heading, etc.
@@ -40,6 +46,7 @@ class DocumentChunk(Base):
     __table_args__ = (
         UniqueConstraint('document_id', 'chunk_index', name='uix_document_chunk_index'),
         Index('idx_chunks_document_id', 'document_id'),  # Fast lookup by document
+        Index('idx_chunks_module_retrievable', 'module_id', 'retrievable'),  # Module-scoped retrieval
     )
 
     def __repr__(self):
@@ -2,9 +2,10 @@
 DocumentEmbedding model for storing vector embeddings of document chunks
 Uses pgvector for similarity search
 """
-from sqlalchemy import Column, String, Integer, ForeignKey, TIMESTAMP, Text, Float
+from sqlalchemy import Column, String, Integer, ForeignKey, TIMESTAMP, Text, Float, Index, LargeBinary, UniqueConstraint, Boolean
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
 from datetime import datetime
 import uuid
 
@@ -14,7 +15,8 @@ from app.database import Base
 class DocumentEmbedding(Base):
     """
     Stores vector embeddings for document chunks
-    Each chunk gets one embedding vector for RAG retrieval
+    Each chunk gets one embedding vector per generation (embedding model + dimensions);
+    retrieval reads the active generation only (see EmbeddingGeneration)
     """
     __tablename__ = "document_embeddings"
 
@@ -22,17 +24,47 @@ class DocumentEmbedding(Base):
     chunk_id = Column(UUID(as_uuid=True), ForeignKey("document_chunks.id", ondelete="CASCADE"), nullable=False)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
 
-    # Vector embedding - stored as ARRAY for now (will use pgvector extension later)
-    # OpenAI text-embedding-ada-002 produces 1536 dimensions
-    embedding_vector = Column(ARRAY(Float), nullable=False)
+    # Denormalized from the parent document so module-scoped retrieval is one indexed query
+    # (kept in sync by update_document_status)
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=True)
+    retrievable = Column(Boolean, nullable=False, default=False, server_default="false")  # Document embedded and not a testbank
+
+    # Vector embedding - legacy float8 array (~12 KB per row), no longer written
+    # Kept readable until migration 009 has converted every row
+    embedding_vector = Column(ARRAY(Float), nullable=True)
+
+    # Compact storage (see app/utils/vector_codec.py)
+    # OpenAI text-embedding-ada-002 produces 1536 dimensions -> 6 KB float32
+    # Packed float32, no longer written: the pgvector column below is the exact copy
+    # (migration 018 clears it on rows that have one)
+    embedding_f32 = Column(LargeBinary, nullable=True)
+
+    # pgvector copy of the embedding, untyped so generations can differ in size.
+    # HNSW indexes are partial expression indexes per dimension:
+    #   ((embedding::vector(N)) vector_cosine_ops) WHERE embedding_dimensions = N
+    # created by app.services.embedding_generation.ensure_generation_vector_index
+    embedding = Column(Vector(), nullable=True)
 
     # Metadata
     embedding_model = Column(String, nullable=False, default="text-embedding-ada-002")
     embedding_dimensions = Column(Integer, nullable=False, default=1536)
     token_count = Column(Integer)  # Tokens used for this embedding
 
+    # sha256 of model + normalized chunk text, used to reuse vectors for identical chunks
+    content_hash = Column(String(64), nullable=True)
+
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
 
+    __table_args__ = (
+        UniqueConstraint('chunk_id', 'embedding_model', 'embedding_dimensions', name='uix_embedding_chunk_generation'),
+        Index('idx_embeddings_content_hash_model', 'content_hash', 'embedding_model'),
+        Index('idx_embeddings_generation_document', 'embedding_model', 'embedding_dimensions', 'document_id'),
+        Index(
+            'idx_embeddings_module_retrievable_generation',
+            'module_id', 'retrievable', 'embedding_model', 'embedding_dimensions'
+        ),
+    )
+
     # Relationships
     # Note: We don't need backref since CASCADE is handled at the database level via ondelete="CASCADE"
     # The foreign keys will automatically delete embeddings when parent document/chunk is deleted
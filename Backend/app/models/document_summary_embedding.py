@@ -0,0 +1,36 @@
+"""
+DocumentSummaryEmbedding model
+One centroid vector per document per embedding generation, used to pick the
+most relevant documents of a module before scoring their chunks
+"""
+from sqlalchemy import Column, String, Integer, ForeignKey, TIMESTAMP, LargeBinary, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class DocumentSummaryEmbedding(Base):
+    """
+    Normalized mean of a document's chunk embeddings in one generation
+    (computed when the document is embedded)
+    """
+    __tablename__ = "document_summary_embeddings"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+
+    embedding_model = Column(String, nullable=False)
+    embedding_dimensions = Column(Integer, nullable=False)
+    embedding_f32 = Column(LargeBinary, nullable=False)  # Packed float32 (see app/utils/vector_codec.py); scored in process
+    chunk_count = Column(Integer, nullable=False)        # Chunks averaged into the centroid
+
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('document_id', 'embedding_model', 'embedding_dimensions', name='uix_summary_document_generation'),
+    )
+
+    def __repr__(self):
+        return f"<DocumentSummaryEmbedding(document_id={self.document_id}, model={self.embedding_model}, chunks={self.chunk_count})>"
@@ -0,0 +1,43 @@
+"""
+EmbeddingGeneration model
+One row per (embedding model, dimensions) the chunk embeddings have been built with.
+Retrieval only reads the active generation, so switching models never mixes
+incompatible vectors.
+"""
+from sqlalchemy import Column, String, Integer, TIMESTAMP, Index, UniqueConstraint, text
+from app.database import Base
+from datetime import datetime
+
+
+class GenerationStatus:
+    """Embedding generation status constants"""
+    BUILDING = "building"   # Being backfilled, not read by retrieval yet
+    ACTIVE = "active"       # Read by retrieval and written by new uploads (exactly one)
+    RETIRED = "retired"     # Replaced; rows can be pruned
+
+
+class EmbeddingGeneration(Base):
+    __tablename__ = "embedding_generations"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    embedding_model = Column(String, nullable=False)
+    embedding_dimensions = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default=GenerationStatus.BUILDING)
+
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    activated_at = Column(TIMESTAMP, nullable=True)
+    retired_at = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('embedding_model', 'embedding_dimensions', name='uix_embedding_generation_model_dims'),
+        # At most one active generation
+        Index(
+            'uix_embedding_generations_active',
+            'status',
+            unique=True,
+            postgresql_where=text("status = 'active'")
+        ),
+    )
+
+    def __repr__(self):
+        return f"<EmbeddingGeneration(id={self.id}, model={self.embedding_model}, dims={self.embedding_dimensions}, status={self.status})>"
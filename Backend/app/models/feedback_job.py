@@ -0,0 +1,52 @@
+"""
+FeedbackJob model
+Durable queue of AI feedback work: one job per submitted answer, claimed by
+feedback workers (scripts/feedback_worker.py) with FOR UPDATE SKIP LOCKED
+"""
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, TIMESTAMP, Index
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class FeedbackJobStatus:
+    """Feedback job status constants"""
+    QUEUED = "queued"          # Waiting to be claimed (possibly until run_after, when retrying)
+    RUNNING = "running"        # Claimed by a worker until lease_expires_at
+    SUCCEEDED = "succeeded"    # Feedback stored
+    FAILED = "failed"          # Gave up after max_attempts
+
+
+class FeedbackJob(Base):
+    __tablename__ = "feedback_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    answer_id = Column(UUID(as_uuid=True), ForeignKey("student_answers.id", ondelete="CASCADE"), nullable=False, unique=True)
+
+    # Copied from the answer for per-attempt progress queries
+    student_id = Column(String, nullable=False)
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=False)
+    attempt = Column(Integer, nullable=False)
+    batch_id = Column(UUID(as_uuid=True), nullable=True, index=True)  # Set by teacher batch requests
+
+    status = Column(String, nullable=False, default=FeedbackJobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)       # Times claimed
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)  # Retry backoff
+    locked_by = Column(String, nullable=True)                   # Worker holding the lease
+    lease_expires_at = Column(TIMESTAMP, nullable=True)         # Expired leases are reclaimed
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        Index('ix_feedback_jobs_claim', 'status', 'run_after'),
+        Index('ix_feedback_jobs_attempt', 'student_id', 'module_id', 'attempt'),
+    )
+
+    def __repr__(self):
+        return f"<FeedbackJob(answer_id={self.answer_id}, status={self.status}, attempts={self.attempts})>"
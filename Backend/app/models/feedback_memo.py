@@ -0,0 +1,36 @@
+"""
+FeedbackMemo model
+Generated feedback shared by every student who gives the same answer to the
+same question under the same rubric, model and course material
+"""
+from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class FeedbackMemo(Base):
+    __tablename__ = "feedback_memos"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # sha256 of every input of the feedback prompt (see services/feedback_memo.py)
+    memo_key = Column(String, unique=True, nullable=False, index=True)
+
+    question_id = Column(UUID(as_uuid=True), ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=False)
+    answer_key = Column(String, nullable=False)  # Normalized answer (MCQ letter or short answer text)
+
+    feedback = Column(JSONB, nullable=False)     # _analyze_*_answer() result
+    used_rag = Column(Boolean, nullable=False, default=False)
+    rag_sources = Column(JSONB, nullable=True)
+    model_used = Column(String, nullable=False)
+
+    hit_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    last_used_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<FeedbackMemo(question_id={self.question_id}, answer_key={self.answer_key}, hits={self.hit_count})>"
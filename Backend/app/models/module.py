@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, TIMESTAMP, ForeignKey, Boolean, Text
+from sqlalchemy import Column, String, TIMESTAMP, ForeignKey, Boolean, Text, Integer
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from app.database import Base
 import uuid
@@ -125,4 +125,8 @@ class Module(Base):
         # Note: feedback_rubric moved to dedicated column for better management
     })
 
+    # Bumped whenever the module's retrievable embeddings change (document embedded or deleted)
+    # Per-worker retrieval caches compare against it to detect stale data
+    embedding_version = Column(Integer, nullable=False, default=0, server_default="0")
+
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
\ No newline at end of file
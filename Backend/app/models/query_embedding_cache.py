@@ -0,0 +1,27 @@
+"""
+Persistent cache of query embeddings
+Lets repeated retrieval queries (same question + answer text) skip the embedding API
+across workers and restarts
+"""
+from sqlalchemy import Column, String, Integer, TIMESTAMP, Float
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.database import Base
+from datetime import datetime
+
+
+class QueryEmbeddingCacheEntry(Base):
+    """
+    One cached query embedding, keyed by (model, sha256 of query text)
+    """
+    __tablename__ = "query_embedding_cache"
+
+    embedding_model = Column(String, primary_key=True)
+    text_hash = Column(String(64), primary_key=True)  # sha256 hex of the query text
+
+    embedding_vector = Column(ARRAY(Float), nullable=False)
+    embedding_dimensions = Column(Integer, nullable=False)
+
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<QueryEmbeddingCacheEntry(model={self.embedding_model}, hash={self.text_hash[:12]})>"
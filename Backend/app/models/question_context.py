@@ -0,0 +1,39 @@
+"""
+QuestionContext model
+Retrieval context precomputed when a question is approved: one row for the
+question stem and one per MCQ option, so feedback generation can skip the
+query embedding and vector search
+"""
+from sqlalchemy import Column, String, Integer, ForeignKey, TIMESTAMP, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class QuestionContext(Base):
+    __tablename__ = "question_contexts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    question_id = Column(UUID(as_uuid=True), ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
+    module_id = Column(UUID(as_uuid=True), ForeignKey("modules.id", ondelete="CASCADE"), nullable=False)
+
+    # "stem" for the question alone, otherwise the MCQ option letter ("A", "B", ...)
+    answer_key = Column(String, nullable=False)
+
+    # A stored context is only used while all of these still match
+    question_hash = Column(String, nullable=False)       # Question text + options
+    settings_hash = Column(String, nullable=False)       # Module rag_settings that shape retrieval
+    embedding_version = Column(Integer, nullable=False)  # Module embedding version at compute time
+    generation_id = Column(Integer, nullable=True)       # Active embedding generation at compute time
+
+    context = Column(JSONB, nullable=False)  # get_context_for_feedback() result
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('question_id', 'answer_key', name='uix_question_context_answer'),
+    )
+
+    def __repr__(self):
+        return f"<QuestionContext(question_id={self.question_id}, answer_key={self.answer_key}, version={self.embedding_version})>"
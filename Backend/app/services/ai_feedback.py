@@ -1,17 +1,45 @@
 import openai
 import json
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List, Tuple
 from sqlalchemy.orm import Session
-from app.core.config import OPENAI_API_KEY, LLM_MODEL
+from app.core.config import (
+    OPENAI_API_KEY,
+    LLM_MODEL,
+    FEEDBACK_MEMO_ENABLED,
+    FEEDBACK_GROUP_SIZE,
+    FEEDBACK_QUESTION_GROUP_SIZE,
+    FEEDBACK_GROUP_MAX_PROMPT_TOKENS,
+    FEEDBACK_GROUP_MAX_OUTPUT_TOKENS,
+    FEEDBACK_GROUP_ITEM_TOKENS_MCQ,
+    FEEDBACK_GROUP_ITEM_TOKENS_TEXT
+)
+from app.models.ai_feedback import AIFeedback
 from app.models.question import Question
 from app.models.student_answer import StudentAnswer
 from app.models.module import Module
 from app.crud.question import get_question_by_id
 from app.services.embedding import search_similar_chunks
 from app.services.rubric import get_module_rubric
-from app.services.rag_retriever import get_context_for_feedback
+from app.services.rag_retriever import (
+    context_chunk_key,
+    context_chunk_tokens,
+    context_frame_tokens,
+    format_shared_context,
+    get_context_for_feedback,
+    retrieval_options_from_settings
+)
+from app.utils.tokens import count_tokens
+from app.services.question_context import (
+    STEM_KEY,
+    current_context_stamp,
+    get_stored_question_context,
+    store_question_context
+)
+from app.services.feedback_memo import feedback_memo_key, get_memoized_feedback, store_memoized_feedback
 from app.services.prompt_builder import (
+    build_group_feedback_prompt,
+    build_question_group_feedback_prompt,
     build_mcq_feedback_prompt,
     build_text_feedback_prompt,
     should_include_context
@@ -33,7 +61,9 @@ class AIFeedbackService:
         db: Session,
         student_answer: StudentAnswer,
         question_id: str,
-        module_id: str
+        module_id: str,
+        question: Optional[Question] = None,
+        rubric: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Generate instant AI feedback for student submission with rubric and RAG support
@@ -43,6 +73,8 @@ class AIFeedbackService:
             student_answer: StudentAnswer object
             question_id: UUID of the question
             module_id: UUID of the module (for getting AI model config and rubric)
+            question: Question preloaded by a batch (skips the lookup)
+            rubric: Module rubric preloaded by a batch (skips the module and rubric lookups)
 
         Returns:
             Dict with feedback data
@@ -56,17 +88,19 @@ class AIFeedbackService:
                 return self._feedback_model_to_dict(existing_feedback)
 
             # Get question details
-            question = get_question_by_id(db, question_id)
+            if question is None:
+                question = get_question_by_id(db, question_id)
             if not question:
                 return self._error_response("Question not found")
 
-            # Get module configuration
-            module = db.query(Module).filter(Module.id == module_id).first()
-            if not module:
-                return self._error_response("Module not found")
+            if rubric is None:
+                # Get module configuration
+                module = db.query(Module).filter(Module.id == module_id).first()
+                if not module:
+                    return self._error_response("Module not found")
 
-            # Get rubric configuration (merges with defaults)
-            rubric = get_module_rubric(db, module_id)
+                # Get rubric configuration (merges with defaults)
+                rubric = get_module_rubric(db, module_id)
 
             # Get AI model from rubric or use default
             ai_model = self._get_ai_model_from_rubric(rubric)
@@ -75,109 +109,739 @@ class AIFeedbackService:
             student_answer_text = self._extract_answer_text(student_answer.answer)
             logger.info(f"📝 Extracted answer text: '{student_answer_text}' from raw answer: {student_answer.answer}")
 
-            # Get RAG context if enabled in rubric
+            # Identical answers (same MCQ option or normalized short answer) reuse stored feedback
+            memo_key, memo = self._lookup_memo(db, question, student_answer_text, rubric, ai_model)
+
+            if memo is not None:
+                feedback, rag_context = self._memo_feedback(memo)
+            else:
+                rag_context = self._get_rag_context(db, question, student_answer_text, rubric, module_id)
+                feedback = self._grade_single(student_answer_text, question, ai_model, rubric, rag_context)
+                self._remember_feedback(
+                    db, memo_key, question, rubric, student_answer_text, feedback, rag_context, ai_model
+                )
+
+            return self._save_feedback(db, student_answer, question_id, feedback, rag_context, ai_model)
+
+        except Exception as e:
+            logger.error(f"Error generating feedback: {str(e)}")
+            return self._error_response(f"Failed to generate feedback: {str(e)}")
+    
+    def generate_submission_feedback(
+        self,
+        db: Session,
+        student_answers: List[StudentAnswer],
+        module_id: str,
+        questions: Optional[Dict[Any, Question]] = None,
+        rubric: Optional[Dict[str, Any]] = None
+    ) -> Dict[Any, Dict[str, Any]]:
+        """
+        Generate feedback for several answers of one submission with grouped LLM calls
+
+        Memoized answers are answered from the memo; the rest are packed into
+        groups of up to FEEDBACK_GROUP_SIZE answers (within
+        FEEDBACK_GROUP_MAX_PROMPT_TOKENS) that share one rubric/tone block and
+        one deduplicated course material section. Each group's JSON array is
+        validated per item, and any item that is missing or malformed is
+        regraded with a single-answer call.
+
+        Args:
+            db: Database session
+            student_answers: Answers of one student's submission to a module
+            module_id: UUID of the module (rubric and RAG context)
+            questions: Questions preloaded by a batch, by id (skips the lookup)
+            rubric: Module rubric preloaded by a batch (skips the lookup)
+
+        Returns:
+            Dict of answer id -> feedback (same shape as generate_instant_feedback)
+        """
+        results: Dict[Any, Dict[str, Any]] = {}
+        pending = []
+
+        try:
+            existing = self._existing_feedback(db, student_answers)
+
+            question_ids = {answer.question_id for answer in student_answers}
+            questions = dict(questions or {})
+            missing_ids = [question_id for question_id in question_ids if question_id not in questions]
+            if missing_ids:
+                for question in db.query(Question).filter(Question.id.in_(missing_ids)).all():
+                    questions[question.id] = question
+
+            if rubric is None:
+                if not db.query(Module).filter(Module.id == module_id).first():
+                    return {answer.id: self._error_response("Module not found") for answer in student_answers}
+                rubric = get_module_rubric(db, module_id)
+
+            ai_model = self._get_ai_model_from_rubric(rubric)
+
+            for answer in student_answers:
+                if answer.id in existing:
+                    results[answer.id] = self._feedback_model_to_dict(existing[answer.id])
+                    continue
+
+                question = questions.get(answer.question_id)
+                if not question:
+                    results[answer.id] = self._error_response("Question not found")
+                    continue
+
+                answer_text = self._extract_answer_text(answer.answer)
+                memo_key, memo = self._lookup_memo(db, question, answer_text, rubric, ai_model)
+                if memo is not None:
+                    feedback, rag_context = self._memo_feedback(memo)
+                    results[answer.id] = self._save_feedback(
+                        db, answer, str(question.id), feedback, rag_context, ai_model
+                    )
+                    continue
+
+                pending.append({
+                    'answer': answer,
+                    'question': question,
+                    'answer_text': answer_text,
+                    'memo_key': memo_key,
+                    'rag_context': self._get_rag_context(db, question, answer_text, rubric, module_id),
+                    'is_correct': self._mcq_correctness(answer_text, question) if question.type == 'mcq' else None,
+                })
+
+        except Exception as e:
+            logger.error(f"Error preparing grouped feedback: {str(e)}")
+            db.rollback()
+            for answer in student_answers:
+                results.setdefault(answer.id, self._error_response(f"Failed to generate feedback: {str(e)}"))
+            return results
+
+        self._grade_pending(
+            db, pending, ai_model, rubric, FEEDBACK_GROUP_SIZE,
+            lambda group: self._build_group_prompt(group, rubric), results,
+            per_item_context=True
+        )
+        return results
+
+    def generate_question_feedback(
+        self,
+        db: Session,
+        student_answers: List[StudentAnswer],
+        question: Question,
+        module_id: str,
+        rubric: Optional[Dict[str, Any]] = None
+    ) -> Dict[Any, Dict[str, Any]]:
+        """
+        Generate feedback for different students' answers to one open-ended question
+
+        Meant for teacher batch requests, where throughput matters more than
+        per-student latency. The question, reference answer, rubric and the
+        question's course material are sent once per LLM call, followed by up
+        to FEEDBACK_QUESTION_GROUP_SIZE indexed answers; every answer still
+        gets its own ai_feedback row. Answers the returned JSON array does
+        not cover validly are regraded with a single-answer call.
+
+        Args:
+            db: Database session
+            student_answers: Answers to the question (short or long)
+            question: The question
+            module_id: UUID of the module (rubric and RAG context)
+            rubric: Module rubric preloaded by a batch (skips the lookup)
+
+        Returns:
+            Dict of answer id -> feedback (same shape as generate_instant_feedback)
+        """
+        results: Dict[Any, Dict[str, Any]] = {}
+        pending = []
+
+        try:
+            existing = self._existing_feedback(db, student_answers)
+
+            if rubric is None:
+                if not db.query(Module).filter(Module.id == module_id).first():
+                    return {answer.id: self._error_response("Module not found") for answer in student_answers}
+                rubric = get_module_rubric(db, module_id)
+
+            ai_model = self._get_ai_model_from_rubric(rubric)
             rag_context = None
-            should_use_rag = should_include_context(rubric, question.type)
-            logger.info(f"🔍 RAG CHECK: should_include_context={should_use_rag}, question_type={question.type}")
-            logger.info(f"🔍 RAG SETTINGS: {rubric.get('rag_settings', {})}")
-
-            if should_use_rag:
-                rag_settings = rubric.get("rag_settings", {})
-                logger.info(f"🔍 ATTEMPTING RAG RETRIEVAL for module_id={module_id}")
-                logger.info(f"   max_chunks={rag_settings.get('max_context_chunks', 3)}")
-                logger.info(f"   similarity_threshold={rag_settings.get('similarity_threshold', 0.7)}")
+
+            for answer in student_answers:
+                if answer.id in existing:
+                    results[answer.id] = self._feedback_model_to_dict(existing[answer.id])
+                    continue
+
+                answer_text = self._extract_answer_text(answer.answer)
+                memo_key, memo = self._lookup_memo(db, question, answer_text, rubric, ai_model)
+                if memo is not None:
+                    feedback, memo_context = self._memo_feedback(memo)
+                    results[answer.id] = self._save_feedback(
+                        db, answer, str(question.id), feedback, memo_context, ai_model
+                    )
+                    continue
+
+                if not pending:
+                    rag_context = self._get_question_context(db, question, rubric, module_id)
+                pending.append({
+                    'answer': answer,
+                    'question': question,
+                    'answer_text': answer_text,
+                    'memo_key': memo_key,
+                    'rag_context': rag_context,
+                    'is_correct': None,
+                })
+
+        except Exception as e:
+            logger.error(f"Error preparing grouped feedback: {str(e)}")
+            db.rollback()
+            for answer in student_answers:
+                results.setdefault(answer.id, self._error_response(f"Failed to generate feedback: {str(e)}"))
+            return results
+
+        self._grade_pending(
+            db, pending, ai_model, rubric, FEEDBACK_QUESTION_GROUP_SIZE,
+            lambda group: build_question_group_feedback_prompt(
+                question_text=question.text,
+                question_type=question.type,
+                reference_answer=question.correct_answer if question.correct_answer and question.correct_answer.strip() else None,
+                student_answers=[entry['answer_text'] for entry in group],
+                rubric=rubric,
+                rag_context=rag_context
+            ),
+            results
+        )
+        return results
+
+    def _existing_feedback(self, db: Session, student_answers: List[StudentAnswer]) -> Dict[Any, AIFeedback]:
+        """Stored feedback of the answers, by answer id (one query)"""
+        return {
+            feedback.answer_id: feedback
+            for feedback in db.query(AIFeedback).filter(
+                AIFeedback.answer_id.in_([answer.id for answer in student_answers])
+            ).all()
+        }
+
+    def _grade_pending(
+        self,
+        db: Session,
+        pending: List[Dict[str, Any]],
+        ai_model: str,
+        rubric: Dict[str, Any],
+        group_size: int,
+        build_prompt: Callable[[List[Dict[str, Any]]], str],
+        results: Dict[Any, Dict[str, Any]],
+        per_item_context: bool = False
+    ) -> None:
+        """Grade prepared answers in groups, regrade invalid items alone and save everything into results"""
+        include_doc_locations = rubric.get("rag_settings", {}).get("include_document_locations", True)
+        for group in self._group_pending_answers(
+            pending, group_size, build_prompt, per_item_context, include_doc_locations
+        ):
+            graded = self._grade_group(group, build_prompt(group), ai_model) if len(group) > 1 else {}
+
+            for position, entry in enumerate(group, 1):
+                answer = entry['answer']
+                question = entry['question']
                 try:
-                    rag_context = get_context_for_feedback(
-                        db=db,
-                        question_text=question.text,
-                        student_answer=student_answer_text,
-                        module_id=module_id,
-                        max_chunks=rag_settings.get("max_context_chunks", 3),
-                        similarity_threshold=rag_settings.get("similarity_threshold", 0.7),
-                        include_document_locations=rag_settings.get("include_document_locations", True)
+                    feedback = graded.get(position)
+                    if feedback is None:
+                        if len(group) > 1:
+                            logger.warning(f"⚠️ Grouped feedback for answer {answer.id} invalid, grading it alone")
+                        feedback = self._grade_single(
+                            entry['answer_text'], question, ai_model, rubric, entry['rag_context']
+                        )
+                    self._remember_feedback(
+                        db, entry['memo_key'], question, rubric, entry['answer_text'],
+                        feedback, entry['rag_context'], ai_model
                     )
-                    logger.info(f"✅ RAG context retrieved: has_context={rag_context.get('has_context', False)}")
-                    if rag_context and rag_context.get('has_context'):
-                        logger.info(f"   📚 Sources: {rag_context.get('sources', [])}")
-                        logger.info(f"   📄 Chunks: {len(rag_context.get('chunks', []))}")
-                    else:
-                        logger.warning(f"⚠️  RAG returned no context")
-                except Exception as rag_error:
-                    logger.error(f"❌ RAG retrieval failed: {str(rag_error)}")
-                    logger.exception("Full RAG error traceback:")
-                    rag_context = None
-            else:
-                logger.info(f"⏭️  Skipping RAG (should_include_context=False)")
+                    results[answer.id] = self._save_feedback(
+                        db, answer, str(question.id), feedback, entry['rag_context'], ai_model
+                    )
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error generating feedback: {str(e)}")
+                    results[answer.id] = self._error_response(f"Failed to generate feedback: {str(e)}")
 
-            # Generate feedback based on question type
-            if question.type == 'mcq':
-                feedback = self._analyze_mcq_answer(
-                    student_answer=student_answer_text,
-                    question=question,
-                    ai_model=ai_model,
-                    rubric=rubric,
-                    rag_context=rag_context
+    def _group_pending_answers(
+        self,
+        pending: List[Dict[str, Any]],
+        group_size: int,
+        build_prompt: Callable[[List[Dict[str, Any]]], str],
+        per_item_context: bool = False,
+        include_doc_locations: bool = True
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Split answers into groups within group_size and the group prompt and output token budgets
+
+        The prompt's fixed part is counted once and each answer adds its own
+        item tokens, so sizing stays linear in the number of answers. With
+        per_item_context each answer's course material goes into the prompt's
+        shared section: the section frame is added with the first chunk and
+        chunks already in the group are not counted again.
+        """
+        overhead = count_tokens(build_prompt([]))
+        frame_tokens = context_frame_tokens(include_doc_locations) if per_item_context else 0
+
+        groups: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        prompt_tokens = overhead
+        output_tokens = 0
+        seen_chunks: Dict[Any, int] = {}
+
+        for entry in pending:
+            item_tokens = count_tokens(build_prompt([{**entry, 'rag_context': None}])) - overhead
+            chunks = self._context_chunk_costs(entry) if per_item_context else {}
+            entry_output = self._group_output_tokens([entry])
+
+            new_chunks = {key: tokens for key, tokens in chunks.items() if key not in seen_chunks}
+            added = item_tokens + sum(new_chunks.values()) + (frame_tokens if new_chunks and not seen_chunks else 0)
+            too_large = len(current) + 1 > group_size or (
+                bool(current) and (
+                    output_tokens + entry_output > FEEDBACK_GROUP_MAX_OUTPUT_TOKENS
+                    or prompt_tokens + added > FEEDBACK_GROUP_MAX_PROMPT_TOKENS
                 )
+            )
+            if too_large and current:
+                groups.append(current)
+                current, prompt_tokens, output_tokens, seen_chunks = [], overhead, 0, {}
+                new_chunks = chunks
+                added = item_tokens + sum(chunks.values()) + (frame_tokens if chunks else 0)
+
+            current.append(entry)
+            prompt_tokens += added
+            output_tokens += entry_output
+            seen_chunks.update(new_chunks)
+
+        if current:
+            groups.append(current)
+        return groups
+
+    def _context_chunk_costs(self, entry: Dict[str, Any]) -> Dict[Any, int]:
+        """Prompt tokens of each course material chunk of a prepared answer, by chunk identity"""
+        rag_context = entry['rag_context']
+        if not rag_context or not rag_context.get('has_context'):
+            return {}
+        return {
+            context_chunk_key(chunk): context_chunk_tokens(number, chunk)
+            for number, chunk in enumerate(rag_context.get('chunks', []), 1)
+        }
+
+    def _build_group_prompt(self, group: List[Dict[str, Any]], rubric: Dict[str, Any]) -> str:
+        include_doc_locations = rubric.get("rag_settings", {}).get("include_document_locations", True)
+        shared_context, source_numbers = format_shared_context(
+            [entry['rag_context'] for entry in group], include_doc_locations
+        )
+
+        items = []
+        for entry, sources in zip(group, source_numbers):
+            question = entry['question']
+            if question.type == 'mcq':
+                correct_answer = question.correct_option_id or question.correct_answer
             else:
-                feedback = self._analyze_text_answer(
-                    student_answer=student_answer_text,
-                    question=question,
-                    ai_model=ai_model,
-                    rubric=rubric,
-                    rag_context=rag_context
-                )
+                correct_answer = question.correct_answer if question.correct_answer and question.correct_answer.strip() else None
+            items.append({
+                'question_type': question.type,
+                'question_text': question.text,
+                'options': question.options or {},
+                'student_answer': entry['answer_text'],
+                'correct_answer': correct_answer,
+                'is_correct': entry['is_correct'],
+                'sources': sources,
+            })
 
-            # Prepare feedback data for storage
-            feedback_data = {
-                "explanation": feedback.get("explanation", ""),
-                "improvement_hint": feedback.get("improvement_hint"),
-                "concept_explanation": feedback.get("concept_explanation"),
-                "strengths": feedback.get("strengths"),
-                "weaknesses": feedback.get("weaknesses"),
-                "selected_option": feedback.get("selected_option"),
-                "correct_option": feedback.get("correct_option"),
-                "available_options": feedback.get("available_options"),
-                "model_used": ai_model,
-                "confidence_level": feedback.get("confidence_level", "medium"),
-                "feedback_type": feedback.get("feedback_type"),
-                "used_rag": rag_context is not None and rag_context.get("has_context", False),
-                "rag_sources": rag_context.get("sources", []) if rag_context and rag_context.get("has_context") else None
-            }
-
-            # Save feedback to database
-            try:
-                logger.info(f"💾 Attempting to save feedback for answer_id: {student_answer.id}")
-                logger.info(f"💾 Feedback data: is_correct={feedback.get('is_correct')}, score={feedback.get('correctness_score')}")
-
-                feedback_create = AIFeedbackCreate(
-                    answer_id=student_answer.id,
-                    is_correct=feedback.get("is_correct"),  # Allow None when no correct answer
-                    score=feedback.get("correctness_score"),  # Allow None when no correct answer
-                    feedback_data=feedback_data
-                )
+        return build_group_feedback_prompt(items, rubric, shared_context)
+
+    def _group_output_tokens(self, group: List[Dict[str, Any]]) -> int:
+        """Completion tokens reserved for a group's feedback array"""
+        return sum(
+            FEEDBACK_GROUP_ITEM_TOKENS_MCQ if entry['question'].type == 'mcq' else FEEDBACK_GROUP_ITEM_TOKENS_TEXT
+            for entry in group
+        )
 
-                db_feedback = create_feedback(db, feedback_create)
-                logger.info(f"✅ Feedback saved to database with ID: {db_feedback.id}")
+    def _grade_group(
+        self,
+        group: List[Dict[str, Any]],
+        prompt: str,
+        ai_model: str
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Grade a group of answers with one LLM call
 
-            except Exception as db_error:
-                logger.error(f"❌ Failed to save feedback to database: {str(db_error)}")
-                logger.exception("Full traceback:")
-                # Continue even if database save fails - return the feedback anyway
+        Returns:
+            Dict of 1-based item position -> feedback, for the items that
+            came back valid (empty if the call or JSON parsing failed)
+        """
+        max_tokens = min(self._group_output_tokens(group), FEEDBACK_GROUP_MAX_OUTPUT_TOKENS)
 
-            # Return complete feedback for API response
-            return {
-                **feedback,
-                "feedback_id": str(student_answer.id),
-                "question_id": question_id,
-                "attempt_number": student_answer.attempt,
-                "generated_at": student_answer.submitted_at.isoformat(),
-                "model_used": ai_model
-            }
+        logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        logger.info(f"🎯 OPENAI API CALL - GROUPED FEEDBACK ({len(group)} answers)")
+        logger.info(f"📤 Model: {ai_model}")
+        logger.info(f"📤 Prompt Tokens: {count_tokens(prompt)}")
+        logger.info(f"📤 Max Tokens: {max_tokens}")
+        logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
 
+        try:
+            response = self.client.chat.completions.create(
+                model=ai_model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=max_tokens
+            )
+            feedback_text = response.choices[0].message.content.strip()
+            logger.info("📥 Raw Response:")
+            logger.info(feedback_text)
         except Exception as e:
-            logger.error(f"Error generating feedback: {str(e)}")
-            return self._error_response(f"Failed to generate feedback: {str(e)}")
-    
+            logger.error(f"OpenAI API error (grouped feedback): {str(e)}")
+            return {}
+
+        items = self._parse_group_feedback(feedback_text, len(group))
+
+        graded = {}
+        for position, entry in enumerate(group, 1):
+            item = items.get(position)
+            feedback = self._validate_group_item(item, entry) if item is not None else None
+            if feedback is not None:
+                graded[position] = feedback
+
+        logger.info(f"✅ Grouped feedback: {len(graded)}/{len(group)} answers valid")
+        return graded
+
+    def _parse_group_feedback(self, feedback_text: str, expected: int) -> Dict[int, Dict[str, Any]]:
+        """Items of a grouped response by their 'item' number (empty if the response is not a JSON array)"""
+        # Handle markdown code blocks if present
+        if feedback_text.startswith("```"):
+            feedback_text = feedback_text.split("```")[1]
+            if feedback_text.startswith("json"):
+                feedback_text = feedback_text[4:]
+            feedback_text = feedback_text.strip()
+
+        try:
+            parsed = json.loads(feedback_text)
+        except json.JSONDecodeError as je:
+            logger.error(f"JSON decode error (grouped feedback): {str(je)}")
+            return {}
+
+        if isinstance(parsed, dict):
+            parsed = parsed.get("feedback", parsed.get("items"))
+        if not isinstance(parsed, list):
+            logger.error("Grouped feedback is not a JSON array")
+            return {}
+
+        items = {}
+        for item in parsed:
+            if not isinstance(item, dict):
+                continue
+            try:
+                position = int(item.get("item"))
+            except (TypeError, ValueError):
+                continue
+            # A repeated item number is ambiguous; regrade that answer alone
+            if 1 <= position <= expected:
+                items[position] = None if position in items else item
+
+        return {position: item for position, item in items.items() if item is not None}
+
+    def _validate_group_item(self, item: Dict[str, Any], entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Check and normalize one grouped feedback item (None if it must be regraded alone)"""
+        question = entry['question']
+
+        explanation = item.get("explanation")
+        if not isinstance(explanation, str) or not explanation.strip():
+            return None
+
+        score = item.get("correctness_score")
+        if isinstance(score, str):
+            try:
+                score = float(score)
+            except ValueError:
+                return None
+        if score is not None and (isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100):
+            return None
+
+        is_correct = item.get("is_correct")
+        if isinstance(is_correct, str):
+            is_correct = {"true": True, "false": False}.get(is_correct.strip().lower())
+        if is_correct is not None and not isinstance(is_correct, bool):
+            return None
+
+        # A choice graded against the wrong correctness means items were mixed up
+        if question.type == 'mcq' and entry['is_correct'] is not None and is_correct not in (None, entry['is_correct']):
+            return None
+
+        feedback = {
+            "is_correct": is_correct,
+            "correctness_score": round(score) if score is not None else None,
+            "explanation": explanation,
+            "improvement_hint": item.get("improvement_hint"),
+            "concept_explanation": item.get("concept_explanation"),
+            "confidence_level": item.get("confidence_level", "medium"),
+        }
+
+        if question.type == 'mcq':
+            # Correctness of a choice is known; the model only writes the explanation
+            correct_answer = question.correct_option_id or question.correct_answer
+            feedback["is_correct"] = entry['is_correct']
+            if entry['is_correct'] is None:
+                feedback["correctness_score"] = None
+            elif entry['is_correct']:
+                feedback["correctness_score"] = 100
+            elif feedback["correctness_score"] is None:
+                feedback["correctness_score"] = 0
+            feedback.update({
+                "feedback_type": "mcq",
+                "selected_option": entry['answer_text'],
+                "correct_option": correct_answer,
+                "available_options": question.options or {}
+            })
+        else:
+            for key in ("strengths", "weaknesses", "missing_concepts"):
+                value = item.get(key) or []
+                if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                    return None
+                feedback[key] = value
+            feedback.update({
+                "feedback_type": question.type,
+                "answer_length": len(entry['answer_text']),
+                "reference_answer": question.correct_answer or "No reference answer provided"
+            })
+
+        return feedback
+
+    def _lookup_memo(
+        self,
+        db: Session,
+        question: Question,
+        student_answer_text: str,
+        rubric: Dict[str, Any],
+        ai_model: str
+    ) -> Tuple[Optional[str], Optional[Any]]:
+        """(memo key, stored memo) for an answer; either is None if memoization does not apply"""
+        if not FEEDBACK_MEMO_ENABLED:
+            return None, None
+
+        try:
+            memo_key = feedback_memo_key(db, question, student_answer_text, rubric, ai_model)
+            memo = get_memoized_feedback(db, memo_key) if memo_key else None
+        except Exception as memo_error:
+            db.rollback()
+            logger.warning(f"⚠️ Feedback memo lookup failed: {str(memo_error)}")
+            return None, None
+
+        if memo is not None:
+            logger.info(f"♻️ Reusing memoized feedback for answer '{memo.answer_key}' ({memo.hit_count} hits)")
+        return memo_key, memo
+
+    def _memo_feedback(self, memo) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """(feedback, rag_context) of a stored memo"""
+        return dict(memo.feedback), {'has_context': memo.used_rag, 'sources': memo.rag_sources or []}
+
+    def _remember_feedback(
+        self,
+        db: Session,
+        memo_key: Optional[str],
+        question: Question,
+        rubric: Dict[str, Any],
+        student_answer_text: str,
+        feedback: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]],
+        ai_model: str
+    ) -> None:
+        """Store generated feedback under its memo key"""
+        # Feedback written without the course material it should have had is not shared
+        rag_failed = rag_context is None and should_include_context(rubric, question.type)
+        if not memo_key or rag_failed:
+            return
+
+        try:
+            store_memoized_feedback(
+                db, memo_key, question, student_answer_text, feedback, rag_context, ai_model
+            )
+        except Exception as memo_error:
+            db.rollback()
+            logger.warning(f"⚠️ Could not store feedback memo: {str(memo_error)}")
+
+    def _grade_single(
+        self,
+        student_answer_text: str,
+        question: Question,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Generate feedback for one answer based on question type"""
+        if question.type == 'mcq':
+            return self._analyze_mcq_answer(
+                student_answer=student_answer_text,
+                question=question,
+                ai_model=ai_model,
+                rubric=rubric,
+                rag_context=rag_context
+            )
+        return self._analyze_text_answer(
+            student_answer=student_answer_text,
+            question=question,
+            ai_model=ai_model,
+            rubric=rubric,
+            rag_context=rag_context
+        )
+
+    def _save_feedback(
+        self,
+        db: Session,
+        student_answer: StudentAnswer,
+        question_id: str,
+        feedback: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]],
+        ai_model: str
+    ) -> Dict[str, Any]:
+        """Store feedback for an answer and return the API response dict"""
+        # Prepare feedback data for storage
+        feedback_data = {
+            "explanation": feedback.get("explanation", ""),
+            "improvement_hint": feedback.get("improvement_hint"),
+            "concept_explanation": feedback.get("concept_explanation"),
+            "strengths": feedback.get("strengths"),
+            "weaknesses": feedback.get("weaknesses"),
+            "selected_option": feedback.get("selected_option"),
+            "correct_option": feedback.get("correct_option"),
+            "available_options": feedback.get("available_options"),
+            "model_used": ai_model,
+            "confidence_level": feedback.get("confidence_level", "medium"),
+            "feedback_type": feedback.get("feedback_type"),
+            "used_rag": rag_context is not None and rag_context.get("has_context", False),
+            "rag_sources": rag_context.get("sources", []) if rag_context and rag_context.get("has_context") else None
+        }
+
+        # Save feedback to database
+        try:
+            logger.info(f"💾 Attempting to save feedback for answer_id: {student_answer.id}")
+            logger.info(f"💾 Feedback data: is_correct={feedback.get('is_correct')}, score={feedback.get('correctness_score')}")
+
+            feedback_create = AIFeedbackCreate(
+                answer_id=student_answer.id,
+                is_correct=feedback.get("is_correct"),  # Allow None when no correct answer
+                score=feedback.get("correctness_score"),  # Allow None when no correct answer
+                feedback_data=feedback_data
+            )
+
+            db_feedback = create_feedback(db, feedback_create)
+            logger.info(f"✅ Feedback saved to database with ID: {db_feedback.id}")
+
+        except Exception as db_error:
+            db.rollback()
+            logger.error(f"❌ Failed to save feedback to database: {str(db_error)}")
+            logger.exception("Full traceback:")
+            # Continue even if database save fails - return the feedback anyway
+
+        # Return complete feedback for API response
+        return {
+            **feedback,
+            "feedback_id": str(student_answer.id),
+            "question_id": question_id,
+            "attempt_number": student_answer.attempt,
+            "generated_at": student_answer.submitted_at.isoformat(),
+            "model_used": ai_model
+        }
+
+    def _get_question_context(
+        self,
+        db: Session,
+        question: Question,
+        rubric: Dict[str, Any],
+        module_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Course material for the question itself, shared by all answers (None if disabled or retrieval failed)"""
+        if not should_include_context(rubric, question.type):
+            return None
+
+        retrieval_options = retrieval_options_from_settings(rubric.get("rag_settings", {}), question.type)
+        try:
+            rag_context = get_stored_question_context(db, question, STEM_KEY, retrieval_options)
+            if rag_context is not None:
+                logger.info("📦 Using precomputed question context")
+                return rag_context
+
+            stamp = current_context_stamp(db, question.module_id)
+            rag_context = get_context_for_feedback(
+                db=db,
+                question_text=question.text,
+                student_answer="",
+                module_id=module_id,
+                **retrieval_options
+            )
+            try:
+                store_question_context(db, question, STEM_KEY, retrieval_options, rag_context, stamp)
+            except Exception as store_error:
+                db.rollback()
+                logger.warning(f"⚠️ Could not store question context: {str(store_error)}")
+            return rag_context
+
+        except Exception as rag_error:
+            db.rollback()
+            logger.error(f"❌ RAG retrieval failed: {str(rag_error)}")
+            return None
+
+    def _get_rag_context(
+        self,
+        db: Session,
+        question: Question,
+        student_answer_text: str,
+        rubric: Dict[str, Any],
+        module_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Get RAG context if enabled in rubric (None if disabled or retrieval failed)"""
+        rag_context = None
+        should_use_rag = should_include_context(rubric, question.type)
+        logger.info(f"🔍 RAG CHECK: should_include_context={should_use_rag}, question_type={question.type}")
+        logger.info(f"🔍 RAG SETTINGS: {rubric.get('rag_settings', {})}")
+
+        if should_use_rag:
+            rag_settings = rubric.get("rag_settings", {})
+            logger.info(f"🔍 ATTEMPTING RAG RETRIEVAL for module_id={module_id}")
+            logger.info(f"   max_chunks={rag_settings.get('max_context_chunks', 3)}")
+            logger.info(f"   similarity_threshold={rag_settings.get('similarity_threshold', 0.7)}")
+            retrieval_options = retrieval_options_from_settings(rag_settings, question.type)
+            is_mcq = question.type == 'mcq'
+            try:
+                # Context precomputed at approval skips the embedding call and search: MCQs
+                # use their option's context, open-ended answers the question's stem context
+                if is_mcq:
+                    rag_context = get_stored_question_context(db, question, student_answer_text, retrieval_options)
+                else:
+                    rag_context = get_stored_question_context(db, question, STEM_KEY, retrieval_options)
+                    if rag_context is not None and not rag_context.get('has_context'):
+                        rag_context = None
+
+                if rag_context is not None:
+                    logger.info(f"📦 Using precomputed context for {student_answer_text if is_mcq else 'question stem'}")
+                else:
+                    stamp = current_context_stamp(db, question.module_id)
+                    rag_context = get_context_for_feedback(
+                        db=db,
+                        question_text=question.text,
+                        student_answer=student_answer_text,
+                        module_id=module_id,
+                        **retrieval_options
+                    )
+                    if is_mcq and student_answer_text in (question.options or {}):
+                        # Refresh the stored option context for the next student
+                        try:
+                            store_question_context(
+                                db, question, student_answer_text, retrieval_options, rag_context, stamp
+                            )
+                        except Exception as store_error:
+                            db.rollback()
+                            logger.warning(f"⚠️ Could not store question context: {str(store_error)}")
+
+                logger.info(f"✅ RAG context retrieved: has_context={rag_context.get('has_context', False)}")
+                if rag_context and rag_context.get('has_context'):
+                    logger.info(f"   📚 Sources: {rag_context.get('sources', [])}")
+                    logger.info(f"   📄 Chunks: {len(rag_context.get('chunks', []))}")
+                    logger.info(f"   🔢 Context tokens: {rag_context.get('token_usage')}")
+                else:
+                    logger.warning(f"⚠️  RAG returned no context")
+            except Exception as rag_error:
+                logger.error(f"❌ RAG retrieval failed: {str(rag_error)}")
+                logger.exception("Full RAG error traceback:")
+                rag_context = None
+        else:
+            logger.info(f"⏭️  Skipping RAG (should_include_context=False)")
+
+        return rag_context
+
     def _get_ai_model_from_module(self, module: Optional[Module]) -> str:
         """Extract AI model from module configuration or use default"""
         if not module or not module.assignment_config:
@@ -208,17 +872,8 @@ class AIFeedbackService:
 
         return str(answer_data)
     
-    def _analyze_mcq_answer(
-        self,
-        student_answer: str,
-        question: Question,
-        ai_model: str,
-        rubric: Dict[str, Any],
-        rag_context: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Analyze multiple choice question answer with rubric and RAG support"""
-
-        # Get correct answer - check both fields (new correct_option_id and legacy correct_answer)
+    def _mcq_correctness(self, student_answer: str, question: Question) -> Optional[bool]:
+        """Whether an MCQ choice is correct (None if the question has no correct answer set)"""
         correct_answer = question.correct_option_id or question.correct_answer
         options = question.options or {}
 
@@ -247,6 +902,24 @@ class AIFeedbackService:
                         is_correct = True
                         break
 
+        return is_correct
+
+    def _analyze_mcq_answer(
+        self,
+        student_answer: str,
+        question: Question,
+        ai_model: str,
+        rubric: Dict[str, Any],
+        rag_context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Analyze multiple choice question answer with rubric and RAG support"""
+
+        # Get correct answer - check both fields (new correct_option_id and legacy correct_answer)
+        correct_answer = question.correct_option_id or question.correct_answer
+        options = question.options or {}
+
+        is_correct = self._mcq_correctness(student_answer, question)
+
         # Build dynamic prompt using rubric and RAG context
         prompt = build_mcq_feedback_prompt(
             question_text=question.text,
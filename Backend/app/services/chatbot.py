@@ -2,14 +2,56 @@
 AI Tutor Chatbot Service
 Provides context-aware responses using RAG (Retrieval-Augmented Generation)
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 import openai
 import os
 
 from app.models.module import Module
 from app.models.chat_message import ChatMessage
-from app.services.rag_retriever import get_context_for_feedback
+from app.services.rag_retriever import get_context_for_feedback, context_token_budget
+from app.services.rubric import get_module_rubric
+from app.core.config import RAG_RETRIEVAL_MODE, LEXICAL_CONFIDENCE_THRESHOLD, CHAT_HISTORY_TOKENS
+from app.utils.tokens import count_tokens, truncate_to_sentences
+
+
+def pack_conversation_history(
+    conversation_history: List[ChatMessage],
+    token_budget: int = CHAT_HISTORY_TOKENS,
+    max_messages: int = 10
+) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Most recent messages that fit the history token budget
+
+    Args:
+        conversation_history: Previous messages, oldest first
+        token_budget: Tokens available for history
+        max_messages: Cap on messages regardless of size
+
+    Returns:
+        (OpenAI messages, oldest first; tokens used). If even the latest
+        message is over budget it is cut at a sentence boundary.
+    """
+    history_messages = []
+    used = 0
+    for msg in reversed(conversation_history[-max_messages:]):
+        content = msg.content
+        tokens = count_tokens(content)
+        if used + tokens > token_budget:
+            if history_messages:
+                break
+            content = truncate_to_sentences(content, token_budget)
+            tokens = count_tokens(content)
+            if not content:
+                break
+        history_messages.append({
+            "role": "user" if msg.role == "student" else "assistant",
+            "content": content
+        })
+        used += tokens
+
+    history_messages.reverse()
+    return history_messages, used
 
 
 def get_chatbot_response(
@@ -51,7 +93,9 @@ def get_chatbot_response(
             'context_used': None
         }
 
-    # Get RAG context
+    # Get RAG context (short factual questions can be answered by the lexical
+    # fast path when the module's rag_settings.retrieval_mode is "lexical_first")
+    rag_settings = get_module_rubric(db, module_id).get("rag_settings", {})
     rag_context = get_context_for_feedback(
         db=db,
         question_text=student_question,
@@ -59,16 +103,14 @@ def get_chatbot_response(
         module_id=module_id,
         max_chunks=5,  # Get more context for chat
         similarity_threshold=0.4,
-        include_document_locations=True
+        include_document_locations=True,
+        retrieval_mode=rag_settings.get("retrieval_mode", RAG_RETRIEVAL_MODE),
+        lexical_confidence=rag_settings.get("lexical_confidence", LEXICAL_CONFIDENCE_THRESHOLD),
+        max_context_tokens=context_token_budget(rag_settings, "chat")
     )
 
-    # Build conversation history for context
-    history_messages = []
-    for msg in conversation_history[-10:]:  # Last 10 messages for context
-        history_messages.append({
-            "role": "user" if msg.role == "student" else "assistant",
-            "content": msg.content
-        })
+    # Build conversation history for context (last 10 messages, within the history budget)
+    history_messages, history_tokens = pack_conversation_history(conversation_history)
 
     # Build system prompt - use teacher's custom instructions if available
     if module.chatbot_instructions and module.chatbot_instructions.strip():
@@ -106,6 +148,13 @@ Guidelines:
         {"role": "user", "content": student_question}
     ]
 
+    token_usage = {
+        'system': count_tokens(system_prompt),
+        'context': rag_context.get('token_usage', {}).get('total', 0),
+        'history': history_tokens,
+        'question': count_tokens(student_question),
+    }
+
     # 🔍 LOG THE PROMPT BEING SENT TO AI
     print("\n" + "="*80)
     print("🤖 AI CHATBOT REQUEST")
@@ -125,6 +174,12 @@ Guidelines:
     else:
         print("\n⚠️  No RAG context found")
 
+    print(
+        f"\n🔢 PROMPT TOKENS: system {token_usage['system']} (context {token_usage['context']}), "
+        f"history {token_usage['history']} ({len(history_messages)} of {len(conversation_history)} messages), "
+        f"question {token_usage['question']}"
+    )
+
     if history_messages:
         print(f"\n💬 CONVERSATION HISTORY ({len(history_messages)} messages):")
         for msg in history_messages:
@@ -167,7 +222,8 @@ Guidelines:
                         'document_title': chunk.get('document_title', 'Unknown')
                     }
                     for chunk in rag_context['chunks']
-                ]
+                ],
+                'token_usage': token_usage
             }
 
         return {
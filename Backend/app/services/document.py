@@ -13,15 +13,42 @@ from app.schemas.document import DocumentCreate
 from app.schemas.question import QuestionCreate
 from app.crud.document import create_document
 from app.crud.question import bulk_create_questions
-from app.crud.document_chunk import bulk_create_chunks
+from app.crud.document_chunk import bulk_create_chunks, delete_chunks_by_document
 from app.utils.text_extractor import extract_text_from_file
 from app.utils.text_chunker import chunk_text
 from app.utils.question_parser import parse_testbank_text_to_questions
 from app.services.module import get_or_create_module
 from app.services.storage import storage_service
 from app.services.document_status import update_document_status, set_document_error
-from app.services.embedding import generate_embeddings_for_document
-from app.core.config import EMBED_MODEL
+from app.services.embedding import generate_embeddings_for_document, clone_document_embeddings
+from app.services.embedding_generation import get_active_generation
+
+
+def find_embedded_duplicate(db: Session, file_hash: str, exclude_document_id=None):
+    """
+    Find an already-embedded document with identical file content
+
+    Only documents embedded in the active generation (model + dimensions)
+    qualify, so cloned vectors are never mixed with another model's.
+    """
+    from app.models.document import Document
+    from app.models.document_embedding import DocumentEmbedding
+
+    generation = get_active_generation(db)
+
+    query = db.query(Document).join(
+        DocumentEmbedding, DocumentEmbedding.document_id == Document.id
+    ).filter(
+        Document.file_hash == file_hash,
+        Document.processing_status == ProcessingStatus.EMBEDDED,
+        Document.is_testbank == False,
+        DocumentEmbedding.embedding_model == generation['embedding_model'],
+        DocumentEmbedding.embedding_dimensions == generation['embedding_dimensions']
+    )
+    if exclude_document_id is not None:
+        query = query.filter(Document.id != exclude_document_id)
+
+    return query.order_by(Document.uploaded_at.desc()).first()
 
 
 def handle_document_upload(
@@ -151,6 +178,29 @@ def handle_document_upload(
 
     # 📄 Extract and chunk regular documents (non-testbanks) for RAG
     elif not is_testbank and file_ext in ['pdf', 'docx', 'doc', 'pptx', 'ppt', 'txt']:
+        # ♻️ Identical file already embedded (e.g. same deck in another module): clone it
+        source_document = find_embedded_duplicate(db, file_hash, exclude_document_id=document.id)
+        if source_document:
+            try:
+                cloned_count = clone_document_embeddings(db, str(source_document.id), str(document.id))
+                update_document_status(
+                    db,
+                    str(document.id),
+                    ProcessingStatus.EMBEDDED,
+                    {
+                        'chunk_count': (source_document.processing_metadata or {}).get('chunk_count'),
+                        'embedding_count': cloned_count,
+                        'embedding_model': get_active_generation(db)['embedding_model'],
+                        'cloned_from_document_id': str(source_document.id)
+                    }
+                )
+                print(f"✅ Reused chunks and embeddings from duplicate document {source_document.id}")
+                return document
+            except Exception as clone_error:
+                print(f"⚠️ Failed to clone duplicate document, processing from scratch: {str(clone_error)}")
+                db.rollback()
+                delete_chunks_by_document(db, str(document.id))
+
         temp_file_path = None
         try:
             # Update status: extracting
@@ -210,20 +260,22 @@ def handle_document_upload(
                     update_document_status(db, str(document.id), ProcessingStatus.EMBEDDING)
 
                     # Generate embeddings
+                    # Batches are packed by token count (see EMBED_MAX_BATCH_TOKENS)
                     embedding_count = generate_embeddings_for_document(
                         db=db,
-                        document_id=str(document.id),
-                        batch_size=100  # Process 100 chunks at a time
+                        document_id=str(document.id)
                     )
 
                     # Update status: embedded
+                    generation = get_active_generation(db)
                     update_document_status(
                         db,
                         str(document.id),
                         ProcessingStatus.EMBEDDED,
                         {
                             'embedding_count': embedding_count,
-                            'embedding_model': EMBED_MODEL
+                            'embedding_model': generation['embedding_model'],
+                            'embedding_dimensions': generation['embedding_dimensions']
                         }
                     )
 
@@ -6,6 +6,25 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 from app.models.document import Document, ProcessingStatus
+from app.models.document_chunk import DocumentChunk
+from app.models.document_embedding import DocumentEmbedding
+
+
+def sync_document_retrieval_scope(db: Session, doc: Document) -> None:
+    """
+    Copy a document's module_id and retrievability onto its chunk and embedding rows
+
+    Does not commit; called inside the status update's transaction.
+    """
+    values = {'module_id': doc.module_id, 'retrievable': doc.is_retrievable}
+    db.query(DocumentChunk).filter(DocumentChunk.document_id == doc.id).update(
+        {DocumentChunk.module_id: values['module_id'], DocumentChunk.retrievable: values['retrievable']},
+        synchronize_session=False
+    )
+    db.query(DocumentEmbedding).filter(DocumentEmbedding.document_id == doc.id).update(
+        {DocumentEmbedding.module_id: values['module_id'], DocumentEmbedding.retrievable: values['retrievable']},
+        synchronize_session=False
+    )
 
 
 def update_document_status(
@@ -31,8 +50,14 @@ def update_document_status(
         raise ValueError(f"Document {document_id} not found")
 
     # Update status
+    previous_status = doc.processing_status
+    was_retrievable = doc.is_retrievable
     doc.processing_status = status
 
+    # Keep the denormalized retrieval flags on chunks/embeddings in the same transaction
+    if doc.is_retrievable != was_retrievable:
+        sync_document_retrieval_scope(db, doc)
+
     # Merge metadata
     if metadata:
         current_metadata = doc.processing_metadata or {}
@@ -43,6 +68,11 @@ def update_document_status(
     db.commit()
     db.refresh(doc)
 
+    # Documents entering or leaving the embedded state change what RAG can retrieve
+    if ProcessingStatus.EMBEDDED in (previous_status, status) and previous_status != status:
+        from app.services.vector_index import bump_module_embedding_version
+        bump_module_embedding_version(db, doc.module_id)
+
     return doc
 
 
@@ -0,0 +1,209 @@
+"""
+Document summary vectors for coarse-to-fine retrieval
+Each document gets the normalized mean of its chunk embeddings (per generation).
+Large modules first rank their documents by that centroid and only score the
+chunks of the best ones, so per-query cost follows the number of relevant
+documents instead of the module's total chunk count.
+
+The coarse stage always runs in process against the cached centroids; with the
+pgvector backend the fine stage then ranks the candidate documents' chunks with
+an exact scan (see crud.document_embedding.similarity_search), not the global
+HNSW index.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import COARSE_RETRIEVAL_MIN_DOCUMENTS, COARSE_RETRIEVAL_TOP_DOCUMENTS
+from app.models.document import Document, ProcessingStatus
+from app.models.document_embedding import DocumentEmbedding
+from app.models.document_summary_embedding import DocumentSummaryEmbedding
+from app.services.vector_index import get_module_embedding_version, normalize_rows, normalize_vector
+from app.utils.vector_codec import decode_embedding, pack_float32, unpack_float32
+
+
+def compute_document_summary(db: Session, document_id: str, generation: Dict[str, Any]) -> Optional[int]:
+    """
+    (Re)compute a document's centroid vector in one generation
+
+    Args:
+        db: Database session
+        document_id: UUID of the document
+        generation: Embedding generation dict
+
+    Returns:
+        Number of chunk vectors averaged, or None if the document has none
+    """
+    rows = db.query(
+        DocumentEmbedding.embedding,
+        DocumentEmbedding.embedding_f32,
+        DocumentEmbedding.embedding_vector
+    ).filter(
+        DocumentEmbedding.document_id == document_id,
+        DocumentEmbedding.embedding_model == generation['embedding_model'],
+        DocumentEmbedding.embedding_dimensions == generation['embedding_dimensions']
+    ).all()
+
+    if not rows:
+        return None
+
+    matrix = normalize_rows(np.array(
+        [decode_embedding(row.embedding, row.embedding_f32, row.embedding_vector) for row in rows],
+        dtype=np.float32
+    ))
+    centroid = normalize_vector(matrix.mean(axis=0).tolist())
+
+    _save_summary(db, document_id, generation['embedding_model'], generation['embedding_dimensions'], centroid, len(rows))
+    db.commit()
+    return len(rows)
+
+
+def copy_document_summaries(db: Session, source_document_id: str, target_document_id: str) -> int:
+    """Copy every generation's centroid from a document to its clone; returns rows copied"""
+    summaries = db.query(DocumentSummaryEmbedding).filter(
+        DocumentSummaryEmbedding.document_id == source_document_id
+    ).all()
+
+    for summary in summaries:
+        _save_summary(
+            db,
+            target_document_id,
+            summary.embedding_model,
+            summary.embedding_dimensions,
+            unpack_float32(summary.embedding_f32),
+            summary.chunk_count
+        )
+    db.commit()
+    return len(summaries)
+
+
+def _save_summary(
+    db: Session,
+    document_id: str,
+    model: str,
+    dimensions: int,
+    centroid: np.ndarray,
+    chunk_count: int
+) -> None:
+    db.query(DocumentSummaryEmbedding).filter(
+        DocumentSummaryEmbedding.document_id == document_id,
+        DocumentSummaryEmbedding.embedding_model == model,
+        DocumentSummaryEmbedding.embedding_dimensions == dimensions
+    ).delete(synchronize_session=False)
+
+    db.add(DocumentSummaryEmbedding(
+        document_id=document_id,
+        embedding_model=model,
+        embedding_dimensions=dimensions,
+        embedding_f32=pack_float32(centroid),
+        chunk_count=chunk_count
+    ))
+
+
+# === Coarse stage (per-worker cache of each module's centroids) ===
+
+class ModuleSummaries:
+    """Centroids of a module's retrievable documents, plus the documents without one"""
+
+    def __init__(
+        self,
+        version: int,
+        generation_id: Optional[int],
+        document_ids: List[Any],
+        matrix: np.ndarray,
+        unsummarized: List[Any]
+    ):
+        self.version = version
+        self.generation_id = generation_id
+        self.document_ids = document_ids
+        self.matrix = matrix
+        self.unsummarized = unsummarized
+
+    @property
+    def document_count(self) -> int:
+        return len(self.document_ids) + len(self.unsummarized)
+
+
+_summaries: Dict[str, ModuleSummaries] = {}
+_lock = threading.Lock()
+
+
+def _load_module_summaries(db: Session, module_id: str, version: int, generation: Dict[str, Any]) -> ModuleSummaries:
+    retrievable = [
+        row[0] for row in db.query(Document.id).filter(
+            Document.module_id == module_id,
+            Document.processing_status == ProcessingStatus.EMBEDDED,
+            Document.is_testbank == False
+        ).all()
+    ]
+
+    rows = db.query(
+        DocumentSummaryEmbedding.document_id,
+        DocumentSummaryEmbedding.embedding_f32
+    ).filter(
+        DocumentSummaryEmbedding.document_id.in_(retrievable),
+        DocumentSummaryEmbedding.embedding_model == generation['embedding_model'],
+        DocumentSummaryEmbedding.embedding_dimensions == generation['embedding_dimensions']
+    ).all() if retrievable else []
+
+    summarized = {row.document_id for row in rows}
+    matrix = (
+        np.vstack([unpack_float32(row.embedding_f32) for row in rows]).astype(np.float32)
+        if rows else np.empty((0, 0), dtype=np.float32)
+    )
+
+    return ModuleSummaries(
+        version=version,
+        generation_id=generation['id'],
+        document_ids=[row.document_id for row in rows],
+        matrix=matrix,
+        unsummarized=[document_id for document_id in retrievable if document_id not in summarized]
+    )
+
+
+def select_candidate_documents(
+    db: Session,
+    module_id: str,
+    query_vector: List[float],
+    generation: Dict[str, Any],
+    top_n: int = COARSE_RETRIEVAL_TOP_DOCUMENTS
+) -> Optional[List[Any]]:
+    """
+    Coarse stage: the documents whose chunks are worth scoring for a query
+
+    Args:
+        db: Database session
+        module_id: Module ID
+        query_vector: The query embedding vector
+        generation: Generation the query was embedded with
+        top_n: Documents to keep by centroid similarity
+
+    Returns:
+        The top_n documents by centroid similarity plus every document that
+        has no centroid yet, or None when the coarse stage does not apply
+        (disabled, or the module has fewer than COARSE_RETRIEVAL_MIN_DOCUMENTS
+        retrievable documents) and all chunks should be scored
+    """
+    if top_n <= 0:
+        return None
+
+    module_id = str(module_id)
+    version = get_module_embedding_version(db, module_id)
+    if version is None:
+        return None
+
+    with _lock:
+        summaries = _summaries.get(module_id)
+    if summaries is None or summaries.version != version or summaries.generation_id != generation['id']:
+        summaries = _load_module_summaries(db, module_id, version, generation)
+        with _lock:
+            _summaries[module_id] = summaries
+
+    if summaries.document_count < COARSE_RETRIEVAL_MIN_DOCUMENTS or len(summaries.document_ids) <= top_n:
+        return None
+
+    scores = summaries.matrix @ normalize_vector(query_vector)
+    top = np.argsort(-scores)[:top_n]
+    return [summaries.document_ids[i] for i in top] + summaries.unsummarized
@@ -1,31 +1,65 @@
 """
-Embedding generation service using OpenAI API
+Embedding generation service (OpenAI API or local provider, see embedding_provider)
 Generates vector embeddings for text chunks
 """
 import os
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import re
+from hashlib import sha256
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
 
 from app.models.document_chunk import DocumentChunk
-from app.crud.document_embedding import bulk_create_embeddings
-from app.core.config import OPENAI_API_KEY, EMBED_MODEL
-
-
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+from app.crud.document_chunk import bulk_create_chunks
+from app.crud.document_embedding import (
+    bulk_create_embeddings,
+    get_embeddings_by_content_hashes,
+    similarity_search
+)
+from app.core.config import (
+    EMBED_MODEL,
+    VECTOR_SEARCH_BACKEND,
+    EMBED_MAX_BATCH_TOKENS,
+    EMBED_MAX_BATCH_INPUTS,
+    EMBED_MAX_INPUT_TOKENS,
+    EMBED_COALESCE_WINDOW_MS
+)
+from app.utils.tokens import count_tokens, truncate_to_tokens, pack_by_tokens
+from app.services.embedding_cache import query_embedding_cache
+from app.services.embedding_pipeline import run_embedding_batches, shared_embedding_batcher
+from app.services.embedding_provider import get_embedding_provider
+from app.services.document_summary import (
+    compute_document_summary,
+    copy_document_summaries,
+    select_candidate_documents
+)
+from app.services.embedding_generation import (
+    get_active_generation,
+    resolve_generation,
+    embedding_request_options
+)
+from app.utils.vector_codec import decode_embedding
+from app.services.vector_index import (
+    get_module_index,
+    normalize_rows,
+    normalize_vector,
+    top_positions,
+    write_document_index
+)
 
 
 def generate_embedding(
     text: str,
-    model: str = None
+    model: str = None,
+    dimensions: Optional[int] = None
 ) -> Dict[str, Any]:
     """
     Generate embedding for a single text string
 
     Args:
         text: Text to embed
-        model: OpenAI embedding model (default: from EMBED_MODEL config)
+        model: Embedding model (default: from EMBED_MODEL config)
+        dimensions: Output size for models that support shortening (None = native)
 
     Returns:
         {
@@ -38,35 +72,59 @@ def generate_embedding(
         model = EMBED_MODEL
 
     try:
-        response = client.embeddings.create(
-            input=text,
-            model=model
-        )
-
-        embedding_data = response.data[0]
-
-        return {
-            'embedding': embedding_data.embedding,
-            'dimensions': len(embedding_data.embedding),
-            'tokens': response.usage.total_tokens
-        }
+        return get_embedding_provider(model).embed([text], model=model, dimensions=dimensions)[0]
 
     except Exception as e:
         print(f"❌ Error generating embedding: {str(e)}")
         raise
 
 
+def get_query_embedding(
+    text: str,
+    model: str = None,
+    dimensions: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Embed a retrieval query through the query-embedding cache
+
+    Identical query texts (e.g. many students picking the same MCQ option)
+    are served from the LRU cache, and concurrent identical requests share
+    one in-flight API call.
+
+    Args:
+        text: Query text to embed
+        model: Embedding model (default: from EMBED_MODEL config)
+        dimensions: Output size for models that support shortening (None = native)
+
+    Returns:
+        Same dict as generate_embedding() ('tokens' is 0 on cache hits)
+    """
+    if model is None:
+        model = EMBED_MODEL
+
+    # Shortened vectors of the same model are cached separately
+    cache_model = f"{model}@{dimensions}" if embedding_request_options(model, dimensions) else model
+
+    return query_embedding_cache.get_or_compute(
+        text,
+        cache_model,
+        lambda query_text, _: generate_embedding(query_text, model=model, dimensions=dimensions)
+    )
+
+
 def generate_embeddings_batch(
     texts: List[str],
-    model: str = None
+    model: str = None,
+    dimensions: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
-    Generate embeddings for multiple texts in a single API call
+    Generate embeddings for multiple texts in a single provider call
     More efficient than generating one at a time
 
     Args:
         texts: List of text strings to embed
-        model: OpenAI embedding model (default: from EMBED_MODEL config)
+        model: Embedding model (default: from EMBED_MODEL config)
+        dimensions: Output size for models that support shortening (None = native)
 
     Returns:
         List of embedding dicts with 'embedding', 'dimensions', 'tokens'
@@ -75,98 +133,288 @@ def generate_embeddings_batch(
         model = EMBED_MODEL
 
     try:
-        response = client.embeddings.create(
-            input=texts,
-            model=model
-        )
-
-        results = []
-        for embedding_data in response.data:
-            results.append({
-                'embedding': embedding_data.embedding,
-                'dimensions': len(embedding_data.embedding),
-                'tokens': response.usage.total_tokens // len(texts)  # Approximate per-text tokens
-            })
-
-        return results
+        return get_embedding_provider(model).embed(texts, model=model, dimensions=dimensions)
 
     except Exception as e:
         print(f"❌ Error generating batch embeddings: {str(e)}")
         raise
 
 
+def compute_content_hash(text: str, model: str) -> str:
+    """
+    Content address of a chunk embedding: sha256 of model + normalized text
+
+    Whitespace is collapsed so re-extracted copies of the same slide or page
+    hash identically.
+    """
+    normalized = re.sub(r"\s+", " ", text).strip()
+    return sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def _embedding_input(chunk: DocumentChunk) -> str:
+    """Chunk text, cut to the model's per-input token limit if necessary"""
+    if chunk.token_count is not None and chunk.token_count > EMBED_MAX_INPUT_TOKENS:
+        return truncate_to_tokens(chunk.chunk_text, EMBED_MAX_INPUT_TOKENS)
+    return chunk.chunk_text
+
+
 def generate_embeddings_for_document(
     db: Session,
     document_id: str,
-    batch_size: int = 100,
-    model: str = None
+    batch_size: Optional[int] = None,
+    model: str = None,
+    generation: Optional[Dict[str, Any]] = None
 ) -> int:
     """
     Generate and save embeddings for all chunks of a document
 
+    Chunks that already have an embedding in the target generation are
+    skipped, so the call can be repeated (retries, re-embedding backfills).
+    Batches are packed by token count (EMBED_MAX_BATCH_TOKENS) rather than
+    a fixed number of chunks, and several are embedded concurrently within
+    the configured rate limits; each batch is saved as soon as it returns.
+
     Args:
         db: Database session
         document_id: UUID of the document
-        batch_size: Number of chunks to process at once (OpenAI limit is ~2048)
-        model: Embedding model to use (default: from EMBED_MODEL config)
+        batch_size: Max chunks per request (default: EMBED_MAX_BATCH_INPUTS, OpenAI limit is 2048)
+        model: Embedding model to use (default: the active generation's model)
+        generation: Embedding generation to write (default: the active one);
+            takes precedence over model
 
     Returns:
         Number of embeddings created
+
+    Raises:
+        EmbeddingBatchError: if a batch still fails after retries; batches
+            saved before the failure are kept and skipped on the next call
     """
-    if model is None:
-        model = EMBED_MODEL
+    from app.models.document_embedding import DocumentEmbedding
 
-    # Get all chunks for this document
+    if generation is None:
+        generation = resolve_generation(db, model)
+    model = generation['embedding_model']
+    dimensions = generation['embedding_dimensions']
+
+    already_embedded = db.query(DocumentEmbedding.chunk_id).filter(
+        DocumentEmbedding.document_id == document_id,
+        DocumentEmbedding.embedding_model == model,
+        DocumentEmbedding.embedding_dimensions == dimensions
+    )
+
+    # Get the chunks of this document still missing an embedding in this generation
     chunks = db.query(DocumentChunk).filter(
-        DocumentChunk.document_id == document_id
+        DocumentChunk.document_id == document_id,
+        ~DocumentChunk.id.in_(already_embedded)
     ).order_by(DocumentChunk.chunk_index).all()
 
     if not chunks:
-        print(f"⚠️ No chunks found for document {document_id}")
+        print(f"⚠️ No chunks to embed for document {document_id}")
         return 0
 
-    print(f"📊 Generating embeddings for {len(chunks)} chunks...")
+    # Exact token count per chunk (stored at chunk creation; counted here for older rows)
+    missing_counts = [chunk for chunk in chunks if chunk.token_count is None]
+    for chunk in missing_counts:
+        chunk.token_count = count_tokens(chunk.chunk_text)
+    if missing_counts:
+        db.commit()
+
+    # Content hash per chunk (model + normalized text) for cross-document reuse
+    chunk_hashes = {
+        chunk.id: compute_content_hash(chunk.chunk_text, model)
+        for chunk in chunks
+    }
+
+    # Reuse vectors for chunk texts that were already embedded with this model
+    reusable = get_embeddings_by_content_hashes(db, list(set(chunk_hashes.values())), model, dimensions)
+
+    reused_to_insert = []
+    chunks_to_embed = []
+    for chunk in chunks:
+        existing = reusable.get(chunk_hashes[chunk.id])
+        if existing:
+            reused_to_insert.append({
+                'chunk_id': chunk.id,
+                'document_id': chunk.document_id,
+                'embedding_vector': existing['embedding_vector'],
+                'embedding_model': model,
+                'embedding_dimensions': dimensions,
+                'token_count': chunk.token_count,
+                'content_hash': chunk_hashes[chunk.id]
+            })
+        else:
+            chunks_to_embed.append(chunk)
 
     total_embeddings = 0
 
-    # Process in batches
-    for i in range(0, len(chunks), batch_size):
-        batch_chunks = chunks[i:i + batch_size]
-        batch_texts = [chunk.chunk_text for chunk in batch_chunks]
+    if reused_to_insert:
+        for i in range(0, len(reused_to_insert), 500):
+            bulk_create_embeddings(db, reused_to_insert[i:i + 500])
+        total_embeddings += len(reused_to_insert)
+        print(f"♻️ Reused {len(reused_to_insert)} existing embeddings (identical chunk text)")
+
+    # Pack consecutive chunks into requests by token count
+    batches = [
+        [chunks_to_embed[position] for position in positions]
+        for positions in pack_by_tokens(
+            [min(chunk.token_count, EMBED_MAX_INPUT_TOKENS) for chunk in chunks_to_embed],
+            max_tokens=EMBED_MAX_BATCH_TOKENS,
+            max_items=batch_size or EMBED_MAX_BATCH_INPUTS
+        )
+    ]
+
+    print(f"📊 Generating embeddings for {len(chunks_to_embed)} of {len(chunks)} chunks in {len(batches)} batches...")
+
+    # API calls run concurrently in worker threads; DB writes stay on this
+    # thread because the Session is not thread-safe. A batch that still fails
+    # after retries raises instead of leaving a hole in the index.
+    batch_texts = [[_embedding_input(chunk) for chunk in batch] for batch in batches]
+    embed = lambda texts: generate_embeddings_batch(texts, model=model, dimensions=dimensions)
+    limiter = get_embedding_provider(model).rate_limiter
+
+    if EMBED_COALESCE_WINDOW_MS > 0:
+        # Pool with chunks of other uploads in progress so requests go out full
+        results = shared_embedding_batcher.embed_groups(
+            batch_texts,
+            model=model,
+            dimensions=dimensions,
+            embed=embed,
+            token_counts=[[min(chunk.token_count, EMBED_MAX_INPUT_TOKENS) for chunk in batch] for batch in batches],
+            limiter=limiter
+        )
+    else:
+        results = run_embedding_batches(batch_texts, embed=embed, limiter=limiter)
+
+    for batch_index, embeddings_data in results:
+        batch_chunks = batches[batch_index]
+
+        # Prepare data for bulk insert
+        embeddings_to_insert = []
+        for chunk, embedding_info in zip(batch_chunks, embeddings_data):
+            embeddings_to_insert.append({
+                'chunk_id': chunk.id,
+                'document_id': chunk.document_id,  # Use document_id from chunk to ensure consistency
+                'embedding_vector': embedding_info['embedding'],
+                'embedding_model': model,
+                'embedding_dimensions': dimensions,
+                'token_count': min(chunk.token_count, EMBED_MAX_INPUT_TOKENS),
+                'content_hash': chunk_hashes[chunk.id]
+            })
 
-        print(f"  Processing batch {i // batch_size + 1} ({len(batch_chunks)} chunks)...")
+        # Bulk insert to database
+        bulk_create_embeddings(db, embeddings_to_insert)
+        total_embeddings += len(embeddings_to_insert)
 
-        try:
-            # Generate embeddings for batch
-            embeddings_data = generate_embeddings_batch(batch_texts, model=model)
-
-            # Prepare data for bulk insert
-            embeddings_to_insert = []
-            for chunk, embedding_info in zip(batch_chunks, embeddings_data):
-                embeddings_to_insert.append({
-                    'chunk_id': chunk.id,
-                    'document_id': chunk.document_id,  # Use document_id from chunk to ensure consistency
-                    'embedding_vector': embedding_info['embedding'],
-                    'embedding_model': model,
-                    'embedding_dimensions': embedding_info['dimensions'],
-                    'token_count': embedding_info['tokens']
-                })
-
-            # Bulk insert to database
-            bulk_create_embeddings(db, embeddings_to_insert)
-            total_embeddings += len(embeddings_to_insert)
-
-            print(f"  ✅ Saved {len(embeddings_to_insert)} embeddings")
+        print(f"  ✅ Saved {len(embeddings_to_insert)} embeddings (batch {batch_index + 1}/{len(batches)})")
+
+    print(f"✅ Total embeddings created: {total_embeddings}")
+
+    # Document centroid for the coarse retrieval stage
+    try:
+        compute_document_summary(db, document_id, generation)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Failed to compute document summary vector: {str(e)}")
 
+    # Materialize the document's vectors as a memory-mappable index file
+    # (backfills of a building generation get their files after the switch)
+    if total_embeddings and generation['id'] == get_active_generation(db)['id']:
+        try:
+            from app.models.document import Document
+            document = db.query(Document).filter(Document.id == document_id).first()
+            index_base = write_document_index(db, document, generation) if document else None
+            if index_base:
+                print(f"💾 Wrote vector index file: {index_base}")
         except Exception as e:
-            print(f"  ❌ Error processing batch: {str(e)}")
-            # Continue with next batch even if one fails
-            continue
+            print(f"⚠️ Failed to write vector index file: {str(e)}")
 
-    print(f"✅ Total embeddings created: {total_embeddings}")
     return total_embeddings
 
 
+def clone_document_embeddings(
+    db: Session,
+    source_document_id: str,
+    target_document_id: str
+) -> int:
+    """
+    Copy chunks and embeddings from an already-embedded document
+
+    Used when the same file (same file_hash) is uploaded again, e.g. to
+    another module, so nothing has to be extracted or embedded. Embeddings
+    of every generation are copied, so a running re-embedding backfill
+    does not have to revisit the clone.
+
+    Args:
+        db: Database session
+        source_document_id: Embedded document with identical file content
+        target_document_id: Newly uploaded document to fill
+
+    Returns:
+        Number of embeddings cloned in the active generation
+    """
+    from app.models.document import Document
+    from app.models.document_embedding import DocumentEmbedding
+
+    source_chunks = db.query(DocumentChunk).filter(
+        DocumentChunk.document_id == source_document_id
+    ).order_by(DocumentChunk.chunk_index).all()
+
+    source_embeddings: Dict[Any, List[Any]] = {}
+    for embedding in db.query(DocumentEmbedding).filter(
+        DocumentEmbedding.document_id == source_document_id
+    ).all():
+        source_embeddings.setdefault(embedding.chunk_id, []).append(embedding)
+
+    if not source_chunks:
+        return 0
+
+    new_chunks = bulk_create_chunks(db, target_document_id, [
+        {
+            'index': chunk.chunk_index,
+            'text': chunk.chunk_text,
+            'token_count': chunk.token_count,
+            'chunk_metadata': chunk.chunk_metadata or {}
+        }
+        for chunk in source_chunks
+    ])
+
+    embeddings_to_insert = []
+    for source_chunk, new_chunk in zip(source_chunks, new_chunks):
+        for embedding in source_embeddings.get(source_chunk.id, []):
+            embeddings_to_insert.append({
+                'chunk_id': new_chunk.id,
+                'document_id': new_chunk.document_id,
+                'embedding_vector': decode_embedding(embedding.embedding, embedding.embedding_f32, embedding.embedding_vector).tolist(),
+                'embedding_model': embedding.embedding_model,
+                'embedding_dimensions': embedding.embedding_dimensions,
+                'token_count': embedding.token_count,
+                'content_hash': embedding.content_hash or compute_content_hash(
+                    source_chunk.chunk_text, embedding.embedding_model
+                )
+            })
+
+    if embeddings_to_insert:
+        bulk_create_embeddings(db, embeddings_to_insert)
+        copy_document_summaries(db, source_document_id, target_document_id)
+
+    document = db.query(Document).filter(Document.id == target_document_id).first()
+    if document and embeddings_to_insert:
+        try:
+            write_document_index(db, document)
+        except Exception as e:
+            print(f"⚠️ Failed to write vector index file: {str(e)}")
+
+    active = get_active_generation(db)
+    active_count = sum(
+        1 for data in embeddings_to_insert
+        if data['embedding_model'] == active['embedding_model']
+        and data['embedding_dimensions'] == active['embedding_dimensions']
+    )
+
+    print(f"♻️ Cloned {len(new_chunks)} chunks and {len(embeddings_to_insert)} embeddings from document {source_document_id}")
+    return active_count
+
+
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     """
     Calculate cosine similarity between two vectors
@@ -190,6 +438,60 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     return dot_product / (magnitude1 * magnitude2)
 
 
+def _result_from_row(row: Any, similarity: float, document_id: Any = None) -> Dict[str, Any]:
+    """Compact retrieval result (plain values only, nothing left to lazy-load)"""
+    return {
+        'chunk_id': row.chunk_id,
+        'document_id': str(document_id if document_id is not None else row.document_id),
+        'document_title': row.document_title,
+        'similarity': float(similarity),
+        'text': row.chunk_text,
+        'chunk_index': row.chunk_index,
+        'metadata': row.chunk_metadata or {}  # Include metadata (page, slide, section info)
+    }
+
+
+def hydrate_chunk_hits(db: Session, hits: List[Tuple[Any, Any, float]]) -> List[Dict[str, Any]]:
+    """
+    Attach chunk text, index, metadata and document title to ranked hits
+
+    Fetches all hits in one IN (...) query joined to documents, instead of
+    one lookup per chunk.
+
+    Args:
+        db: Database session
+        hits: (chunk_id, document_id, similarity) tuples in rank order
+
+    Returns:
+        Result dicts in the same order (hits whose chunk is gone are dropped)
+    """
+    from app.models.document import Document
+
+    if not hits:
+        return []
+
+    rows = db.query(
+        DocumentChunk.id.label('chunk_id'),
+        DocumentChunk.document_id,
+        DocumentChunk.chunk_text,
+        DocumentChunk.chunk_index,
+        DocumentChunk.chunk_metadata,
+        Document.title.label('document_title')
+    ).join(
+        Document, DocumentChunk.document_id == Document.id
+    ).filter(
+        DocumentChunk.id.in_([chunk_id for chunk_id, _, _ in hits])
+    ).all()
+    chunks_by_id = {row.chunk_id: row for row in rows}
+
+    results = []
+    for chunk_id, document_id, similarity in hits:
+        row = chunks_by_id.get(chunk_id)
+        if row is not None:
+            results.append(_result_from_row(row, similarity, document_id))
+    return results
+
+
 def search_similar_chunks(
     db: Session,
     query_text: str,
@@ -205,22 +507,46 @@ def search_similar_chunks(
         query_text: The search query
         document_id: Optional document ID to limit search scope
         limit: Number of results to return
-        model: Embedding model to use (default: from EMBED_MODEL config)
+        model: Embedding model to use (default: the active generation's model)
 
     Returns:
-        List of dicts with 'chunk', 'similarity', 'text'
+        List of dicts with 'chunk_id', 'document_id', 'document_title',
+        'similarity', 'text', 'chunk_index', 'metadata'
     """
-    if model is None:
-        model = EMBED_MODEL
+    from app.models.document_embedding import DocumentEmbedding
+
+    generation = resolve_generation(db, model)
 
     # Generate embedding for query
-    query_embedding_info = generate_embedding(query_text, model=model)
+    query_embedding_info = get_query_embedding(
+        query_text,
+        model=generation['embedding_model'],
+        dimensions=generation['embedding_dimensions']
+    )
     query_vector = query_embedding_info['embedding']
 
-    # Get all embeddings (optionally filtered by document)
-    from app.models.document_embedding import DocumentEmbedding
-
-    query = db.query(DocumentEmbedding).join(DocumentChunk)
+    if VECTOR_SEARCH_BACKEND == "pgvector":
+        rows = similarity_search(
+            db,
+            query_vector,
+            limit=limit,
+            document_id=document_id,
+            embedding_model=generation['embedding_model'],
+            embedding_dimensions=generation['embedding_dimensions']
+        )
+        return [_result_from_row(row, row.similarity) for row in rows]
+
+    # Score only the vector columns; text is fetched for the top-k afterwards
+    query = db.query(
+        DocumentEmbedding.chunk_id,
+        DocumentEmbedding.document_id,
+        DocumentEmbedding.embedding,
+        DocumentEmbedding.embedding_f32,
+        DocumentEmbedding.embedding_vector
+    ).filter(
+        DocumentEmbedding.embedding_model == generation['embedding_model'],
+        DocumentEmbedding.embedding_dimensions == generation['embedding_dimensions']
+    )
 
     if document_id:
         query = query.filter(DocumentEmbedding.document_id == document_id)
@@ -231,35 +557,99 @@ def search_similar_chunks(
         print("⚠️ No embeddings found")
         return []
 
-    # Calculate similarity scores
-    results = []
-    for embedding in embeddings:
-        similarity = cosine_similarity(query_vector, embedding.embedding_vector)
-        results.append({
-            'chunk_id': embedding.chunk_id,
-            'document_id': embedding.document_id,
-            'similarity': similarity,
-            'embedding': embedding
-        })
-
-    # Sort by similarity (highest first)
-    results.sort(key=lambda x: x['similarity'], reverse=True)
-
-    # Get top N results with chunk text
-    top_results = []
-    for result in results[:limit]:
-        chunk = db.query(DocumentChunk).filter(
-            DocumentChunk.id == result['chunk_id']
-        ).first()
-
-        if chunk:
-            top_results.append({
-                'chunk_id': result['chunk_id'],
-                'document_id': result['document_id'],
-                'similarity': result['similarity'],
-                'text': chunk.chunk_text,
-                'chunk_index': chunk.chunk_index,
-                'metadata': chunk.chunk_metadata or {}  # Include metadata (page, slide, section info)
-            })
+    # Calculate similarity scores with one matrix-vector product
+    matrix = normalize_rows(np.array(
+        [decode_embedding(e.embedding, e.embedding_f32, e.embedding_vector) for e in embeddings],
+        dtype=np.float32
+    ))
+    scores = matrix @ normalize_vector(query_vector)
+
+    hits = [
+        (embeddings[i].chunk_id, embeddings[i].document_id, float(scores[i]))
+        for i in top_positions(scores, limit)
+    ]
+    return hydrate_chunk_hits(db, hits)
+
+
+def search_similar_chunks_in_module(
+    db: Session,
+    query_text: str,
+    module_id: str,
+    limit: int = 5,
+    model: str = None
+) -> List[Dict[str, Any]]:
+    """
+    Search for chunks similar to a query text across a whole module
+
+    The query is embedded once and the module's retrievable chunks
+    (embedded, non-testbank documents) are scored in a single pass. With the
+    pgvector backend the top-k is computed inside Postgres; with the numpy
+    backend it is computed against a cached per-module matrix.
+
+    Large modules search coarse-to-fine: documents are ranked by their
+    centroid vector first and only the top documents' chunks are scored.
+    If that returns fewer than `limit` chunks, all chunks are scored.
+
+    Args:
+        db: Database session
+        query_text: The search query
+        module_id: Module ID to search within
+        limit: Number of results to return (global top-k)
+        model: Embedding model to use (default: the active generation's model)
+
+    Returns:
+        List of dicts with 'chunk_id', 'document_id', 'document_title',
+        'similarity', 'text', 'chunk_index', 'metadata'
+    """
+    # Only vectors of one generation (model + dimensions) are comparable
+    generation = resolve_generation(db, model)
+
+    # Generate embedding for query (once for the whole module)
+    query_embedding_info = get_query_embedding(
+        query_text,
+        model=generation['embedding_model'],
+        dimensions=generation['embedding_dimensions']
+    )
+    query_vector = query_embedding_info['embedding']
+
+    candidate_documents = select_candidate_documents(db, module_id, query_vector, generation)
+    if candidate_documents is not None:
+        results = _search_module_chunks(db, query_vector, module_id, limit, generation, candidate_documents)
+        if len(results) >= limit:
+            return results
+        print(f"⚠️ Coarse stage returned {len(results)} of {limit} chunks, scoring all chunks of module {module_id}")
+
+    return _search_module_chunks(db, query_vector, module_id, limit, generation)
+
+
+def _search_module_chunks(
+    db: Session,
+    query_vector: List[float],
+    module_id: str,
+    limit: int,
+    generation: Dict[str, Any],
+    document_ids: Optional[List[Any]] = None
+) -> List[Dict[str, Any]]:
+    """Top-k chunks of a module (optionally only of some of its documents)"""
+    if VECTOR_SEARCH_BACKEND == "pgvector":
+        rows = similarity_search(
+            db,
+            query_vector,
+            limit=limit,
+            module_id=module_id,
+            embedding_model=generation['embedding_model'],
+            embedding_dimensions=generation['embedding_dimensions'],
+            document_ids=document_ids
+        )
+        return [_result_from_row(row, row.similarity) for row in rows]
+
+    # In-process search against this worker's cached module matrix
+    index = get_module_index(db, module_id)
+    if index is None or len(index) == 0:
+        print(f"⚠️ No embeddings found for module {module_id}")
+        return []
+
+    if document_ids is not None:
+        index = index.subset(document_ids)
 
-    return top_results
+    return hydrate_chunk_hits(db, index.search(query_vector, limit=limit))
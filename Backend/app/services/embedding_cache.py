@@ -0,0 +1,205 @@
+"""
+Query embedding cache
+Bounded in-memory LRU with an optional Postgres layer and request coalescing,
+so identical retrieval queries share one embedding API call
+"""
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_PERSIST
+
+
+class _InFlightCall:
+    """A pending embedding call other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by (model, sha256 of text)
+
+    Concurrent misses for the same key are coalesced: the first caller makes
+    the API call and the others wait for its result (singleflight).
+    """
+
+    def __init__(self, max_size: int = 2048, persist: bool = False):
+        self.max_size = max_size
+        self.persist = persist
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], _InFlightCall] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'persistent_hits': 0,
+            'coalesced': 0,
+            'misses': 0,
+            'evictions': 0,
+            'errors': 0,
+        }
+
+    @staticmethod
+    def make_key(text: str, model: str) -> Tuple[str, str]:
+        return (model, sha256(text.encode('utf-8')).hexdigest())
+
+    def get_or_compute(
+        self,
+        text: str,
+        model: str,
+        compute: Callable[[str, str], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Return the cached embedding for text, computing it at most once
+
+        Args:
+            text: Query text
+            model: Embedding model
+            compute: Called as compute(text, model) on a miss; returns the
+                generate_embedding() dict
+
+        Returns:
+            Embedding dict with 'embedding', 'dimensions', 'tokens'
+            ('tokens' is 0 when served from cache)
+        """
+        key = self.make_key(text, model)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return {**entry, 'tokens': 0}
+
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._in_flight[key] = call
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return {**call.result, 'tokens': 0}
+
+        try:
+            result = self._load_persistent(key)
+            if result is not None:
+                with self._lock:
+                    self._stats['persistent_hits'] += 1
+                served = {**result, 'tokens': 0}
+            else:
+                with self._lock:
+                    self._stats['misses'] += 1
+                result = compute(text, model)
+                self._store_persistent(key, result)
+                served = result
+
+            self._store(key, result)
+            call.result = result
+            return served
+
+        except BaseException as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            call.error = e
+            raise
+
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+
+    def _store(self, key: Tuple[str, str], result: Dict[str, Any]) -> None:
+        entry = {
+            'embedding': result['embedding'],
+            'dimensions': result['dimensions'],
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _load_persistent(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        if not self.persist:
+            return None
+
+        from app.database import SessionLocal
+        from app.models.query_embedding_cache import QueryEmbeddingCacheEntry
+
+        db = SessionLocal()
+        try:
+            row = db.query(QueryEmbeddingCacheEntry).filter(
+                QueryEmbeddingCacheEntry.embedding_model == key[0],
+                QueryEmbeddingCacheEntry.text_hash == key[1]
+            ).first()
+            if row is None:
+                return None
+            return {
+                'embedding': list(row.embedding_vector),
+                'dimensions': row.embedding_dimensions,
+            }
+        except Exception as e:
+            print(f"⚠️ Query embedding cache lookup failed: {str(e)}")
+            return None
+        finally:
+            db.close()
+
+    def _store_persistent(self, key: Tuple[str, str], result: Dict[str, Any]) -> None:
+        if not self.persist:
+            return
+
+        from sqlalchemy.dialects.postgresql import insert
+        from app.database import SessionLocal
+        from app.models.query_embedding_cache import QueryEmbeddingCacheEntry
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                insert(QueryEmbeddingCacheEntry).values(
+                    embedding_model=key[0],
+                    text_hash=key[1],
+                    embedding_vector=result['embedding'],
+                    embedding_dimensions=result['dimensions']
+                ).on_conflict_do_nothing()
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Query embedding cache write failed: {str(e)}")
+        finally:
+            db.close()
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (persistent entries are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and hit rate for this worker"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_size'] = self.max_size
+        stats['persistent'] = self.persist
+
+        lookups = stats['hits'] + stats['persistent_hits'] + stats['coalesced'] + stats['misses']
+        served_without_api = stats['hits'] + stats['persistent_hits'] + stats['coalesced']
+        stats['lookups'] = lookups
+        stats['hit_rate'] = round(served_without_api / lookups, 4) if lookups else 0.0
+        return stats
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_size=QUERY_EMBEDDING_CACHE_SIZE,
+    persist=QUERY_EMBEDDING_CACHE_PERSIST
+)
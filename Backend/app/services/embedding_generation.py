@@ -0,0 +1,307 @@
+"""
+Embedding generation management
+Tracks which (embedding model, dimensions) retrieval reads from, and switches
+to a re-embedded generation atomically once its backfill is complete
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.core.config import EMBED_MODEL, EMBED_DIMENSIONS, ACTIVE_GENERATION_TTL_SECONDS
+from app.models.module import Module
+from app.models.document_chunk import DocumentChunk
+from app.models.document_embedding import DocumentEmbedding
+from app.models.embedding_generation import EmbeddingGeneration, GenerationStatus
+
+
+# Native output size of known embedding models (used when EMBED_DIMENSIONS is unset)
+MODEL_NATIVE_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "local-hashing-v1": 512,
+}
+
+# Models that accept a `dimensions` option (the local hashing model takes any size)
+MODELS_WITH_DIMENSIONS_PARAMETER = ("text-embedding-3-small", "text-embedding-3-large", "local-hashing-v1")
+
+# pgvector HNSW indexes support up to 2000 dimensions
+HNSW_MAX_DIMENSIONS = 2000
+
+
+def get_target_generation() -> Tuple[str, int]:
+    """The (model, dimensions) this deployment is configured to embed with"""
+    dimensions = EMBED_DIMENSIONS or MODEL_NATIVE_DIMENSIONS.get(EMBED_MODEL, 1536)
+    return EMBED_MODEL, dimensions
+
+
+def embedding_request_options(model: str, dimensions: Optional[int]) -> Dict[str, Any]:
+    """
+    Extra keyword arguments for the embedding call (client.embeddings.create() for OpenAI)
+
+    Only models that support shortening get `dimensions`; ada-002 rejects it.
+    """
+    if dimensions and model in MODELS_WITH_DIMENSIONS_PARAMETER:
+        if dimensions != MODEL_NATIVE_DIMENSIONS.get(model):
+            return {'dimensions': dimensions}
+    return {}
+
+
+def generation_to_dict(generation: EmbeddingGeneration) -> Dict[str, Any]:
+    return {
+        'id': generation.id,
+        'embedding_model': generation.embedding_model,
+        'embedding_dimensions': generation.embedding_dimensions,
+        'status': generation.status,
+    }
+
+
+# === Active generation (cached per worker with a short TTL) ===
+
+_active_generation: Optional[Dict[str, Any]] = None
+_active_loaded_at = 0.0
+_active_lock = threading.Lock()
+
+
+def get_active_generation(db: Session) -> Dict[str, Any]:
+    """
+    Get the generation retrieval should read
+
+    Cached for ACTIVE_GENERATION_TTL_SECONDS, so a switch made by the
+    backfill script reaches every worker within the TTL. If no generation
+    exists yet, the configured model/dimensions become the active one.
+
+    Returns:
+        Dict with 'id', 'embedding_model', 'embedding_dimensions', 'status'
+    """
+    global _active_generation, _active_loaded_at
+
+    with _active_lock:
+        if _active_generation is not None and time.monotonic() - _active_loaded_at < ACTIVE_GENERATION_TTL_SECONDS:
+            return _active_generation
+
+    generation = db.query(EmbeddingGeneration).filter(
+        EmbeddingGeneration.status == GenerationStatus.ACTIVE
+    ).first()
+
+    if generation is None:
+        generation = _bootstrap_active_generation(db)
+
+    active = generation_to_dict(generation)
+    with _active_lock:
+        _active_generation = active
+        _active_loaded_at = time.monotonic()
+    return active
+
+
+def invalidate_active_generation() -> None:
+    """Force the next get_active_generation() call to re-read the database"""
+    global _active_generation
+    with _active_lock:
+        _active_generation = None
+
+
+def _bootstrap_active_generation(db: Session) -> EmbeddingGeneration:
+    """Create the first active generation from the configured model/dimensions"""
+    model, dimensions = get_target_generation()
+    generation = get_or_create_generation(db, model, dimensions)
+    if generation.status != GenerationStatus.ACTIVE:
+        generation.status = GenerationStatus.ACTIVE
+        generation.activated_at = datetime.utcnow()
+        db.commit()
+        db.refresh(generation)
+    print(f"🧬 Active embedding generation: {model} ({dimensions} dims)")
+    return generation
+
+
+def get_or_create_generation(db: Session, model: str, dimensions: int) -> EmbeddingGeneration:
+    generation = db.query(EmbeddingGeneration).filter(
+        EmbeddingGeneration.embedding_model == model,
+        EmbeddingGeneration.embedding_dimensions == dimensions
+    ).first()
+    if generation is None:
+        generation = EmbeddingGeneration(
+            embedding_model=model,
+            embedding_dimensions=dimensions,
+            status=GenerationStatus.BUILDING
+        )
+        db.add(generation)
+        db.commit()
+        db.refresh(generation)
+    return generation
+
+
+def resolve_generation(db: Session, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generation to embed or search with
+
+    Args:
+        db: Database session
+        model: Explicit model; None (or the active model) means the active generation
+
+    Returns:
+        Generation dict ('id' is None for a model without a generation row)
+    """
+    active = get_active_generation(db)
+    if model is None or model == active['embedding_model']:
+        return active
+
+    generation = db.query(EmbeddingGeneration).filter(
+        EmbeddingGeneration.embedding_model == model
+    ).order_by(EmbeddingGeneration.id.desc()).first()
+    if generation is not None:
+        return generation_to_dict(generation)
+
+    return {
+        'id': None,
+        'embedding_model': model,
+        'embedding_dimensions': MODEL_NATIVE_DIMENSIONS.get(model, 1536),
+        'status': None,
+    }
+
+
+# === Building and switching generations ===
+
+def start_generation(db: Session, model: str, dimensions: int) -> Dict[str, Any]:
+    """
+    Register a generation to backfill (status 'building')
+
+    Retrieval keeps reading the active generation until activate_generation().
+    """
+    generation = get_or_create_generation(db, model, dimensions)
+    if generation.status == GenerationStatus.RETIRED:
+        generation.status = GenerationStatus.BUILDING
+        generation.retired_at = None
+        db.commit()
+        db.refresh(generation)
+    return generation_to_dict(generation)
+
+
+def get_building_generation(db: Session) -> Optional[Dict[str, Any]]:
+    generation = db.query(EmbeddingGeneration).filter(
+        EmbeddingGeneration.status == GenerationStatus.BUILDING
+    ).order_by(EmbeddingGeneration.id.desc()).first()
+    return generation_to_dict(generation) if generation else None
+
+
+def find_documents_missing_generation(db: Session, generation: Dict[str, Any]) -> List[Tuple[Any, int]]:
+    """
+    Retrievable documents with chunks that have no embedding in a generation
+
+    Returns:
+        List of (document_id, missing chunk count)
+    """
+    has_embedding = db.query(DocumentEmbedding.id).filter(
+        DocumentEmbedding.chunk_id == DocumentChunk.id,
+        DocumentEmbedding.embedding_model == generation['embedding_model'],
+        DocumentEmbedding.embedding_dimensions == generation['embedding_dimensions']
+    ).exists()
+
+    return db.query(
+        DocumentChunk.document_id,
+        func.count(DocumentChunk.id)
+    ).filter(
+        DocumentChunk.retrievable == True,
+        ~has_embedding
+    ).group_by(DocumentChunk.document_id).all()
+
+
+def activate_generation(db: Session, generation_id: int) -> Dict[str, Any]:
+    """
+    Atomically make a generation the one retrieval reads
+
+    In one transaction the current active generation is retired, the new
+    one activated and every module's embedding_version bumped, so cached
+    module indexes (in all workers) are rebuilt from the new vectors.
+
+    Returns:
+        The activated generation dict
+    """
+    from app.services.vector_index import invalidate_all_module_indexes
+
+    try:
+        now = datetime.utcnow()
+        # Lock the generation rows so two switches cannot interleave
+        generations = db.query(EmbeddingGeneration).with_for_update().all()
+
+        target = next((g for g in generations if g.id == generation_id), None)
+        if target is None:
+            raise ValueError(f"Embedding generation {generation_id} not found")
+
+        for generation in generations:
+            if generation.status == GenerationStatus.ACTIVE and generation.id != generation_id:
+                generation.status = GenerationStatus.RETIRED
+                generation.retired_at = now
+        # Flush the retirement first so the single-active unique index is never violated
+        db.flush()
+
+        target.status = GenerationStatus.ACTIVE
+        target.activated_at = now
+
+        db.query(Module).update(
+            {Module.embedding_version: Module.embedding_version + 1},
+            synchronize_session=False
+        )
+        db.commit()
+        db.refresh(target)
+
+    except Exception:
+        db.rollback()
+        raise
+
+    invalidate_active_generation()
+    invalidate_all_module_indexes()
+
+    print(f"🔀 Switched retrieval to embedding generation {target.id}: {target.embedding_model} ({target.embedding_dimensions} dims)")
+    return generation_to_dict(target)
+
+
+def prune_retired_generations(db: Session) -> int:
+    """Delete embedding rows of retired generations; returns rows deleted"""
+    retired = db.query(EmbeddingGeneration).filter(
+        EmbeddingGeneration.status == GenerationStatus.RETIRED
+    ).all()
+
+    deleted = 0
+    for generation in retired:
+        deleted += db.query(DocumentEmbedding).filter(
+            DocumentEmbedding.embedding_model == generation.embedding_model,
+            DocumentEmbedding.embedding_dimensions == generation.embedding_dimensions
+        ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def ensure_generation_vector_index(db: Session, dimensions: int) -> bool:
+    """
+    Create the partial HNSW index for one embedding size if it is missing
+
+    Queries must use the same expression (embedding::vector(N)) and filter
+    (embedding_dimensions = N) for Postgres to pick the index.
+
+    Returns:
+        True if the index exists (or was created)
+    """
+    dimensions = int(dimensions)
+    if dimensions > HNSW_MAX_DIMENSIONS:
+        print(f"⚠️ pgvector HNSW supports at most {HNSW_MAX_DIMENSIONS} dims; {dimensions}-dim search will scan")
+        return False
+
+    try:
+        db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_embeddings_embedding_hnsw_{dimensions} "
+            f"ON document_embeddings "
+            f"USING hnsw ((embedding::vector({dimensions})) vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64) "
+            f"WHERE embedding_dimensions = {dimensions}"
+        ))
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Failed to create HNSW index for {dimensions}-dim embeddings: {str(e)}")
+        return False
@@ -0,0 +1,461 @@
+"""
+Concurrent embedding pipeline
+Keeps several embedding batches in flight while staying inside the account's
+requests-per-minute and tokens-per-minute limits, and retries (or splits)
+only the batch that failed. A shared batcher pools chunks from concurrent
+uploads so their requests are filled to capacity.
+"""
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import openai
+
+from app.utils.tokens import count_tokens, pack_by_tokens
+from app.core.config import (
+    EMBED_MAX_CONCURRENCY,
+    EMBED_RPM_LIMIT,
+    EMBED_TPM_LIMIT,
+    EMBED_MAX_RETRIES,
+    EMBED_MAX_BATCH_TOKENS,
+    EMBED_MAX_BATCH_INPUTS,
+    EMBED_COALESCE_WINDOW_MS,
+)
+
+
+class EmbeddingBatchError(Exception):
+    """An embedding batch still failed after retries and splitting"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at capacity per minute
+    """
+
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0) -> None:
+        """Block until `amount` tokens are available, then take them"""
+        # A request larger than the whole bucket waits for a full bucket
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def drain(self) -> None:
+        """Empty the bucket (after a 429 every caller slows down, not just the failed one)"""
+        with self._lock:
+            self._refill()
+            self.tokens = 0.0
+
+
+class EmbeddingRateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets shared by all threads in the process"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, token_estimate: int) -> None:
+        self.requests.acquire(1)
+        self.tokens.acquire(token_estimate)
+
+    def throttle(self) -> None:
+        self.requests.drain()
+        self.tokens.drain()
+
+
+class UnlimitedRateLimiter(EmbeddingRateLimiter):
+    """No budget, for providers that do not call a rate-limited API"""
+
+    def __init__(self):
+        pass
+
+    def acquire(self, token_estimate: int) -> None:
+        return None
+
+    def throttle(self) -> None:
+        return None
+
+
+embedding_rate_limiter = EmbeddingRateLimiter(EMBED_RPM_LIMIT, EMBED_TPM_LIMIT)
+unlimited_rate_limiter = UnlimitedRateLimiter()
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """Honor Retry-After when the API sends it, otherwise exponential backoff with jitter"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(60.0, (2 ** attempt) + random.uniform(0, 1))
+
+
+def _is_oversize_request(error: openai.BadRequestError) -> bool:
+    message = str(error).lower()
+    return "maximum" in message or "too many" in message or "token" in message
+
+
+def embed_batch_with_retry(
+    texts: List[str],
+    embed: Callable[[List[str]], List[Dict[str, Any]]],
+    limiter: Optional[EmbeddingRateLimiter] = None,
+    max_retries: int = EMBED_MAX_RETRIES
+) -> List[Dict[str, Any]]:
+    """
+    Embed one batch, retrying transient failures and splitting when needed
+
+    - 429 / timeouts / 5xx: back off and retry this batch only
+    - request too large: split in half and embed each half
+    - still rate limited after max_retries: split in half (smaller token demand)
+
+    Args:
+        texts: Texts of the batch
+        embed: Function that embeds a list of texts (one API call)
+        limiter: Rate limiter (default: the process-wide one)
+        max_retries: Attempts before splitting or giving up
+
+    Returns:
+        Embedding dicts in the same order as texts
+
+    Raises:
+        EmbeddingBatchError: if the batch cannot be embedded
+    """
+    if limiter is None:
+        limiter = embedding_rate_limiter
+
+    last_error: Optional[Exception] = None
+
+    for attempt in range(max_retries):
+        limiter.acquire(sum(count_tokens(text) for text in texts))
+        try:
+            return embed(texts)
+
+        except openai.BadRequestError as e:
+            if len(texts) > 1 and _is_oversize_request(e):
+                return _split_and_embed(texts, embed, limiter, max_retries)
+            raise EmbeddingBatchError(f"Embedding request rejected: {str(e)}") from e
+
+        except openai.RateLimitError as e:
+            last_error = e
+            limiter.throttle()
+            delay = _retry_delay(attempt, e)
+            print(f"  ⏳ Rate limited, retrying batch of {len(texts)} in {delay:.1f}s")
+            time.sleep(delay)
+
+        except (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError) as e:
+            last_error = e
+            delay = _retry_delay(attempt, e)
+            print(f"  ⏳ Transient embedding error ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    if len(texts) > 1 and isinstance(last_error, openai.RateLimitError):
+        return _split_and_embed(texts, embed, limiter, max_retries)
+
+    raise EmbeddingBatchError(
+        f"Embedding batch of {len(texts)} texts failed after {max_retries} attempts: {str(last_error)}"
+    ) from last_error
+
+
+def _split_and_embed(
+    texts: List[str],
+    embed: Callable[[List[str]], List[Dict[str, Any]]],
+    limiter: EmbeddingRateLimiter,
+    max_retries: int
+) -> List[Dict[str, Any]]:
+    middle = len(texts) // 2
+    print(f"  ✂️ Splitting batch of {len(texts)} into {middle} + {len(texts) - middle}")
+    return (
+        embed_batch_with_retry(texts[:middle], embed, limiter, max_retries)
+        + embed_batch_with_retry(texts[middle:], embed, limiter, max_retries)
+    )
+
+
+def run_embedding_batches(
+    batches: List[List[str]],
+    embed: Callable[[List[str]], List[Dict[str, Any]]],
+    max_workers: int = EMBED_MAX_CONCURRENCY,
+    limiter: Optional[EmbeddingRateLimiter] = None
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Embed batches concurrently, yielding each as soon as it finishes
+
+    Only the API calls run in worker threads; the caller consumes results on
+    its own thread, so database writes stay on the request's Session.
+
+    Args:
+        batches: Lists of texts, one per API request
+        embed: Function that embeds a list of texts (one API call)
+        max_workers: Batches in flight at once
+        limiter: Rate limiter (default: the process-wide one)
+
+    Yields:
+        (batch index, embedding dicts) in completion order
+
+    Raises:
+        EmbeddingBatchError: on the first batch that cannot be embedded;
+            batches not yet started are cancelled
+    """
+    if not batches:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches))))
+    try:
+        futures = {
+            executor.submit(embed_batch_with_retry, texts, embed, limiter): index
+            for index, texts in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results = future.result()
+            except EmbeddingBatchError:
+                raise
+            except Exception as e:
+                raise EmbeddingBatchError(f"Embedding batch {index + 1} failed: {str(e)}") from e
+
+            if len(results) != len(batches[index]):
+                raise EmbeddingBatchError(
+                    f"Embedding batch {index + 1} returned {len(results)} vectors for {len(batches[index])} texts"
+                )
+            yield index, results
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# === Shared cross-document batcher ===
+
+class _PendingText:
+    """One text waiting in the shared batcher"""
+    __slots__ = ("text", "tokens", "future")
+
+    def __init__(self, text: str, tokens: int):
+        self.text = text
+        self.tokens = tokens
+        self.future: Future = Future()
+
+
+class SharedEmbeddingBatcher:
+    """
+    Pools texts from every in-progress document into full embedding requests
+
+    Callers enqueue their texts and get one Future per text. A background
+    thread sends a request as soon as a (model, dimensions) queue holds a full
+    batch (EMBED_MAX_BATCH_TOKENS / EMBED_MAX_BATCH_INPUTS), or once its oldest
+    text has waited window_seconds, so a lone upload is delayed by at most the
+    window. Requests run on a shared thread pool through embed_batch_with_retry,
+    and results are fanned back out to each text's Future.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        max_tokens: int = EMBED_MAX_BATCH_TOKENS,
+        max_inputs: int = EMBED_MAX_BATCH_INPUTS,
+        max_workers: int = EMBED_MAX_CONCURRENCY
+    ):
+        self.window_seconds = window_seconds
+        self.max_tokens = max_tokens
+        self.max_inputs = max_inputs
+        self.max_workers = max_workers
+
+        self._queues: Dict[Tuple[str, Optional[int]], List[_PendingText]] = {}
+        self._oldest: Dict[Tuple[str, Optional[int]], float] = {}
+        self._embed_functions: Dict[Tuple[str, Optional[int]], Callable[[List[str]], List[Dict[str, Any]]]] = {}
+        self._limiters: Dict[Tuple[str, Optional[int]], Optional[EmbeddingRateLimiter]] = {}
+        self._condition = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'texts': 0,
+            'requests': 0,
+            'full_flushes': 0,
+            'window_flushes': 0,
+            'failed_requests': 0,
+        }
+
+    def submit(
+        self,
+        texts: List[str],
+        model: str,
+        dimensions: Optional[int],
+        embed: Callable[[List[str]], List[Dict[str, Any]]],
+        token_counts: Optional[List[int]] = None,
+        limiter: Optional[EmbeddingRateLimiter] = None
+    ) -> List[Future]:
+        """
+        Queue texts for embedding
+
+        Args:
+            texts: Texts to embed
+            model: Embedding model (texts are only pooled with the same model)
+            dimensions: Output dimensions (likewise)
+            embed: Function that embeds a list of texts with this model (one API call)
+            token_counts: Tokens per text, counted here if omitted
+            limiter: Rate limiter for this model (default: the process-wide one)
+
+        Returns:
+            One Future per text resolving to its embedding dict
+        """
+        if token_counts is None:
+            token_counts = [count_tokens(text) for text in texts]
+
+        key = (model, dimensions)
+        pending = [_PendingText(text, tokens) for text, tokens in zip(texts, token_counts)]
+
+        with self._condition:
+            self._ensure_started()
+            self._embed_functions[key] = embed
+            self._limiters[key] = limiter
+            queue = self._queues.setdefault(key, [])
+            if not queue:
+                self._oldest[key] = time.monotonic()
+            queue.extend(pending)
+            self._stats['texts'] += len(pending)
+            self._condition.notify()
+
+        return [item.future for item in pending]
+
+    def embed_groups(
+        self,
+        groups: List[List[str]],
+        model: str,
+        dimensions: Optional[int],
+        embed: Callable[[List[str]], List[Dict[str, Any]]],
+        token_counts: Optional[List[List[int]]] = None,
+        limiter: Optional[EmbeddingRateLimiter] = None
+    ) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Same contract as run_embedding_batches(), but through the shared pool
+
+        Yields each group's results in group order once all of its texts are
+        embedded, so the caller can save progressively on its own thread.
+
+        Raises:
+            EmbeddingBatchError: if any text of a group could not be embedded;
+                the caller's texts that were not sent yet are withdrawn
+        """
+        futures = [
+            self.submit(texts, model, dimensions, embed, token_counts[index] if token_counts else None, limiter)
+            for index, texts in enumerate(groups)
+        ]
+        try:
+            for index, group_futures in enumerate(futures):
+                results = []
+                for future in group_futures:
+                    try:
+                        results.append(future.result())
+                    except EmbeddingBatchError:
+                        raise
+                    except Exception as e:
+                        raise EmbeddingBatchError(f"Embedding batch {index + 1} failed: {str(e)}") from e
+                yield index, results
+        finally:
+            # Withdraw whatever is still queued if the caller stops early
+            for group_futures in futures:
+                for future in group_futures:
+                    future.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            stats = dict(self._stats)
+            stats['queued'] = sum(len(queue) for queue in self._queues.values())
+        stats['window_ms'] = int(self.window_seconds * 1000)
+        stats['avg_texts_per_request'] = round(stats['texts'] / stats['requests'], 2) if stats['requests'] else 0.0
+        return stats
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix="embed-batch")
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                ready, wait = self._take_ready_batches()
+                if not ready:
+                    self._condition.wait(timeout=wait)
+                    continue
+
+            for key, items in ready:
+                self._executor.submit(self._dispatch, key, items)
+
+    def _take_ready_batches(self) -> Tuple[List[Tuple[Tuple[str, Optional[int]], List[_PendingText]]], Optional[float]]:
+        """Pop full batches and expired queues; returns (batches, seconds until the next deadline)"""
+        now = time.monotonic()
+        ready = []
+        next_deadline: Optional[float] = None
+
+        for key in list(self._queues):
+            # Callers that gave up cancelled their futures
+            queue = [item for item in self._queues[key] if not item.future.cancelled()]
+            expired = queue and now - self._oldest[key] >= self.window_seconds
+
+            groups = pack_by_tokens([item.tokens for item in queue], self.max_tokens, self.max_inputs)
+            taken = 0
+            for positions in groups:
+                is_full = positions[-1] < len(queue) - 1  # Something spilled over into the next group
+                if not (is_full or expired):
+                    break
+                ready.append((key, [queue[p] for p in positions]))
+                self._stats['full_flushes' if is_full else 'window_flushes'] += 1
+                taken = positions[-1] + 1
+
+            remaining = queue[taken:]
+            if remaining:
+                self._queues[key] = remaining
+                deadline = self._oldest[key] + self.window_seconds - now
+                next_deadline = deadline if next_deadline is None else min(next_deadline, deadline)
+            else:
+                del self._queues[key]
+                self._oldest.pop(key, None)
+
+        return ready, (max(next_deadline, 0.0) if next_deadline is not None else None)
+
+    def _dispatch(self, key: Tuple[str, Optional[int]], items: List[_PendingText]) -> None:
+        items = [item for item in items if item.future.set_running_or_notify_cancel()]
+        if not items:
+            return
+
+        with self._condition:
+            self._stats['requests'] += 1
+            embed = self._embed_functions[key]
+            limiter = self._limiters.get(key)
+
+        try:
+            results = embed_batch_with_retry([item.text for item in items], embed, limiter)
+            if len(results) != len(items):
+                raise EmbeddingBatchError(f"Embedding request returned {len(results)} vectors for {len(items)} texts")
+        except Exception as e:
+            with self._condition:
+                self._stats['failed_requests'] += 1
+            for item in items:
+                item.future.set_exception(e)
+            return
+
+        for item, result in zip(items, results):
+            item.future.set_result(result)
+
+
+shared_embedding_batcher = SharedEmbeddingBatcher(window_seconds=EMBED_COALESCE_WINDOW_MS / 1000.0)
@@ -0,0 +1,206 @@
+"""
+Embedding providers
+Everything that turns text into vectors (document chunks, retrieval queries)
+goes through a provider, selected by EMBED_PROVIDER:
+
+- "openai": OpenAI embeddings API (default)
+- "local": deterministic hashing projection computed on CPU in a process pool,
+  no network; for self-hosted deployments and load tests
+"""
+import multiprocessing
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from openai import OpenAI
+
+from app.core.config import OPENAI_API_KEY, EMBED_PROVIDER, EMBED_LOCAL_WORKERS
+from app.services.embedding_generation import embedding_request_options, MODEL_NATIVE_DIMENSIONS
+from app.services.embedding_pipeline import (
+    EmbeddingRateLimiter,
+    embedding_rate_limiter,
+    unlimited_rate_limiter,
+)
+from app.utils.hashing_embedder import hash_embed
+from app.utils.tokens import count_tokens
+
+
+class EmbeddingProvider(ABC):
+    """
+    Interface of an embedding backend
+
+    embed() makes one call for a list of texts and returns one dict per text:
+    {'embedding': List[float], 'dimensions': int, 'tokens': int}
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def supports(self, model: str) -> bool:
+        """Whether this provider can embed with the model"""
+
+    @abstractmethod
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Embed texts in one call"""
+
+    @property
+    def rate_limiter(self) -> EmbeddingRateLimiter:
+        """Budget the embedding pipeline must stay inside when calling embed()"""
+        return unlimited_rate_limiter
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API"""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = OPENAI_API_KEY):
+        self.client = OpenAI(api_key=api_key)
+
+    def supports(self, model: str) -> bool:
+        return not LocalEmbeddingProvider.owns(model)
+
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> List[Dict[str, Any]]:
+        response = self.client.embeddings.create(
+            input=texts,
+            model=model,
+            **embedding_request_options(model, dimensions)
+        )
+
+        return [
+            {
+                'embedding': embedding_data.embedding,
+                'dimensions': len(embedding_data.embedding),
+                'tokens': response.usage.total_tokens // len(texts)  # Approximate per-text tokens
+            }
+            for embedding_data in response.data
+        ]
+
+    @property
+    def rate_limiter(self) -> EmbeddingRateLimiter:
+        return embedding_rate_limiter
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Hashing projection of word unigrams/bigrams, computed on CPU
+
+    Small calls (retrieval queries) run inline to avoid inter-process
+    overhead; larger batches are split across a process pool so document
+    embedding does not hold the GIL of the API worker.
+    """
+
+    name = "local"
+    MODELS = ("local-hashing-v1",)
+    INLINE_MAX_TEXTS = 16
+
+    def __init__(self, workers: int = EMBED_LOCAL_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def owns(cls, model: str) -> bool:
+        return model in cls.MODELS
+
+    def supports(self, model: str) -> bool:
+        return self.owns(model)
+
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not self.supports(model):
+            raise ValueError(f"Local embedding provider does not serve model '{model}'")
+
+        dimensions = dimensions or MODEL_NATIVE_DIMENSIONS[model]
+
+        if self.workers <= 0 or len(texts) <= self.INLINE_MAX_TEXTS:
+            vectors = hash_embed(texts, dimensions)
+        else:
+            slice_size = -(-len(texts) // self.workers)
+            slices = [texts[i:i + slice_size] for i in range(0, len(texts), slice_size)]
+            pool = self._get_pool()
+            vectors = []
+            for part in pool.map(hash_embed, slices, [dimensions] * len(slices)):
+                vectors.extend(part)
+
+        return [
+            {
+                'embedding': vector,
+                'dimensions': dimensions,
+                'tokens': count_tokens(text)
+            }
+            for text, vector in zip(texts, vectors)
+        ]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a process that runs request threads can copy held locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                print(f"🧮 Started local embedding pool with {self.workers} processes")
+            return self._pool
+
+
+_providers: Dict[str, EmbeddingProvider] = {}
+_providers_lock = threading.Lock()
+
+# Set by benchmarks/scripts that embed with a stub instead of a real provider
+_override: Optional[EmbeddingProvider] = None
+
+_PROVIDER_CLASSES = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    LocalEmbeddingProvider.name: LocalEmbeddingProvider,
+}
+
+
+def _get_provider_instance(name: str) -> EmbeddingProvider:
+    with _providers_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = _PROVIDER_CLASSES[name]()
+            _providers[name] = provider
+        return provider
+
+
+def get_embedding_provider(model: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Provider to embed with
+
+    Args:
+        model: Embedding model; a model owned by another provider (e.g. the
+            local model of a generation built before switching EMBED_PROVIDER)
+            is routed to that provider. None means the configured one.
+
+    Returns:
+        Shared provider instance
+    """
+    if _override is not None:
+        return _override
+
+    if EMBED_PROVIDER not in _PROVIDER_CLASSES:
+        raise ValueError(f"Unknown EMBED_PROVIDER '{EMBED_PROVIDER}' (expected one of: {', '.join(_PROVIDER_CLASSES)})")
+
+    configured = _get_provider_instance(EMBED_PROVIDER)
+    if model is None or configured.supports(model):
+        return configured
+
+    for name in _PROVIDER_CLASSES:
+        provider = _get_provider_instance(name)
+        if provider.supports(model):
+            return provider
+
+    raise ValueError(f"No embedding provider serves model '{model}'")
+
+
+def set_embedding_provider_override(provider: Optional[EmbeddingProvider]) -> None:
+    """
+    Route every model to one provider (e.g. a stub in scripts/benchmark_retrieval.py)
+
+    Args:
+        provider: Provider to use for all models, or None to restore normal routing
+    """
+    global _override
+    _override = provider
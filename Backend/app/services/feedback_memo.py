@@ -0,0 +1,186 @@
+"""
+Feedback memoization
+The feedback prompt for an MCQ answer depends only on the question, its
+options, the chosen and correct letters, the rubric, the model and the
+retrieved course material. Students who pick the same option (or type the
+same short answer, up to case and whitespace) get the stored feedback
+instead of a new LLM call; each answer still gets its own ai_feedback row.
+Hit counts are statistics only: they are batched per worker and written
+best-effort, so serving a memo never waits on the memo row's lock.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from hashlib import sha256
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import FEEDBACK_MEMO_HIT_FLUSH_SECONDS
+from app.models.feedback_memo import FeedbackMemo
+from app.models.question import Question
+from app.services.question_context import current_context_stamp, question_hash
+from app.services.retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Question types whose answers repeat verbatim across students
+MEMO_QUESTION_TYPES = ("mcq", "short")
+
+# Hits not yet written to feedback_memos (memo_key -> (hits, last used))
+_pending_hits: Dict[str, Tuple[int, datetime]] = {}
+_hits_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def normalize_answer(answer_text: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of an answer"""
+    return normalize_query(answer_text or "").rstrip(".!?;, ")
+
+
+def feedback_memo_key(
+    db: Session,
+    question: Question,
+    answer_text: str,
+    rubric: Dict[str, Any],
+    ai_model: str
+) -> Optional[str]:
+    """
+    Memo key for an answer, or None if it should not be memoized
+
+    The key covers the question text and options, the normalized answer, the
+    correct answer, the merged rubric (its content is its version), the model
+    and the module's embedding version and generation, which together fix
+    the RAG context the prompt would include.
+    """
+    if question.type not in MEMO_QUESTION_TYPES:
+        return None
+
+    answer = normalize_answer(answer_text)
+    if not answer:
+        return None
+
+    embedding_version, generation_id = current_context_stamp(db, question.module_id)
+    if embedding_version is None:
+        return None
+
+    inputs = {
+        'question': question_hash(question),
+        'type': question.type,
+        'answer': answer,
+        'correct': question.correct_option_id or question.correct_answer,
+        'rubric': rubric,
+        'model': ai_model,
+        'embedding_version': embedding_version,
+        'generation_id': generation_id,
+    }
+    return sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_memoized_feedback(db: Session, memo_key: str) -> Optional[FeedbackMemo]:
+    """Stored feedback for a memo key (counts the hit), or None"""
+    memo = db.query(FeedbackMemo).filter(FeedbackMemo.memo_key == memo_key).first()
+    if memo is None:
+        return None
+
+    _record_hit(memo_key)
+    return memo
+
+
+def _record_hit(memo_key: str) -> None:
+    global _last_flush
+
+    now = datetime.utcnow()
+    with _hits_lock:
+        hits, _ = _pending_hits.get(memo_key, (0, now))
+        _pending_hits[memo_key] = (hits + 1, now)
+
+        if time.monotonic() - _last_flush < FEEDBACK_MEMO_HIT_FLUSH_SECONDS:
+            return
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+        _last_flush = time.monotonic()
+
+    flush_memo_hits(pending)
+
+
+def flush_memo_hits(pending: Optional[Dict[str, Tuple[int, datetime]]] = None) -> int:
+    """
+    Write batched memo hits to feedback_memos in one short transaction
+
+    Args:
+        pending: Hits to write (default: take every hit pending in this worker)
+
+    Returns:
+        Number of memo rows updated; hits that fail to write are dropped
+    """
+    if pending is None:
+        with _hits_lock:
+            pending = dict(_pending_hits)
+            _pending_hits.clear()
+    if not pending:
+        return 0
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for memo_key, (hits, last_used_at) in pending.items():
+            db.query(FeedbackMemo).filter(FeedbackMemo.memo_key == memo_key).update(
+                {
+                    FeedbackMemo.hit_count: FeedbackMemo.hit_count + hits,
+                    FeedbackMemo.last_used_at: func.greatest(FeedbackMemo.last_used_at, last_used_at)
+                },
+                synchronize_session=False
+            )
+        db.commit()
+        return len(pending)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️ Could not write {len(pending)} memo hit counts: {str(e)}")
+        return 0
+    finally:
+        db.close()
+
+
+def store_memoized_feedback(
+    db: Session,
+    memo_key: str,
+    question: Question,
+    answer_text: str,
+    feedback: Dict[str, Any],
+    rag_context: Optional[Dict[str, Any]],
+    ai_model: str
+) -> bool:
+    """
+    Save generated feedback under its memo key
+
+    Fallback feedback (LLM call or parsing failed) is not stored, so the next
+    identical answer tries again. If another worker stored the key first,
+    its row is kept.
+
+    Returns:
+        True if the feedback was stored
+    """
+    if feedback.get("fallback") or feedback.get("error"):
+        return False
+
+    used_rag = bool(rag_context and rag_context.get("has_context"))
+    db.execute(
+        insert(FeedbackMemo).values(
+            memo_key=memo_key,
+            question_id=question.id,
+            module_id=question.module_id,
+            answer_key=normalize_answer(answer_text),
+            feedback=json.loads(json.dumps(feedback, default=str)),
+            used_rag=used_rag,
+            rag_sources=rag_context.get("sources", []) if used_rag else None,
+            model_used=ai_model
+        ).on_conflict_do_nothing(index_elements=["memo_key"])
+    )
+    db.commit()
+    return True
@@ -0,0 +1,790 @@
+"""
+AI feedback job queue
+Submitted answers are enqueued in the feedback_jobs table and processed by
+any number of workers (scripts/feedback_worker.py). Workers claim jobs with
+SELECT ... FOR UPDATE SKIP LOCKED and hold them under a lease; a job whose
+worker dies is reclaimed when the lease expires, and failed jobs are retried
+with exponential backoff up to max_attempts.
+"""
+import os
+import uuid
+import socket
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    FEEDBACK_WORKER_PARALLELISM,
+    FEEDBACK_WORKER_POLL_SECONDS,
+    FEEDBACK_JOB_LEASE_SECONDS,
+    FEEDBACK_JOB_MAX_ATTEMPTS,
+    FEEDBACK_JOB_BACKOFF_SECONDS,
+    FEEDBACK_GROUP_SIZE,
+    FEEDBACK_QUESTION_GROUP_SIZE,
+    FEEDBACK_INLINE_DRAINS_MAX,
+    FEEDBACK_QUEUE_INLINE_DRAIN
+)
+from app.models.ai_feedback import AIFeedback
+from app.models.feedback_job import FeedbackJob, FeedbackJobStatus
+from app.models.student_answer import StudentAnswer
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def enqueue_feedback_jobs(db: Session, answers: List[StudentAnswer], batch_id: Optional[Any] = None) -> int:
+    """
+    Queue one feedback job per answer
+
+    Without a batch, answers that already have a job keep it (re-submitting
+    does not reset progress or retry counters). A batch adopts existing jobs
+    and requeues finished ones with fresh attempts, since the caller only
+    passes answers that still lack feedback.
+
+    Returns:
+        Number of jobs created or adopted
+    """
+    if not answers:
+        return 0
+
+    statement = insert(FeedbackJob).values([
+        {
+            'answer_id': answer.id,
+            'student_id': answer.student_id,
+            'module_id': answer.module_id,
+            'attempt': answer.attempt,
+            'batch_id': batch_id,
+            'max_attempts': FEEDBACK_JOB_MAX_ATTEMPTS,
+        }
+        for answer in answers
+    ])
+
+    if batch_id is None:
+        statement = statement.on_conflict_do_nothing(index_elements=["answer_id"])
+    else:
+        finished = FeedbackJob.status.in_([FeedbackJobStatus.SUCCEEDED, FeedbackJobStatus.FAILED])
+        statement = statement.on_conflict_do_update(
+            index_elements=["answer_id"],
+            set_={
+                'batch_id': batch_id,
+                'status': case((finished, FeedbackJobStatus.QUEUED), else_=FeedbackJob.status),
+                'attempts': case((finished, 0), else_=FeedbackJob.attempts),
+                'run_after': case((finished, func.now()), else_=FeedbackJob.run_after),
+                'completed_at': case((finished, None), else_=FeedbackJob.completed_at),
+                'updated_at': func.now(),
+            }
+        )
+
+    result = db.execute(statement)
+    db.commit()
+    return result.rowcount
+
+
+def claim_feedback_jobs(
+    db: Session,
+    worker_id: str,
+    limit: int,
+    answer_ids: Optional[List[Any]] = None,
+    batch_id: Optional[Any] = None,
+    by_question: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Lease up to `limit` runnable jobs to a worker
+
+    Runnable jobs are queued jobs past their backoff and running jobs whose
+    lease expired. Rows locked by another claimer are skipped, so concurrent
+    workers never receive the same job.
+
+    Args:
+        db: Database session
+        worker_id: Lease holder recorded on the jobs
+        limit: Maximum jobs to claim
+        answer_ids: Only claim jobs of these answers (inline draining)
+        batch_id: Only claim jobs of this batch
+        by_question: Claim answers to the same question together (sets 'question_id')
+
+    Returns:
+        List of {'id', 'answer_id', 'student_id', 'module_id', 'attempt', 'attempts', 'question_id'}
+    """
+    if limit <= 0:
+        return []
+
+    now = datetime.utcnow()
+    if by_question:
+        query = db.query(FeedbackJob, StudentAnswer.question_id).join(
+            StudentAnswer, StudentAnswer.id == FeedbackJob.answer_id
+        )
+    else:
+        query = db.query(FeedbackJob)
+    query = query.filter(or_(
+        and_(FeedbackJob.status == FeedbackJobStatus.QUEUED, FeedbackJob.run_after <= now),
+        and_(FeedbackJob.status == FeedbackJobStatus.RUNNING, FeedbackJob.lease_expires_at < now)
+    ))
+    if answer_ids is not None:
+        query = query.filter(FeedbackJob.answer_id.in_(answer_ids))
+    if batch_id is not None:
+        query = query.filter(FeedbackJob.batch_id == batch_id)
+
+    if by_question:
+        query = query.order_by(StudentAnswer.question_id, FeedbackJob.run_after)
+    else:
+        # Jobs of one submission are claimed together so they can be graded in one group
+        query = query.order_by(
+            FeedbackJob.run_after, FeedbackJob.student_id, FeedbackJob.module_id, FeedbackJob.attempt
+        )
+
+    rows = query.with_for_update(of=FeedbackJob, skip_locked=True).limit(limit).all()
+    if not by_question:
+        rows = [(job, None) for job in rows]
+
+    claimed = []
+    for job, question_id in rows:
+        if job.attempts >= job.max_attempts:
+            # The lease of the last allowed attempt expired (worker died mid-job)
+            job.status = FeedbackJobStatus.FAILED
+            job.last_error = job.last_error or "Lease expired"
+            job.locked_by = None
+            job.completed_at = now
+            continue
+
+        job.status = FeedbackJobStatus.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.lease_expires_at = now + timedelta(seconds=FEEDBACK_JOB_LEASE_SECONDS)
+        claimed.append({
+            'id': job.id,
+            'answer_id': job.answer_id,
+            'student_id': job.student_id,
+            'module_id': job.module_id,
+            'attempt': job.attempt,
+            'attempts': job.attempts,
+            'question_id': question_id,
+        })
+
+    db.commit()
+    return claimed
+
+
+def complete_feedback_job(db: Session, job_id: Any, worker_id: str) -> None:
+    db.query(FeedbackJob).filter(
+        FeedbackJob.id == job_id,
+        FeedbackJob.locked_by == worker_id
+    ).update({
+        'status': FeedbackJobStatus.SUCCEEDED,
+        'locked_by': None,
+        'lease_expires_at': None,
+        'last_error': None,
+        'completed_at': datetime.utcnow(),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def release_feedback_jobs(db: Session, job_ids: List[Any], worker_id: str) -> int:
+    """Hand claimed jobs back to the queue untouched (the claim's attempt is not counted)"""
+    if not job_ids:
+        return 0
+
+    released = db.query(FeedbackJob).filter(
+        FeedbackJob.id.in_(job_ids),
+        FeedbackJob.locked_by == worker_id,
+        FeedbackJob.status == FeedbackJobStatus.RUNNING
+    ).update({
+        'status': FeedbackJobStatus.QUEUED,
+        'attempts': FeedbackJob.attempts - 1,
+        'locked_by': None,
+        'lease_expires_at': None,
+    }, synchronize_session=False)
+    db.commit()
+    return released
+
+
+def retry_or_fail_feedback_job(db: Session, job_id: Any, worker_id: str, error: str) -> None:
+    """Requeue a failed job after an exponential backoff, or fail it for good"""
+    job = db.query(FeedbackJob).filter(
+        FeedbackJob.id == job_id,
+        FeedbackJob.locked_by == worker_id
+    ).with_for_update().first()
+    if job is None:
+        # Lease lost to another worker; its result stands
+        db.rollback()
+        return
+
+    now = datetime.utcnow()
+    job.last_error = error[:2000]
+    job.locked_by = None
+    job.lease_expires_at = None
+
+    if job.attempts >= job.max_attempts:
+        job.status = FeedbackJobStatus.FAILED
+        job.completed_at = now
+        logger.error(f"❌ Feedback job for answer {job.answer_id} failed after {job.attempts} attempts: {error}")
+    else:
+        delay = FEEDBACK_JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        job.status = FeedbackJobStatus.QUEUED
+        job.run_after = now + timedelta(seconds=delay)
+        logger.warning(f"⚠️ Feedback job for answer {job.answer_id} failed (attempt {job.attempts}), retrying in {delay:.0f}s: {error}")
+
+    db.commit()
+
+
+def run_feedback_job(job: Dict[str, Any], worker_id: str, preloaded: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Generate and store feedback for one claimed job (own database session)
+
+    Args:
+        job: Claimed job (from claim_feedback_jobs)
+        worker_id: Lease holder
+        preloaded: {'questions': {question_id: Question}, 'rubric': dict} shared
+            by a batch's jobs (see preload_feedback_batch)
+
+    Returns:
+        True if the job succeeded
+    """
+    from app.database import SessionLocal
+    from app.services.ai_feedback import AIFeedbackService
+    from app.crud.ai_feedback import get_feedback_by_answer
+
+    db = SessionLocal()
+    try:
+        answer = db.query(StudentAnswer).filter(StudentAnswer.id == job['answer_id']).first()
+        if answer is None:
+            raise ValueError(f"Answer {job['answer_id']} not found")
+
+        preloaded = preloaded or {}
+        feedback = AIFeedbackService().generate_instant_feedback(
+            db=db,
+            student_answer=answer,
+            question_id=str(answer.question_id),
+            module_id=str(job['module_id']),
+            question=preloaded.get('questions', {}).get(answer.question_id),
+            rubric=preloaded.get('rubric')
+        )
+        if feedback.get("error"):
+            raise RuntimeError(feedback.get("message", "Feedback generation failed"))
+        if get_feedback_by_answer(db, answer.id) is None:
+            raise RuntimeError("Feedback was generated but not saved")
+
+        complete_feedback_job(db, job['id'], worker_id)
+        return True
+
+    except Exception as e:
+        db.rollback()
+        try:
+            retry_or_fail_feedback_job(db, job['id'], worker_id, str(e))
+        except Exception as update_error:
+            # The lease expires and another claim retries the job
+            db.rollback()
+            logger.error(f"❌ Could not record failure of feedback job {job['id']}: {str(update_error)}")
+        return False
+    finally:
+        db.close()
+
+
+def group_claimed_jobs(jobs: List[Dict[str, Any]], group_size: int = FEEDBACK_GROUP_SIZE) -> List[List[Dict[str, Any]]]:
+    """
+    Split claimed jobs into per-submission groups of at most `group_size`
+
+    A submission with more answers than fit one group is split into groups
+    of even size (20 answers with a size of 8 become 7 + 7 + 6).
+    """
+    submissions: Dict[Any, List[Dict[str, Any]]] = {}
+    for job in jobs:
+        submissions.setdefault((job['student_id'], job['module_id'], job['attempt']), []).append(job)
+
+    group_size = max(group_size, 1)
+    groups = []
+    for submission_jobs in submissions.values():
+        count = -(-len(submission_jobs) // group_size)
+        for index in range(count):
+            groups.append(submission_jobs[index::count])
+    return groups
+
+
+def group_claimed_jobs_by_question(
+    jobs: List[Dict[str, Any]],
+    questions: Dict[Any, Any],
+    group_size: int = FEEDBACK_QUESTION_GROUP_SIZE
+) -> List[Tuple[Optional[Any], List[Dict[str, Any]]]]:
+    """
+    Split jobs claimed by_question into groups for cross-student grading
+
+    Jobs of open-ended (short/long) questions are grouped per question in
+    groups of even size; the other jobs are grouped per submission.
+
+    Returns:
+        List of (question id, or None for a submission group; jobs)
+    """
+    by_question: Dict[Any, List[Dict[str, Any]]] = {}
+    rest = []
+    for job in jobs:
+        question = questions.get(job.get('question_id'))
+        if question is not None and question.type != 'mcq':
+            by_question.setdefault(question.id, []).append(job)
+        else:
+            rest.append(job)
+
+    group_size = max(group_size, 1)
+    groups = []
+    for question_id, question_jobs in by_question.items():
+        count = -(-len(question_jobs) // group_size)
+        for index in range(count):
+            groups.append((question_id, question_jobs[index::count]))
+
+    groups.extend((None, group) for group in group_claimed_jobs(rest))
+    return groups
+
+
+def _release_excess_groups(
+    groups: List[Tuple[Optional[Any], List[Dict[str, Any]]]],
+    free: int,
+    worker_id: str
+) -> List[Tuple[Optional[Any], List[Dict[str, Any]]]]:
+    """
+    Keep the first `free` groups of a claim and release the other groups' jobs
+
+    A claim of free * group_size jobs can split into more groups than free
+    slots; queued behind the slots, their leases would run out unprocessed.
+    """
+    if len(groups) <= free:
+        return groups
+
+    from app.database import SessionLocal
+
+    excess = [job['id'] for _, group in groups[free:] for job in group]
+    db = SessionLocal()
+    try:
+        release_feedback_jobs(db, excess, worker_id)
+    except Exception as e:
+        # Their leases expire and another claim picks them up
+        db.rollback()
+        logger.error(f"❌ Could not release {len(excess)} feedback jobs: {str(e)}")
+    finally:
+        db.close()
+    return groups[:free]
+
+
+def run_feedback_job_group(
+    jobs: List[Dict[str, Any]],
+    worker_id: str,
+    preloaded: Optional[Dict[str, Any]] = None,
+    question_id: Optional[Any] = None
+) -> List[bool]:
+    """
+    Generate and store feedback for a group of claimed jobs with grouped LLM calls
+
+    Each job is completed or retried on its own: answers the grouped call
+    could not grade are regraded singly by the service, and only answers
+    whose feedback still was not saved are retried.
+
+    Args:
+        jobs: Claimed jobs of one student, module and attempt (from group_claimed_jobs),
+            or of different students answering question_id
+        worker_id: Lease holder
+        preloaded: Questions and rubric shared by a batch's jobs (see preload_feedback_batch)
+        question_id: Grade the jobs as answers to this question (generate_question_feedback)
+
+    Returns:
+        Success of each job, in order
+    """
+    if len(jobs) == 1:
+        return [run_feedback_job(jobs[0], worker_id, preloaded)]
+
+    from app.database import SessionLocal
+    from app.models.question import Question
+    from app.services.ai_feedback import AIFeedbackService
+
+    db = SessionLocal()
+    results = []
+    try:
+        answers = db.query(StudentAnswer).filter(
+            StudentAnswer.id.in_([job['answer_id'] for job in jobs])
+        ).all()
+
+        preloaded = preloaded or {}
+        if question_id is not None:
+            question = preloaded.get('questions', {}).get(question_id) or db.query(Question).filter(
+                Question.id == question_id
+            ).first()
+            if question is None:
+                raise ValueError(f"Question {question_id} not found")
+            feedback = AIFeedbackService().generate_question_feedback(
+                db=db,
+                student_answers=answers,
+                question=question,
+                module_id=str(jobs[0]['module_id']),
+                rubric=preloaded.get('rubric')
+            )
+        else:
+            feedback = AIFeedbackService().generate_submission_feedback(
+                db=db,
+                student_answers=answers,
+                module_id=str(jobs[0]['module_id']),
+                questions=preloaded.get('questions'),
+                rubric=preloaded.get('rubric')
+            )
+        saved = {row[0] for row in db.query(AIFeedback.answer_id).filter(
+            AIFeedback.answer_id.in_([job['answer_id'] for job in jobs])
+        ).all()}
+
+        for job in jobs:
+            answer_feedback = feedback.get(job['answer_id'])
+            if job['answer_id'] in saved:
+                complete_feedback_job(db, job['id'], worker_id)
+                results.append(True)
+                continue
+
+            if answer_feedback is None:
+                error = f"Answer {job['answer_id']} not found"
+            elif answer_feedback.get("error"):
+                error = answer_feedback.get("message", "Feedback generation failed")
+            else:
+                error = "Feedback was generated but not saved"
+            retry_or_fail_feedback_job(db, job['id'], worker_id, error)
+            results.append(False)
+
+        return results
+
+    except Exception as e:
+        db.rollback()
+        for job in jobs[len(results):]:
+            try:
+                retry_or_fail_feedback_job(db, job['id'], worker_id, str(e))
+            except Exception as update_error:
+                # The lease expires and another claim retries the job
+                db.rollback()
+                logger.error(f"❌ Could not record failure of feedback job {job['id']}: {str(update_error)}")
+            results.append(False)
+        return results
+    finally:
+        db.close()
+
+
+def preload_feedback_batch(db: Session, batch_id: Any) -> Dict[str, Any]:
+    """
+    Load a batch's questions and its module rubric once for all of its jobs
+
+    Returns:
+        {'questions': {question_id: Question}, 'rubric': dict or None}
+        (detached objects, read-only across threads)
+    """
+    from app.models.question import Question
+    from app.services.rubric import get_module_rubric
+
+    question_ids = db.query(StudentAnswer.question_id).join(
+        FeedbackJob, FeedbackJob.answer_id == StudentAnswer.id
+    ).filter(FeedbackJob.batch_id == batch_id).distinct()
+
+    questions = db.query(Question).filter(Question.id.in_(question_ids)).all()
+
+    module_ids = [row[0] for row in db.query(FeedbackJob.module_id).filter(
+        FeedbackJob.batch_id == batch_id
+    ).distinct().all()]
+    rubric = get_module_rubric(db, module_ids[0]) if len(module_ids) == 1 else None
+
+    db.expunge_all()
+    return {'questions': {question.id: question for question in questions}, 'rubric': rubric}
+
+
+def drain_feedback_jobs(
+    answer_ids: Optional[List[Any]] = None,
+    parallelism: int = FEEDBACK_WORKER_PARALLELISM,
+    worker_id: Optional[str] = None,
+    batch_id: Optional[Any] = None,
+    group_by: str = "submission"
+) -> Dict[str, int]:
+    """
+    Process runnable jobs until none are left, then return
+
+    Used by `feedback_worker.py --once` and, through start_inline_drain,
+    after a test submission or batch request. Jobs waiting out a retry backoff
+    are left to the worker. Each claim is split into per-submission
+    groups (see group_claimed_jobs); each group runs in its own thread and
+    session, and a slot is refilled as soon as its group finishes. A batch drained with group_by="question" instead claims answers
+    to the same question together and grades open-ended ones across students
+    (see group_claimed_jobs_by_question).
+
+    Args:
+        answer_ids: Only process these answers' jobs (None = every runnable job)
+        parallelism: Job groups processed concurrently
+        worker_id: Lease holder name (default: host and process id)
+        batch_id: Only process this batch's jobs, with its questions and rubric preloaded
+        group_by: "submission" or "question" (batches only)
+
+    Returns:
+        {'succeeded': n, 'failed': n} for attempts made by this call
+    """
+    from app.database import SessionLocal
+
+    worker_id = worker_id or default_worker_id()
+    counts = {'succeeded': 0, 'failed': 0}
+
+    preloaded = None
+    if batch_id is not None:
+        db = SessionLocal()
+        try:
+            preloaded = preload_feedback_batch(db, batch_id)
+        finally:
+            db.close()
+
+    by_question = group_by == "question" and preloaded is not None
+    group_size = FEEDBACK_QUESTION_GROUP_SIZE if by_question else FEEDBACK_GROUP_SIZE
+
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max(parallelism, 1), thread_name_prefix="feedback-job") as executor:
+        while True:
+            # Refill free slots as groups finish instead of waiting for the slowest group
+            free = parallelism - len(in_flight)
+            jobs = []
+            if free > 0:
+                db = SessionLocal()
+                try:
+                    jobs = claim_feedback_jobs(
+                        db, worker_id, free * group_size, answer_ids, batch_id, by_question=by_question
+                    )
+                finally:
+                    db.close()
+
+            if by_question:
+                groups = group_claimed_jobs_by_question(jobs, preloaded['questions'])
+            else:
+                groups = [(None, group) for group in group_claimed_jobs(jobs)]
+            for question_id, group in _release_excess_groups(groups, free, worker_id):
+                in_flight.add(executor.submit(run_feedback_job_group, group, worker_id, preloaded, question_id))
+
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                for succeeded in future.result():
+                    counts['succeeded' if succeeded else 'failed'] += 1
+
+    return counts
+
+
+# Inline drains running in this process (each holds up to `parallelism` connections)
+_inline_drains = threading.BoundedSemaphore(max(FEEDBACK_INLINE_DRAINS_MAX, 1))
+
+
+def start_inline_drain(background_tasks: Any, **kwargs) -> bool:
+    """
+    Schedule drain_feedback_jobs_inline as a request's background task, at
+    most FEEDBACK_INLINE_DRAINS_MAX at a time per process
+
+    The slot is reserved here (and released when the drain ends), so the
+    response can tell whether the jobs are being processed.
+
+    Args:
+        background_tasks: The request's FastAPI BackgroundTasks
+        **kwargs: drain_feedback_jobs arguments
+
+    Returns:
+        True if a drain was scheduled, False if FEEDBACK_QUEUE_INLINE_DRAIN
+        is off or every slot is busy (the jobs stay queued)
+    """
+    if not FEEDBACK_QUEUE_INLINE_DRAIN:
+        return False
+    if not _inline_drains.acquire(blocking=False):
+        logger.info("⏭️ Inline feedback drain skipped (limit reached), jobs stay queued")
+        return False
+    try:
+        background_tasks.add_task(drain_feedback_jobs_inline, **kwargs)
+    except Exception:
+        _inline_drains.release()
+        raise
+    return True
+
+
+def drain_feedback_jobs_inline(**kwargs) -> Dict[str, int]:
+    """
+    Body of an inline drain scheduled by start_inline_drain (holds its slot)
+
+    After the request's own jobs, every other runnable job is drained too
+    (jobs of skipped drains, retries past their backoff, expired leases), so
+    deployments without a feedback worker still process the whole queue.
+
+    Returns:
+        drain_feedback_jobs counts of both passes
+    """
+    try:
+        counts = drain_feedback_jobs(**kwargs)
+        swept = drain_feedback_jobs(parallelism=kwargs.get('parallelism', FEEDBACK_WORKER_PARALLELISM))
+        return {key: counts[key] + swept[key] for key in counts}
+    finally:
+        _inline_drains.release()
+
+
+def run_feedback_worker(
+    parallelism: int = FEEDBACK_WORKER_PARALLELISM,
+    poll_seconds: float = FEEDBACK_WORKER_POLL_SECONDS,
+    stop_event: Optional[threading.Event] = None,
+    worker_id: Optional[str] = None
+) -> None:
+    """
+    Long-running worker loop: keep up to `parallelism` job groups in flight
+
+    Claims only as many jobs as free slots can take (FEEDBACK_GROUP_SIZE
+    per slot) and releases the groups beyond the free slots, so other
+    workers get the rest. Returns once stop_event is set and in-flight jobs finished.
+    """
+    from app.database import SessionLocal
+
+    worker_id = worker_id or default_worker_id()
+    stop_event = stop_event or threading.Event()
+    in_flight = set()
+
+    logger.info(f"🚀 Feedback worker {worker_id} started (parallelism {parallelism})")
+
+    with ThreadPoolExecutor(max_workers=max(parallelism, 1), thread_name_prefix="feedback-job") as executor:
+        while not stop_event.is_set():
+            free = parallelism - len(in_flight)
+            jobs = []
+            if free > 0:
+                db = SessionLocal()
+                try:
+                    jobs = claim_feedback_jobs(db, worker_id, free * FEEDBACK_GROUP_SIZE)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"❌ Claiming feedback jobs failed: {str(e)}")
+                finally:
+                    db.close()
+
+            groups = [(None, group) for group in group_claimed_jobs(jobs)]
+            for _, group in _release_excess_groups(groups, free, worker_id):
+                in_flight.add(executor.submit(run_feedback_job_group, group, worker_id))
+
+            if in_flight:
+                _, in_flight = wait(in_flight, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            else:
+                stop_event.wait(poll_seconds)
+
+        wait(in_flight)
+
+    logger.info(f"🛑 Feedback worker {worker_id} stopped")
+
+
+def get_attempt_feedback_progress(db: Session, student_id: str, module_id: Any, attempt: int) -> Dict[str, Any]:
+    """
+    Feedback progress of one test attempt from three aggregate queries
+
+    Returns:
+        Counts of answers, stored feedback and jobs per status
+    """
+    answer_scope = and_(
+        StudentAnswer.student_id == student_id,
+        StudentAnswer.module_id == module_id,
+        StudentAnswer.attempt == attempt
+    )
+
+    total = db.query(func.count(StudentAnswer.id)).filter(answer_scope).scalar() or 0
+    ready = db.query(func.count(AIFeedback.id)).join(
+        StudentAnswer, AIFeedback.answer_id == StudentAnswer.id
+    ).filter(answer_scope).scalar() or 0
+
+    jobs = dict(db.query(FeedbackJob.status, func.count(FeedbackJob.id)).filter(
+        FeedbackJob.student_id == student_id,
+        FeedbackJob.module_id == module_id,
+        FeedbackJob.attempt == attempt
+    ).group_by(FeedbackJob.status).all())
+
+    queued = jobs.get(FeedbackJobStatus.QUEUED, 0)
+    running = jobs.get(FeedbackJobStatus.RUNNING, 0)
+    failed = jobs.get(FeedbackJobStatus.FAILED, 0)
+
+    return {
+        "total_questions": total,
+        "feedback_ready": ready,
+        "feedback_pending": max(total - ready, 0),
+        "jobs_queued": queued,
+        "jobs_running": running,
+        "jobs_failed": failed,
+        "progress_percentage": int((ready / total) * 100) if total > 0 else 0,
+        # Nothing left to wait for (answers without feedback here had their job fail)
+        "all_complete": queued == 0 and running == 0
+    }
+
+
+def start_feedback_batch(
+    db: Session,
+    module_id: Any,
+    attempt: int,
+    student_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Queue feedback for every answer of a module attempt that has none yet
+
+    Answers with feedback are filtered out in the same query that loads
+    the answers.
+
+    Returns:
+        {'batch_id', 'total_answers', 'already_have_feedback', 'queued'}
+        (batch_id is None when nothing needed feedback)
+    """
+    query = db.query(StudentAnswer, AIFeedback.id).outerjoin(
+        AIFeedback, AIFeedback.answer_id == StudentAnswer.id
+    ).filter(
+        StudentAnswer.module_id == module_id,
+        StudentAnswer.attempt == attempt
+    )
+    if student_id:
+        query = query.filter(StudentAnswer.student_id == student_id)
+
+    rows = query.all()
+    pending = [answer for answer, feedback_id in rows if feedback_id is None]
+
+    batch_id = uuid.uuid4() if pending else None
+    queued = enqueue_feedback_jobs(db, pending, batch_id=batch_id) if pending else 0
+
+    return {
+        'batch_id': batch_id,
+        'total_answers': len(rows),
+        'already_have_feedback': len(rows) - len(pending),
+        'queued': queued,
+    }
+
+
+def get_feedback_batch_progress(db: Session, batch_id: Any) -> Optional[Dict[str, Any]]:
+    """
+    Job counts of a feedback batch
+
+    Returns:
+        Progress dict, or None if no job belongs to the batch
+    """
+    counts = dict(db.query(FeedbackJob.status, func.count(FeedbackJob.id)).filter(
+        FeedbackJob.batch_id == batch_id
+    ).group_by(FeedbackJob.status).all())
+    if not counts:
+        return None
+
+    total = sum(counts.values())
+    succeeded = counts.get(FeedbackJobStatus.SUCCEEDED, 0)
+    failed = counts.get(FeedbackJobStatus.FAILED, 0)
+
+    failed_answers = [
+        {'answer_id': str(answer_id), 'error': error}
+        for answer_id, error in db.query(FeedbackJob.answer_id, FeedbackJob.last_error).filter(
+            FeedbackJob.batch_id == batch_id,
+            FeedbackJob.status == FeedbackJobStatus.FAILED
+        ).limit(50).all()
+    ]
+
+    return {
+        'batch_id': str(batch_id),
+        'total_jobs': total,
+        'queued': counts.get(FeedbackJobStatus.QUEUED, 0),
+        'running': counts.get(FeedbackJobStatus.RUNNING, 0),
+        'succeeded': succeeded,
+        'failed': failed,
+        'progress_percentage': int(((succeeded + failed) / total) * 100),
+        'all_complete': succeeded + failed == total,
+        'failed_answers': failed_answers,
+    }
@@ -0,0 +1,205 @@
+"""
+In-process BM25 index for module-scoped lexical search
+Inverted index over the retrievable chunks of a module, rebuilt lazily when
+the module's embedding_version changes (uploads, deletions, status changes)
+"""
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.document_chunk import DocumentChunk
+from app.services.vector_index import get_module_embedding_version
+
+
+# BM25 parameters (Robertson/Sparck Jones defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how i if in into is it its
+me my of on or our so than that the their them then there these they this to was we were what when where
+which who whom why will with would you your question answer
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+class ModuleLexicalIndex:
+    """
+    BM25 postings for one module
+
+    Besides the BM25 score, search() reports each hit's coverage: the
+    IDF-weighted share of the query terms that occur in the chunk (0-1).
+    Coverage is comparable across queries, so it serves as the lexical
+    similarity and as the confidence for the lexical fast path.
+    """
+
+    def __init__(
+        self,
+        module_id: str,
+        version: int,
+        chunk_ids: List[Any],
+        document_ids: List[Any],
+        postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        lengths: np.ndarray
+    ):
+        self.module_id = module_id
+        self.version = version
+        self.chunk_ids = chunk_ids
+        self.document_ids = document_ids
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def idf(self, term: str) -> float:
+        rows = self.postings.get(term)
+        df = len(rows[0]) if rows is not None else 0
+        return math.log(1.0 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def search(self, query_text: str, limit: int = 5) -> List[Tuple[Any, Any, float, float]]:
+        """
+        Return the top-k chunks for a query by BM25
+
+        Args:
+            query_text: The search query
+            limit: Number of results to return
+
+        Returns:
+            List of (chunk_id, document_id, bm25 score, coverage) sorted by score
+        """
+        terms = set(tokenize(query_text))
+        if not terms or len(self) == 0 or limit <= 0:
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched_weight = np.zeros(len(self), dtype=np.float32)
+        total_weight = 0.0
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.average_length, 1.0))
+
+        for term in terms:
+            # Unknown terms still count against coverage (with the highest IDF)
+            weight = self.idf(term)
+            total_weight += weight
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            rows, frequencies = postings
+            scores[rows] += weight * frequencies * (BM25_K1 + 1) / (frequencies + length_norm[rows])
+            matched_weight[rows] += weight
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+
+        top = matched[np.argsort(-scores[matched], kind="stable")[:limit]]
+        return [
+            (self.chunk_ids[row], self.document_ids[row], float(scores[row]), float(matched_weight[row] / total_weight))
+            for row in top
+        ]
+
+
+def build_module_lexical_index(db: Session, module_id: str, version: int) -> ModuleLexicalIndex:
+    """
+    Tokenize the module's retrievable chunks into BM25 postings
+
+    Args:
+        db: Database session
+        module_id: Module ID
+        version: Module embedding version the index is built from
+
+    Returns:
+        ModuleLexicalIndex
+    """
+    rows = db.query(
+        DocumentChunk.id,
+        DocumentChunk.document_id,
+        DocumentChunk.chunk_text
+    ).filter(
+        DocumentChunk.module_id == module_id,
+        DocumentChunk.retrievable == True
+    ).yield_per(1000)
+
+    chunk_ids, document_ids, lengths = [], [], []
+    term_rows: Dict[str, List[int]] = {}
+    term_frequencies: Dict[str, List[int]] = {}
+
+    for position, (chunk_id, document_id, chunk_text) in enumerate(rows):
+        tokens = tokenize(chunk_text or "")
+        chunk_ids.append(chunk_id)
+        document_ids.append(document_id)
+        lengths.append(len(tokens))
+
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            term_rows.setdefault(token, []).append(position)
+            term_frequencies.setdefault(token, []).append(count)
+
+    postings = {
+        term: (np.array(term_rows[term], dtype=np.int32), np.array(term_frequencies[term], dtype=np.float32))
+        for term in term_rows
+    }
+
+    return ModuleLexicalIndex(
+        module_id=module_id,
+        version=version,
+        chunk_ids=chunk_ids,
+        document_ids=document_ids,
+        postings=postings,
+        lengths=np.array(lengths, dtype=np.float32)
+    )
+
+
+_indexes: Dict[str, ModuleLexicalIndex] = {}
+_lock = threading.Lock()
+
+
+def get_module_lexical_index(db: Session, module_id: str) -> Optional[ModuleLexicalIndex]:
+    """
+    Get the cached BM25 index for a module, building it lazily
+
+    Like the vector index, the module's embedding_version is re-read before
+    serving a cached copy, so every worker picks up new or removed documents.
+
+    Args:
+        db: Database session
+        module_id: Module ID
+
+    Returns:
+        ModuleLexicalIndex, or None if the module no longer exists
+    """
+    module_id = str(module_id)
+    version = get_module_embedding_version(db, module_id)
+
+    if version is None:
+        with _lock:
+            _indexes.pop(module_id, None)
+        return None
+
+    with _lock:
+        index = _indexes.get(module_id)
+    if index is not None and index.version == version:
+        return index
+
+    index = build_module_lexical_index(db, module_id, version)
+
+    with _lock:
+        current = _indexes.get(module_id)
+        if current is None or current.version <= version:
+            _indexes[module_id] = index
+
+    print(f"🔤 Built lexical index for module {module_id} (version {version}): {len(index)} chunks, {len(index.postings)} terms")
+    return index
@@ -10,6 +10,7 @@ import os
 import shutil
 from pathlib import Path
 from app.services.storage import storage_service
+from app.services.vector_index import remove_document_index
 
 def get_or_create_module(db: Session, teacher_id: str, module_name: str) -> Module:
     # Validate inputs
@@ -135,13 +136,8 @@ def delete_module_with_documents(db: Session, module_id: str) -> bool:
                 except Exception as e:
                     print(f"Failed to delete local file {document.storage_path}: {e}")
 
-            # Also delete the JSON index file if it exists
-            if hasattr(document, 'index_path') and document.index_path and os.path.exists(document.index_path):
-                try:
-                    os.remove(document.index_path)
-                    print(f"Deleted index file: {document.index_path}")
-                except Exception as e:
-                    print(f"Failed to delete index file {document.index_path}: {e}")
+            # Also delete the document's vector index files if they exist
+            remove_document_index(document)
 
         # Delete database records in proper order (respecting foreign keys)
         # Using individual record deletion instead of bulk delete to avoid SQLAlchemy issues
@@ -291,6 +287,10 @@ def delete_module_with_documents(db: Session, module_id: str) -> bool:
         db.delete(module)
         db.commit()
 
+        # Other workers drop their copy when they find the module row gone
+        from app.services.vector_index import invalidate_module_index
+        invalidate_module_index(str(module_id))
+
         print(f"Successfully deleted module '{module.name}' with all associated data:")
         print(f"  - {documents_count} documents")
         print(f"  - {questions_count} questions")
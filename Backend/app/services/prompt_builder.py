@@ -2,7 +2,7 @@
 Dynamic prompt builder for AI feedback
 Builds prompts based on rubric settings, question type, and RAG context
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 
 def build_mcq_feedback_prompt(
@@ -132,12 +132,7 @@ def build_mcq_feedback_prompt(
     prompt_parts.append("")
 
     # 7. Base tone guidance (can be overridden by custom instructions)
-    tone_guidance = {
-        "encouraging": "Keep explanations supportive and motivating. Focus on learning and growth.",
-        "neutral": "Keep explanations objective and factual. Focus on accuracy and understanding.",
-        "strict": "Keep explanations precise and rigorous. Maintain high standards for correctness."
-    }
-    prompt_parts.append(tone_guidance.get(tone, tone_guidance["encouraging"]))
+    prompt_parts.append(get_tone_guidance(tone, "mcq"))
 
     if include_examples:
         prompt_parts.append("Include specific examples when helpful.")
@@ -145,27 +140,7 @@ def build_mcq_feedback_prompt(
     prompt_parts.append("")
 
     # 8. CUSTOM TEACHER INSTRUCTIONS (HIGHEST PRIORITY - OVERRIDES ALL OTHER TONE/STYLE SETTINGS)
-    if custom_instructions:
-        prompt_parts.append("=" * 80)
-        prompt_parts.append("⚠️ CRITICAL: TEACHER'S CUSTOM INSTRUCTIONS - FOLLOW THESE EXACTLY")
-        prompt_parts.append("=" * 80)
-        prompt_parts.append(custom_instructions)
-        prompt_parts.append("")
-
-        # Detect harsh/strict language and reinforce it
-        instruction_lower = custom_instructions.lower()
-        harsh_keywords = ["harsh", "scold", "strict", "tough", "rigorous", "demanding", "critical"]
-        if any(keyword in instruction_lower for keyword in harsh_keywords):
-            prompt_parts.append("⚠️ IMPORTANT: The teacher explicitly wants a strict/harsh approach.")
-            prompt_parts.append("- DO NOT soften your language or be overly encouraging")
-            prompt_parts.append("- Point out mistakes directly and clearly")
-            prompt_parts.append("- Express disappointment or concern when appropriate")
-            prompt_parts.append("- Be demanding and set high expectations")
-            prompt_parts.append("- The goal is to push the student to do better through tough feedback")
-
-        prompt_parts.append("")
-        prompt_parts.append("REMINDER: Teacher's instructions above take ABSOLUTE PRIORITY over any previous tone settings.")
-        prompt_parts.append("=" * 80)
+    prompt_parts.extend(format_custom_instructions(custom_instructions))
 
     return "\n".join(prompt_parts)
 
@@ -254,23 +229,7 @@ def build_text_feedback_prompt(
         prompt_parts.append("")
 
     # 5. Question-type specific requirements
-    min_length = type_settings.get("minimum_length", 0)
-    check_grammar = type_settings.get("check_grammar", False)
-    require_structure = type_settings.get("require_structure", False)
-    check_citations = type_settings.get("check_citations", False)
-    min_paragraphs = type_settings.get("minimum_paragraphs", 0)
-
-    specific_requirements = []
-    if min_length > 0:
-        specific_requirements.append(f"Minimum length: {min_length} characters")
-    if check_grammar:
-        specific_requirements.append("Check for grammar and language quality")
-    if require_structure:
-        specific_requirements.append("Evaluate response structure and organization")
-    if check_citations:
-        specific_requirements.append("Check for proper citations and evidence")
-    if min_paragraphs > 0:
-        specific_requirements.append(f"Expected minimum: {min_paragraphs} paragraphs")
+    specific_requirements = get_specific_requirements(type_settings)
 
     if specific_requirements:
         prompt_parts.append("Specific Requirements:")
@@ -307,12 +266,7 @@ def build_text_feedback_prompt(
     prompt_parts.append("")
 
     # 8. Base tone guidance (can be overridden by custom instructions)
-    tone_guidance = {
-        "encouraging": "Be constructive and supportive. Highlight both strengths and areas for growth. Focus on helping the student improve.",
-        "neutral": "Be objective and analytical. Provide balanced feedback focusing on accuracy and understanding.",
-        "strict": "Maintain high standards. Be specific about what's missing or incorrect. Reference exact requirements."
-    }
-    prompt_parts.append(tone_guidance.get(tone, tone_guidance["encouraging"]))
+    prompt_parts.append(get_tone_guidance(tone, question_type))
 
     if include_examples:
         prompt_parts.append("Provide specific examples to illustrate your points.")
@@ -320,27 +274,280 @@ def build_text_feedback_prompt(
     prompt_parts.append("")
 
     # 9. CUSTOM TEACHER INSTRUCTIONS (HIGHEST PRIORITY - OVERRIDES ALL OTHER TONE/STYLE SETTINGS)
-    if custom_instructions:
-        prompt_parts.append("=" * 80)
-        prompt_parts.append("⚠️ CRITICAL: TEACHER'S CUSTOM INSTRUCTIONS - FOLLOW THESE EXACTLY")
-        prompt_parts.append("=" * 80)
-        prompt_parts.append(custom_instructions)
+    prompt_parts.extend(format_custom_instructions(custom_instructions))
+
+    return "\n".join(prompt_parts)
+
+
+def build_group_feedback_prompt(
+    items: List[Dict[str, Any]],
+    rubric: Dict[str, Any],
+    shared_context: str = ""
+) -> str:
+    """
+    Build one prompt grading several answers of a submission
+
+    The rubric, tone and teacher instructions and the course material are
+    stated once for all items; the model returns a JSON array with one
+    feedback object per item.
+
+    Args:
+        items: Answers to grade, each a dict with 'question_type', 'question_text',
+            'options', 'student_answer', 'correct_answer' (None if not set),
+            'is_correct' (MCQ only, None if unknown) and 'sources' (course
+            material source numbers relevant to the item)
+        rubric: Rubric configuration
+        shared_context: Course material section (format_shared_context), "" if none
+
+    Returns:
+        Complete prompt string for AI
+    """
+    # Extract rubric settings
+    grading_criteria = rubric.get("grading_criteria", {})
+    feedback_style = rubric.get("feedback_style", {})
+    custom_instructions = rubric.get("custom_instructions", "")
+    type_settings = rubric.get("question_type_settings", {})
+
+    tone = feedback_style.get("tone", "encouraging")
+    detail_level = feedback_style.get("detail_level", "detailed")
+    include_examples = feedback_style.get("include_examples", True)
+
+    prompt_parts = []
+
+    # 1. Base instruction
+    prompt_parts.append(f"Analyze the following {len(items)} answers from one student's test and provide {tone}, {detail_level} educational feedback on each answer.")
+    prompt_parts.append("Grade every item independently, based only on its own question and answer.")
+    prompt_parts.append("")
+    prompt_parts.append("⚠️ IMPORTANT: NEVER reveal a correct option or reference answer directly in your feedback. Instead, provide:")
+    prompt_parts.append("- Comprehensive hints and guiding questions")
+    prompt_parts.append("- Conceptual explanations of the topic")
+    prompt_parts.append("- Reasoning about why the student's answer may or may not be optimal")
+    prompt_parts.append("Your goal is to help the student LEARN and DISCOVER the answer themselves.")
+    prompt_parts.append("")
+
+    # 2. Shared course material
+    if shared_context:
+        prompt_parts.append(shared_context)
+        prompt_parts.append("")
+
+    # 3. Grading criteria
+    if grading_criteria:
+        prompt_parts.append("Evaluate each response based on these criteria:")
+        for criterion_name, criterion in grading_criteria.items():
+            weight = criterion.get("weight", 0)
+            description = criterion.get("description", "")
+            prompt_parts.append(f"- {criterion_name.title()} ({weight}%): {description}")
+        prompt_parts.append("")
+
+    # 4. Items
+    for number, item in enumerate(items, 1):
+        question_type = item["question_type"]
+        prompt_parts.append(f"--- ITEM {number} ({'multiple choice' if question_type == 'mcq' else 'short answer' if question_type == 'short' else 'essay'}) ---")
+        prompt_parts.append("Question: " + item["question_text"])
+
+        if question_type == "mcq":
+            options = item.get("options") or {}
+            prompt_parts.append("Options:")
+            for key, value in options.items():
+                prompt_parts.append(f"{key}. {value}")
+            prompt_parts.append(f"Student Selected: {item['student_answer']} - {options.get(item['student_answer'], 'N/A')}")
+            if item.get("is_correct") is None:
+                prompt_parts.append("NOTE: No correct answer has been set; give general feedback on the student's reasoning.")
+            else:
+                prompt_parts.append(f"[INTERNAL - For AI only] Correct Answer: {item['correct_answer']}. The student's answer is {'CORRECT' if item['is_correct'] else 'INCORRECT'}.")
+        else:
+            prompt_parts.append("Student Answer: " + item["student_answer"])
+            if item.get("correct_answer"):
+                prompt_parts.append(f"[INTERNAL - For AI only] Reference Answer: {item['correct_answer']}")
+            else:
+                prompt_parts.append("NOTE: No reference answer has been set; judge clarity, coherence and demonstrated understanding.")
+
+            requirements = get_specific_requirements(
+                type_settings.get("short_answer" if question_type == "short" else "essay", {})
+            )
+            if requirements:
+                prompt_parts.append("Requirements: " + "; ".join(requirements))
+
+        if item.get("sources"):
+            prompt_parts.append("Relevant course material: " + ", ".join(f"Source {n}" for n in item["sources"]))
+        prompt_parts.append("")
+
+    # 5. Output format
+    rag_settings = rubric.get("rag_settings", {})
+    include_doc_locations = rag_settings.get("include_document_locations", True)
+
+    prompt_parts.append(f"Respond with ONLY a JSON array of exactly {len(items)} objects, one per item, in item order:")
+    prompt_parts.append("[")
+    prompt_parts.append("  {")
+    prompt_parts.append('    "item": 1,')
+    prompt_parts.append('    "is_correct": true/false, or null when no correct/reference answer is set (multiple choice: as stated above),')
+    prompt_parts.append('    "correctness_score": score_0_to_100, or null when no correct/reference answer is set,')
+    prompt_parts.append('    "explanation": "Analysis of the student\'s response",')
+    if shared_context and include_doc_locations:
+        prompt_parts.append('    "improvement_hint": "Specific guidance with EXACT document reference (e.g., \'Review Lab 6, Page 3\')",')
+    else:
+        prompt_parts.append('    "improvement_hint": "Specific guidance for understanding the concept better",')
+    prompt_parts.append('    "concept_explanation": "Brief explanation of the key concept being tested",')
+    prompt_parts.append('    "strengths": ["short answer and essay items only - array of strings"],')
+    prompt_parts.append('    "weaknesses": ["short answer and essay items only - array of strings"],')
+    prompt_parts.append('    "missing_concepts": ["short answer and essay items only - array of strings"],')
+    prompt_parts.append('    "confidence_level": "high/medium/low"')
+    prompt_parts.append("  }")
+    prompt_parts.append("]")
+    prompt_parts.append("")
+
+    # 6. Base tone guidance (can be overridden by custom instructions)
+    prompt_parts.append(get_tone_guidance(tone, "text"))
+
+    if include_examples:
+        prompt_parts.append("Include specific examples when helpful.")
+
+    prompt_parts.append("")
+
+    # 7. CUSTOM TEACHER INSTRUCTIONS (HIGHEST PRIORITY - OVERRIDES ALL OTHER TONE/STYLE SETTINGS)
+    prompt_parts.extend(format_custom_instructions(custom_instructions))
+
+    return "\n".join(prompt_parts)
+
+
+def build_question_group_feedback_prompt(
+    question_text: str,
+    question_type: str,
+    reference_answer: Optional[str],
+    student_answers: List[str],
+    rubric: Dict[str, Any],
+    rag_context: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Build one prompt grading several students' answers to the same open-ended question
+
+    Everything shared by the answers (instructions, question, reference
+    answer, course material, criteria, output format, tone and teacher
+    instructions) comes first and is identical for every group of the
+    question; the indexed answers follow at the end. The model returns a
+    JSON array with one feedback object per answer.
+
+    Args:
+        question_text: The question being answered
+        question_type: Type of question ('short' or 'essay')
+        reference_answer: Reference/expected answer (None if not set)
+        student_answers: Answers of different students, graded independently
+        rubric: Rubric configuration
+        rag_context: Course material retrieved for the question
+
+    Returns:
+        Complete prompt string for AI
+    """
+    # Extract rubric settings
+    grading_criteria = rubric.get("grading_criteria", {})
+    feedback_style = rubric.get("feedback_style", {})
+    custom_instructions = rubric.get("custom_instructions", "")
+    type_settings = rubric.get("question_type_settings", {}).get(
+        "short_answer" if question_type == "short" else "essay",
+        {}
+    )
+
+    tone = feedback_style.get("tone", "encouraging")
+    detail_level = feedback_style.get("detail_level", "detailed")
+    include_examples = feedback_style.get("include_examples", True)
+
+    prompt_parts = []
+
+    # 1. Base instruction
+    question_type_label = "short answer" if question_type == "short" else "essay"
+    prompt_parts.append(f"Analyze the {question_type_label} responses of several students to the question below and provide {tone}, {detail_level} educational feedback on each response.")
+    prompt_parts.append("Each response belongs to a different student: grade every response independently and address its author directly.")
+    prompt_parts.append("")
+
+    # 2. Question context
+    prompt_parts.append("Question: " + question_text)
+    prompt_parts.append("")
+
+    if reference_answer:
+        prompt_parts.append(f"[INTERNAL - For AI only] Reference Answer: {reference_answer}")
+    else:
+        prompt_parts.append("⚠️ NOTE: No reference answer has been set for this question.")
+        prompt_parts.append("Provide feedback based on general educational standards, clarity, coherence, and demonstrated understanding.")
+    prompt_parts.append("")
+
+    prompt_parts.append("⚠️ IMPORTANT: NEVER reveal the reference answer or give away the solution directly. Instead, provide:")
+    prompt_parts.append("- Comprehensive hints and guiding questions")
+    prompt_parts.append("- Conceptual explanations of relevant topics")
+    prompt_parts.append("- Specific guidance on what aspects to explore or reconsider")
+    prompt_parts.append("Your goal is to help each student LEARN and DISCOVER the answer themselves, not to give them the answer to copy.")
+    prompt_parts.append("")
+
+    # 3. RAG context if available
+    if rag_context and rag_context.get("has_context"):
+        prompt_parts.append(rag_context["formatted_context"])
         prompt_parts.append("")
 
-        # Detect harsh/strict language and reinforce it
-        instruction_lower = custom_instructions.lower()
-        harsh_keywords = ["harsh", "scold", "strict", "tough", "rigorous", "demanding", "critical"]
-        if any(keyword in instruction_lower for keyword in harsh_keywords):
-            prompt_parts.append("⚠️ IMPORTANT: The teacher explicitly wants a strict/harsh approach.")
-            prompt_parts.append("- DO NOT soften your language or be overly encouraging")
-            prompt_parts.append("- Point out mistakes directly and clearly")
-            prompt_parts.append("- Express disappointment or concern when appropriate")
-            prompt_parts.append("- Be demanding and set high expectations")
-            prompt_parts.append("- The goal is to push the student to do better through tough feedback")
+    # 4. Grading criteria
+    if grading_criteria:
+        prompt_parts.append("Evaluate each response based on these criteria:")
+        for criterion_name, criterion in grading_criteria.items():
+            weight = criterion.get("weight", 0)
+            description = criterion.get("description", "")
+            prompt_parts.append(f"- {criterion_name.title()} ({weight}%): {description}")
+        prompt_parts.append("")
 
+    # 5. Question-type specific requirements
+    specific_requirements = get_specific_requirements(type_settings)
+    if specific_requirements:
+        prompt_parts.append("Specific Requirements:")
+        for req in specific_requirements:
+            prompt_parts.append(f"- {req}")
         prompt_parts.append("")
-        prompt_parts.append("REMINDER: Teacher's instructions above take ABSOLUTE PRIORITY over any previous tone settings.")
-        prompt_parts.append("=" * 80)
+
+    # 6. Output format
+    rag_settings = rubric.get("rag_settings", {})
+    include_doc_locations = rag_settings.get("include_document_locations", True)
+
+    prompt_parts.append("Respond with ONLY a JSON array containing one object per student response, in response order:")
+    prompt_parts.append("[")
+    prompt_parts.append("  {")
+    prompt_parts.append('    "item": 1,')
+    if reference_answer:
+        prompt_parts.append('    "is_correct": true/false (true if substantially correct),')
+        prompt_parts.append('    "correctness_score": score_from_0_to_100,')
+    else:
+        prompt_parts.append('    "is_correct": null,')
+        prompt_parts.append('    "correctness_score": null,')
+    prompt_parts.append('    "explanation": "Detailed analysis of the student\'s response",')
+    prompt_parts.append('    "strengths": ["What the student got right - array of strings"],')
+    prompt_parts.append('    "weaknesses": ["Areas for improvement - array of strings"],')
+    if rag_context and rag_context.get("has_context") and include_doc_locations:
+        prompt_parts.append('    "improvement_hint": "Specific guidance with EXACT document references where to study (e.g., \'Review Lab 6, Page 3\')",')
+    else:
+        prompt_parts.append('    "improvement_hint": "Specific guidance for better understanding",')
+    prompt_parts.append('    "concept_explanation": "Brief explanation of key concepts",')
+    prompt_parts.append('    "missing_concepts": ["Important concepts not addressed - array of strings"],')
+    prompt_parts.append('    "confidence_level": "high/medium/low based on answer quality"')
+    prompt_parts.append("  }")
+    prompt_parts.append("]")
+    prompt_parts.append("")
+
+    # 7. Base tone guidance (can be overridden by custom instructions)
+    prompt_parts.append(get_tone_guidance(tone, question_type))
+
+    if include_examples:
+        prompt_parts.append("Provide specific examples to illustrate your points.")
+
+    prompt_parts.append("")
+
+    # 8. CUSTOM TEACHER INSTRUCTIONS (HIGHEST PRIORITY - OVERRIDES ALL OTHER TONE/STYLE SETTINGS)
+    if custom_instructions:
+        prompt_parts.extend(format_custom_instructions(custom_instructions))
+        prompt_parts.append("")
+
+    # 9. Student responses (the only part that differs between groups)
+    prompt_parts.append(f"=== STUDENT RESPONSES ({len(student_answers)}) ===")
+    for number, student_answer in enumerate(student_answers, 1):
+        prompt_parts.append("")
+        prompt_parts.append(f"--- RESPONSE {number} ---")
+        prompt_parts.append(student_answer)
+    prompt_parts.append("")
+    prompt_parts.append("=== END OF STUDENT RESPONSES ===")
 
     return "\n".join(prompt_parts)
 
@@ -367,6 +574,103 @@ def format_grading_criteria(criteria: Dict[str, Any]) -> str:
     return "\n".join(lines)
 
 
+def get_specific_requirements(type_settings: Dict[str, Any]) -> List[str]:
+    """
+    List the requirements configured for a text question type
+
+    Args:
+        type_settings: rubric question_type_settings entry ('short_answer' or 'essay')
+
+    Returns:
+        Requirement strings (empty if none are configured)
+    """
+    min_length = type_settings.get("minimum_length", 0)
+    check_grammar = type_settings.get("check_grammar", False)
+    require_structure = type_settings.get("require_structure", False)
+    check_citations = type_settings.get("check_citations", False)
+    min_paragraphs = type_settings.get("minimum_paragraphs", 0)
+
+    specific_requirements = []
+    if min_length > 0:
+        specific_requirements.append(f"Minimum length: {min_length} characters")
+    if check_grammar:
+        specific_requirements.append("Check for grammar and language quality")
+    if require_structure:
+        specific_requirements.append("Evaluate response structure and organization")
+    if check_citations:
+        specific_requirements.append("Check for proper citations and evidence")
+    if min_paragraphs > 0:
+        specific_requirements.append(f"Expected minimum: {min_paragraphs} paragraphs")
+
+    return specific_requirements
+
+
+def get_tone_guidance(tone: str, question_type: str) -> str:
+    """
+    Base tone line of a feedback prompt (custom instructions can override it)
+
+    Args:
+        tone: Feedback tone ('encouraging', 'neutral', 'strict')
+        question_type: 'mcq' for multiple choice explanations, anything else
+            for text answers (and prompts grading several answers)
+
+    Returns:
+        Tone guidance sentence
+    """
+    if question_type == "mcq":
+        tone_guidance = {
+            "encouraging": "Keep explanations supportive and motivating. Focus on learning and growth.",
+            "neutral": "Keep explanations objective and factual. Focus on accuracy and understanding.",
+            "strict": "Keep explanations precise and rigorous. Maintain high standards for correctness."
+        }
+    else:
+        tone_guidance = {
+            "encouraging": "Be constructive and supportive. Highlight both strengths and areas for growth. Focus on helping the student improve.",
+            "neutral": "Be objective and analytical. Provide balanced feedback focusing on accuracy and understanding.",
+            "strict": "Maintain high standards. Be specific about what's missing or incorrect. Reference exact requirements."
+        }
+
+    return tone_guidance.get(tone, tone_guidance["encouraging"])
+
+
+def format_custom_instructions(custom_instructions: str) -> List[str]:
+    """
+    Prompt lines for the teacher's custom instructions (highest priority)
+
+    Args:
+        custom_instructions: rubric custom_instructions text
+
+    Returns:
+        Prompt lines (empty if there are no custom instructions)
+    """
+    if not custom_instructions:
+        return []
+
+    lines = [
+        "=" * 80,
+        "⚠️ CRITICAL: TEACHER'S CUSTOM INSTRUCTIONS - FOLLOW THESE EXACTLY",
+        "=" * 80,
+        custom_instructions,
+        "",
+    ]
+
+    # Detect harsh/strict language and reinforce it
+    instruction_lower = custom_instructions.lower()
+    harsh_keywords = ["harsh", "scold", "strict", "tough", "rigorous", "demanding", "critical"]
+    if any(keyword in instruction_lower for keyword in harsh_keywords):
+        lines.append("⚠️ IMPORTANT: The teacher explicitly wants a strict/harsh approach.")
+        lines.append("- DO NOT soften your language or be overly encouraging")
+        lines.append("- Point out mistakes directly and clearly")
+        lines.append("- Express disappointment or concern when appropriate")
+        lines.append("- Be demanding and set high expectations")
+        lines.append("- The goal is to push the student to do better through tough feedback")
+
+    lines.append("")
+    lines.append("REMINDER: Teacher's instructions above take ABSOLUTE PRIORITY over any previous tone settings.")
+    lines.append("=" * 80)
+    return lines
+
+
 def get_tone_instructions(tone: str) -> str:
     """
     Get specific instructions for different feedback tones
@@ -0,0 +1,179 @@
+"""
+Precomputed question retrieval context
+When questions are approved, the RAG context for the question stem and for
+every MCQ option is retrieved once and stored. MCQ feedback then reads the
+stored context instead of embedding and searching per student; open-ended
+feedback falls back to the stem context when live retrieval finds nothing.
+"""
+import json
+import logging
+from hashlib import sha256
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.question import Question
+from app.models.question_context import QuestionContext
+from app.services.rubric import get_module_rubric
+from app.services.prompt_builder import should_include_context
+from app.services.rag_retriever import get_context_for_feedback, retrieval_options_from_settings
+from app.services.vector_index import get_module_embedding_version
+from app.services.embedding_generation import get_active_generation
+
+logger = logging.getLogger(__name__)
+
+STEM_KEY = "stem"
+
+
+def _hash(value: Any) -> str:
+    return sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def question_hash(question: Question) -> str:
+    """Changes whenever the question text or its options are edited"""
+    return _hash({'text': question.text, 'options': question.options or {}})
+
+
+def current_context_stamp(db: Session, module_id: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(module embedding_version, active generation id) a stored context is valid for"""
+    return get_module_embedding_version(db, str(module_id)), get_active_generation(db)['id']
+
+
+def get_stored_question_context(
+    db: Session,
+    question: Question,
+    answer_key: str,
+    options: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Stored context for a question stem or MCQ option, if still valid
+
+    Args:
+        db: Database session
+        question: Question object
+        answer_key: STEM_KEY or the MCQ option letter
+        options: get_context_for_feedback() keyword options (from the module's rag_settings)
+
+    Returns:
+        The context dict, or None if missing or outdated (module documents,
+        embedding generation, question text/options or rag_settings changed)
+    """
+    row = db.query(QuestionContext).filter(
+        QuestionContext.question_id == question.id,
+        QuestionContext.answer_key == answer_key
+    ).first()
+    if row is None:
+        return None
+
+    version, generation_id = current_context_stamp(db, question.module_id)
+    if (
+        row.embedding_version != version
+        or row.generation_id != generation_id
+        or row.question_hash != question_hash(question)
+        or row.settings_hash != _hash(options)
+    ):
+        return None
+    return row.context
+
+
+def store_question_context(
+    db: Session,
+    question: Question,
+    answer_key: str,
+    options: Dict[str, Any],
+    context: Dict[str, Any],
+    stamp: Optional[Tuple[Optional[int], Optional[int]]] = None
+) -> None:
+    """
+    Save (or replace) the context for a question stem or MCQ option
+
+    Contexts without results are not stored (a failed search looks the
+    same), so those lookups keep retrieving live.
+
+    Args:
+        stamp: (embedding_version, generation_id) read before the context was
+            retrieved; defaults to the current one
+    """
+    if not context.get('has_context'):
+        return
+
+    version, generation_id = stamp or current_context_stamp(db, question.module_id)
+    if version is None:
+        return
+
+    # Chunk ids are UUIDs; JSONB needs plain values
+    context = json.loads(json.dumps(context, default=str))
+
+    row = db.query(QuestionContext).filter(
+        QuestionContext.question_id == question.id,
+        QuestionContext.answer_key == answer_key
+    ).first()
+    if row is None:
+        row = QuestionContext(question_id=question.id, module_id=question.module_id, answer_key=answer_key)
+        db.add(row)
+
+    row.question_hash = question_hash(question)
+    row.settings_hash = _hash(options)
+    row.embedding_version = version
+    row.generation_id = generation_id
+    row.context = context
+    db.commit()
+
+
+def precompute_question_contexts(db: Session, question: Question) -> int:
+    """
+    Retrieve and store the stem context and, for MCQs, one context per option
+
+    The MCQ option queries match what feedback generation sends
+    ("Question: <text>\\nAnswer: <letter>"), so every student answer is a hit.
+
+    Returns:
+        Number of contexts retrieved (0 if RAG is disabled for the question)
+    """
+    rubric = get_module_rubric(db, question.module_id)
+    if not should_include_context(rubric, question.type):
+        return 0
+
+    options = retrieval_options_from_settings(rubric.get("rag_settings", {}), question.type)
+    answer_keys = [STEM_KEY]
+    if question.type == 'mcq' and question.options:
+        answer_keys += sorted(question.options.keys())
+
+    stored = 0
+    for answer_key in answer_keys:
+        stamp = current_context_stamp(db, question.module_id)
+        context = get_context_for_feedback(
+            db=db,
+            question_text=question.text,
+            student_answer="" if answer_key == STEM_KEY else answer_key,
+            module_id=str(question.module_id),
+            **options
+        )
+        store_question_context(db, question, answer_key, options, context, stamp)
+        stored += 1
+    return stored
+
+
+def precompute_question_contexts_background(question_ids: List[Any]) -> None:
+    """
+    Background task run after questions are approved
+
+    Uses its own database session; failures only mean feedback falls back
+    to live retrieval for those questions.
+    """
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        total = 0
+        for question_id in question_ids:
+            try:
+                question = db.query(Question).filter(Question.id == question_id).first()
+                if question:
+                    total += precompute_question_contexts(db, question)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ Failed to precompute context for question {question_id}: {str(e)}")
+        logger.info(f"📚 Precomputed {total} retrieval contexts for {len(question_ids)} questions")
+    finally:
+        db.close()
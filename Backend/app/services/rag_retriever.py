@@ -2,11 +2,151 @@
 RAG (Retrieval-Augmented Generation) retrieval service
 Fetches relevant course material context for AI feedback generation
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from app.models.document import Document
-from app.services.embedding import search_similar_chunks
+from app.core.config import (
+    RAG_RETRIEVAL_MODE,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_CANDIDATE_FACTOR,
+    LEXICAL_CONFIDENCE_THRESHOLD,
+    RAG_CONTEXT_TOKENS_MCQ,
+    RAG_CONTEXT_TOKENS_SHORT,
+    RAG_CONTEXT_TOKENS_ESSAY,
+    CHAT_CONTEXT_TOKENS,
+    CONTEXT_MIN_CHUNK_TOKENS
+)
+from app.services.embedding import search_similar_chunks_in_module, hydrate_chunk_hits
+from app.services.lexical_index import get_module_lexical_index
+from app.services.retrieval_cache import retrieval_cache
+from app.services.vector_index import get_module_embedding_version
+from app.services.embedding_generation import get_active_generation
+from app.utils.tokens import count_tokens, truncate_to_sentences
+
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical_first")
+
+
+def _lexical_hits(db: Session, query_text: str, module_id: str, limit: int) -> List[Any]:
+    index = get_module_lexical_index(db, module_id)
+    if index is None:
+        return []
+    return index.search(query_text, limit=limit)
+
+
+def _fuse(
+    vector_results: List[Dict[str, Any]],
+    lexical_results: List[Dict[str, Any]],
+    limit: int
+) -> List[Dict[str, Any]]:
+    """
+    Rank the union of both candidate lists by weighted score
+
+    A chunk missing from one list scores 0 there. 'vector_similarity' is the
+    cosine similarity (None for chunks only the lexical index found) and
+    'lexical_similarity' the BM25 term coverage; they are on different scales
+    and are thresholded separately (see _passes_thresholds). 'similarity' stays
+    the cosine similarity where known and is the coverage otherwise.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+
+    for result in vector_results:
+        fused[result['chunk_id']] = {**result, 'vector_similarity': result['similarity'], 'lexical_similarity': 0.0}
+
+    for result in lexical_results:
+        entry = fused.get(result['chunk_id'])
+        if entry is None:
+            fused[result['chunk_id']] = {**result, 'vector_similarity': None, 'lexical_similarity': result['similarity']}
+        else:
+            entry['lexical_similarity'] = result['similarity']
+
+    for entry in fused.values():
+        entry['fused_score'] = (
+            HYBRID_VECTOR_WEIGHT * (entry['vector_similarity'] or 0.0)
+            + (1 - HYBRID_VECTOR_WEIGHT) * entry['lexical_similarity']
+        )
+
+    return sorted(fused.values(), key=lambda r: r['fused_score'], reverse=True)[:limit]
+
+
+def retrieve_module_chunks(
+    db: Session,
+    query_text: str,
+    module_id: str,
+    limit: int = 5,
+    retrieval_mode: str = RAG_RETRIEVAL_MODE,
+    lexical_query: Optional[str] = None,
+    lexical_confidence: float = LEXICAL_CONFIDENCE_THRESHOLD
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Search a module with the configured retrieval mode
+
+    - "vector": embedding similarity only
+    - "hybrid": vector and BM25 candidates fused by weighted score
+    - "lexical_first": BM25 only when its best chunk covers at least
+      lexical_confidence of the query terms (no embedding call), hybrid otherwise
+
+    Args:
+        db: Database session
+        query_text: Query to embed
+        module_id: Module ID to search within
+        limit: Number of results to return
+        retrieval_mode: One of RETRIEVAL_MODES
+        lexical_query: Text for the BM25 search (default: query_text)
+        lexical_confidence: Coverage (0-1) needed to take the lexical fast path
+
+    Returns:
+        (result dicts, mode actually used: 'vector', 'hybrid' or 'lexical')
+    """
+    if retrieval_mode not in RETRIEVAL_MODES:
+        print(f"⚠️ Unknown retrieval_mode '{retrieval_mode}', using vector search")
+        retrieval_mode = "vector"
+
+    if retrieval_mode == "vector":
+        return search_similar_chunks_in_module(db=db, query_text=query_text, module_id=module_id, limit=limit), "vector"
+
+    lexical_query = lexical_query or query_text
+    candidates = limit * max(HYBRID_CANDIDATE_FACTOR, 1)
+    lexical_hits = _lexical_hits(db, lexical_query, module_id, candidates)
+
+    if retrieval_mode == "lexical_first" and lexical_hits and lexical_hits[0][3] >= lexical_confidence:
+        print(f"   Lexical fast path (coverage {lexical_hits[0][3]:.2f} >= {lexical_confidence})")
+        results = hydrate_chunk_hits(
+            db,
+            [(chunk_id, document_id, coverage) for chunk_id, document_id, _, coverage in lexical_hits[:limit]]
+        )
+        return [
+            {**result, 'vector_similarity': None, 'lexical_similarity': result['similarity']}
+            for result in results
+        ], "lexical"
+
+    vector_results = search_similar_chunks_in_module(db=db, query_text=query_text, module_id=module_id, limit=candidates)
+
+    # Only hydrate lexical hits the vector search did not already return
+    seen = {result['chunk_id'] for result in vector_results}
+    lexical_results = hydrate_chunk_hits(
+        db,
+        [(chunk_id, document_id, coverage) for chunk_id, document_id, _, coverage in lexical_hits if chunk_id not in seen]
+    )
+    coverage_by_chunk = {chunk_id: coverage for chunk_id, _, _, coverage in lexical_hits}
+    lexical_results += [
+        {**result, 'similarity': coverage_by_chunk[result['chunk_id']]}
+        for result in vector_results if result['chunk_id'] in coverage_by_chunk
+    ]
+
+    return _fuse(vector_results, lexical_results, limit), "hybrid"
+
+
+def retrieval_options_from_settings(rag_settings: Dict[str, Any], question_type: Optional[str] = None) -> Dict[str, Any]:
+    """get_context_for_feedback() keyword options from a module rubric's rag_settings"""
+    return {
+        'max_chunks': rag_settings.get("max_context_chunks", 3),
+        'similarity_threshold': rag_settings.get("similarity_threshold", 0.7),
+        'include_document_locations': rag_settings.get("include_document_locations", True),
+        'retrieval_mode': rag_settings.get("retrieval_mode", RAG_RETRIEVAL_MODE),
+        'lexical_confidence': rag_settings.get("lexical_confidence", LEXICAL_CONFIDENCE_THRESHOLD),
+        'max_context_tokens': context_token_budget(rag_settings, question_type),
+    }
 
 
 def get_context_for_feedback(
@@ -16,7 +156,10 @@ def get_context_for_feedback(
     module_id: str,
     max_chunks: int = 3,
     similarity_threshold: float = 0.7,
-    include_document_locations: bool = True
+    include_document_locations: bool = True,
+    retrieval_mode: str = RAG_RETRIEVAL_MODE,
+    lexical_confidence: float = LEXICAL_CONFIDENCE_THRESHOLD,
+    max_context_tokens: Optional[int] = None
 ) -> Dict[str, Any]:
     """
     Retrieve relevant course material context for feedback generation
@@ -28,90 +171,141 @@ def get_context_for_feedback(
         module_id: Module ID to search within
         max_chunks: Maximum number of context chunks to retrieve
         similarity_threshold: Minimum similarity score (0-1)
+        retrieval_mode: "vector", "hybrid" or "lexical_first" (rag_settings.retrieval_mode)
+        lexical_confidence: Coverage needed for the lexical fast path
+        max_context_tokens: Token budget for formatted_context (see
+            pack_context_chunks); None or 0 formats the top max_chunks in full
 
     Returns:
         {
             'has_context': bool,
             'chunks': List[Dict],  # Retrieved chunks with text and metadata
             'formatted_context': str,  # Pre-formatted for prompt injection
-            'sources': List[str]  # Document sources for citations
+            'sources': List[str],  # Document sources for citations
+            'token_usage': Dict  # Tokens per component of formatted_context
         }
+        Identical lookups against an unchanged module are served from the
+        retrieval cache (no embedding call, search or formatting).
     """
     # Combine question and answer for better context matching
     query = f"Question: {question_text}\nAnswer: {student_answer}"
 
-    # Get all embedded documents from the module
-    documents = db.query(Document).filter(
-        Document.module_id == module_id,
-        Document.processing_status == "embedded",
-        Document.is_testbank == False  # Don't use testbank docs for context
-    ).all()
+    print(f"RAG DEBUG: Searching module {module_id}")
+
+    cache_key = None
+    if retrieval_cache.enabled:
+        version = get_module_embedding_version(db, module_id)
+        if version is not None:
+            cache_key = retrieval_cache.make_key(
+                module_id,
+                query,
+                embedding_version=version,
+                generation_id=get_active_generation(db)['id'],
+                max_chunks=max_chunks,
+                similarity_threshold=similarity_threshold,
+                include_document_locations=include_document_locations,
+                retrieval_mode=retrieval_mode,
+                lexical_confidence=lexical_confidence,
+                max_context_tokens=max_context_tokens
+            )
+            cached = retrieval_cache.get(cache_key)
+            if cached is not None:
+                print(f"   Retrieval cache hit ({len(cached['chunks'])} chunks)")
+                return cached
+
+    # Search across all module documents in a single pass
+    try:
+        all_results, mode_used = retrieve_module_chunks(
+            db=db,
+            query_text=query,
+            module_id=module_id,
+            limit=max_chunks,
+            retrieval_mode=retrieval_mode,
+            lexical_query=f"{question_text} {student_answer}",
+            lexical_confidence=lexical_confidence
+        )
+    except Exception as e:
+        # Not cached: the next lookup retries the search
+        print(f"Error searching module {module_id}: {str(e)}")
+        return _empty_context()
+
+    context = _build_context(
+        db, module_id, all_results, mode_used, max_chunks, similarity_threshold,
+        include_document_locations, max_context_tokens, lexical_confidence
+    )
+    if cache_key is not None:
+        retrieval_cache.put(cache_key, context)
+    return context
+
+
+def _empty_context() -> Dict[str, Any]:
+    return {
+        'has_context': False,
+        'chunks': [],
+        'formatted_context': '',
+        'sources': [],
+        'token_usage': {'total': 0, 'chunks_used': 0}
+    }
 
-    print(f"RAG DEBUG: Looking for documents in module {module_id}")
-    print(f"   Found {len(documents)} embedded documents")
 
-    if not documents:
+def _build_context(
+    db: Session,
+    module_id: str,
+    all_results: List[Dict[str, Any]],
+    mode_used: str,
+    max_chunks: int,
+    similarity_threshold: float,
+    include_document_locations: bool,
+    max_context_tokens: Optional[int] = None,
+    lexical_confidence: float = LEXICAL_CONFIDENCE_THRESHOLD
+) -> Dict[str, Any]:
+    """Threshold, order and format search results into the context dict"""
+    if not all_results:
         # Debug: Check what documents exist (regardless of status)
         all_docs = db.query(Document).filter(Document.module_id == module_id).all()
         print(f"   Total documents in module: {len(all_docs)}")
         for doc in all_docs:
             print(f"      - {doc.title}: status={doc.processing_status}, is_testbank={doc.is_testbank}")
 
-        return {
-            'has_context': False,
-            'chunks': [],
-            'formatted_context': '',
-            'sources': []
-        }
-
-    # Search across all module documents
-    all_results = []
-    for doc in documents:
-        try:
-            results = search_similar_chunks(
-                db=db,
-                query_text=query,
-                document_id=str(doc.id),
-                limit=max_chunks
-            )
-            # Add document info to each result
-            for result in results:
-                result['document_title'] = doc.title
-                result['document_id'] = str(doc.id)
-            all_results.extend(results)
-        except Exception as e:
-            print(f"Error searching document {doc.id}: {str(e)}")
-            continue
+        return _empty_context()
 
-    print(f"   Retrieved {len(all_results)} total chunks from {len(documents)} documents")
+    print(f"   Retrieved {len(all_results)} top chunks ({mode_used})")
 
-    # Filter by similarity threshold
+    # Filter by similarity threshold (lexical-only hits by their own coverage threshold)
     filtered_results = [
         r for r in all_results
-        if r['similarity'] >= similarity_threshold
+        if _passes_thresholds(r, similarity_threshold, lexical_confidence)
     ]
 
-    print(f"   After filtering (threshold={similarity_threshold}): {len(filtered_results)} chunks")
+    print(
+        f"   After filtering (threshold={similarity_threshold}, lexical={lexical_confidence}): "
+        f"{len(filtered_results)} chunks"
+    )
     if all_results and not filtered_results:
         # Show top similarity scores to help debug threshold issues
         top_3 = sorted(all_results, key=lambda x: x['similarity'], reverse=True)[:3]
         top_scores = [f"{r['similarity']:.3f}" for r in top_3]
         print(f"   Top 3 similarity scores: {top_scores}")
 
-    # Sort by similarity and get top N
-    filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
+    # Sort by similarity (hybrid results keep their fused order) and get top N
+    if mode_used != "hybrid":
+        filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
     top_results = filtered_results[:max_chunks]
 
+    if max_context_tokens:
+        top_results, token_usage = pack_context_chunks(top_results, max_context_tokens, include_document_locations)
+        print(
+            f"   Packed {token_usage['chunks_used']} chunks into {token_usage['total']}/{max_context_tokens} tokens "
+            f"({token_usage['chunks_truncated']} truncated, {token_usage['chunks_dropped']} dropped)"
+        )
+
     if not top_results:
-        return {
-            'has_context': False,
-            'chunks': [],
-            'formatted_context': '',
-            'sources': []
-        }
+        return _empty_context()
 
     # Format context for prompt
     formatted_context = format_context_for_prompt(top_results, include_document_locations)
+    if not max_context_tokens:
+        token_usage = {'total': count_tokens(formatted_context), 'chunks_used': len(top_results)}
 
     # Extract unique sources
     sources = list(set([
@@ -123,10 +317,82 @@ def get_context_for_feedback(
         'has_context': True,
         'chunks': top_results,
         'formatted_context': formatted_context,
-        'sources': sources
+        'sources': sources,
+        'retrieval_mode': mode_used,
+        'token_usage': token_usage
     }
 
 
+def _passes_thresholds(result: Dict[str, Any], similarity_threshold: float, lexical_confidence: float) -> bool:
+    """
+    Whether a search result is relevant enough to use
+
+    The cosine similarity_threshold only applies to vector scores; a chunk the
+    lexical index found passes if its term coverage reaches lexical_confidence.
+    """
+    vector_similarity = result.get('vector_similarity', result['similarity'])
+    if vector_similarity is not None and vector_similarity >= similarity_threshold:
+        return True
+
+    lexical_similarity = result.get('lexical_similarity')
+    return lexical_similarity is not None and lexical_similarity >= lexical_confidence
+
+
+def _source_reference(number: int, chunk: Dict[str, Any]) -> str:
+    """'[Source N] From: <title> (<location>) (Relevance: X%)' line for a chunk"""
+    similarity_pct = int(chunk['similarity'] * 100)
+
+    # Build source reference with location details
+    source_ref = f"[Source {number}] From: {chunk['document_title']}"
+
+    # Add page/slide/section information if available
+    metadata = chunk.get('metadata', {})
+    location_parts = []
+
+    if 'page_number' in metadata and metadata['page_number']:
+        location_parts.append(f"Page {metadata['page_number']}")
+    elif 'slide_number' in metadata and metadata['slide_number']:
+        location_parts.append(f"Slide {metadata['slide_number']}")
+
+    if 'section' in metadata and metadata['section']:
+        location_parts.append(f"Section: {metadata['section']}")
+    elif 'heading' in metadata and metadata['heading']:
+        location_parts.append(f"'{metadata['heading']}'")
+
+    if location_parts:
+        source_ref += f" ({', '.join(location_parts)})"
+
+    if chunk.get('vector_similarity', chunk['similarity']) is None:
+        source_ref += f" (Term match: {similarity_pct}%)"
+    else:
+        source_ref += f" (Relevance: {similarity_pct}%)"
+    return source_ref
+
+
+def _context_header() -> List[str]:
+    return [
+        "\n=== RELEVANT COURSE MATERIAL ===\n",
+        "Use the following course material to provide context-aware feedback:\n"
+    ]
+
+
+def _context_footer(include_document_locations: bool) -> List[str]:
+    footer = ["\n=== END OF COURSE MATERIAL ===\n"]
+
+    if include_document_locations:
+        footer.append("\n⚠️ IMPORTANT - Document References in Feedback:")
+        footer.append("- When providing improvement hints, ALWAYS reference the specific document location")
+        footer.append("- Use format: 'Review [Document Name], Page X' or 'See Slide Y in [Document]'")
+        footer.append("- Example: 'To better understand this concept, review Lab 6, Page 3, section on Earth's Processor'")
+        footer.append("- Example: 'The material on Slide 5 of Lecture 2 explains this topic in detail'")
+        footer.append("- Make references natural and helpful, directing students to exact locations")
+        footer.append("- If multiple sources are relevant, mention the most relevant one in your improvement hint\n")
+    else:
+        footer.append("\nProvide feedback based on the course material above, but do NOT include specific page or slide numbers.\n")
+
+    return footer
+
+
 def format_context_for_prompt(chunks: List[Dict[str, Any]], include_document_locations: bool = True) -> str:
     """
     Format retrieved chunks into a structured context for the AI prompt
@@ -140,51 +406,152 @@ def format_context_for_prompt(chunks: List[Dict[str, Any]], include_document_loc
     if not chunks:
         return ""
 
-    context_parts = ["\n=== RELEVANT COURSE MATERIAL ===\n"]
-    context_parts.append("Use the following course material to provide context-aware feedback:\n")
+    context_parts = _context_header()
 
     for i, chunk in enumerate(chunks, 1):
-        similarity_pct = int(chunk['similarity'] * 100)
+        context_parts.append(f"\n{_source_reference(i, chunk)}")
+        context_parts.append(f"{chunk['text']}\n")
 
-        # Build source reference with location details
-        source_ref = f"[Source {i}] From: {chunk['document_title']}"
+    context_parts.extend(_context_footer(include_document_locations))
 
-        # Add page/slide/section information if available
-        metadata = chunk.get('metadata', {})
-        location_parts = []
+    return "\n".join(context_parts)
 
-        if 'page_number' in metadata and metadata['page_number']:
-            location_parts.append(f"Page {metadata['page_number']}")
-        elif 'slide_number' in metadata and metadata['slide_number']:
-            location_parts.append(f"Slide {metadata['slide_number']}")
 
-        if 'section' in metadata and metadata['section']:
-            location_parts.append(f"Section: {metadata['section']}")
-        elif 'heading' in metadata and metadata['heading']:
-            location_parts.append(f"'{metadata['heading']}'")
+def format_shared_context(
+    contexts: List[Optional[Dict[str, Any]]],
+    include_document_locations: bool = True
+) -> Tuple[str, List[List[int]]]:
+    """
+    Format the contexts of several answers as one course material section
 
-        if location_parts:
-            source_ref += f" ({', '.join(location_parts)})"
+    Chunks retrieved for more than one answer are included once, so a
+    grouped prompt does not repeat the same passage per answer.
 
-        source_ref += f" (Relevance: {similarity_pct}%)"
+    Args:
+        contexts: Context dicts (from get_context_for_feedback), None for answers without context
+        include_document_locations: Selects the instruction block
 
-        context_parts.append(f"\n{source_ref}")
-        context_parts.append(f"{chunk['text']}\n")
+    Returns:
+        (formatted section, or "" without chunks; source numbers per context)
+    """
+    numbers: Dict[Any, int] = {}
+    chunks: List[Dict[str, Any]] = []
+    source_numbers: List[List[int]] = []
 
-    context_parts.append("\n=== END OF COURSE MATERIAL ===\n")
+    for context in contexts:
+        sources = []
+        if context and context.get('has_context'):
+            for chunk in context.get('chunks', []):
+                key = context_chunk_key(chunk)
+                if key not in numbers:
+                    chunks.append(chunk)
+                    numbers[key] = len(chunks)
+                if numbers[key] not in sources:
+                    sources.append(numbers[key])
+        source_numbers.append(sources)
 
-    if include_document_locations:
-        context_parts.append("\n⚠️ IMPORTANT - Document References in Feedback:")
-        context_parts.append("- When providing improvement hints, ALWAYS reference the specific document location")
-        context_parts.append("- Use format: 'Review [Document Name], Page X' or 'See Slide Y in [Document]'")
-        context_parts.append("- Example: 'To better understand this concept, review Lab 6, Page 3, section on Earth's Processor'")
-        context_parts.append("- Example: 'The material on Slide 5 of Lecture 2 explains this topic in detail'")
-        context_parts.append("- Make references natural and helpful, directing students to exact locations")
-        context_parts.append("- If multiple sources are relevant, mention the most relevant one in your improvement hint\n")
-    else:
-        context_parts.append("\nProvide feedback based on the course material above, but do NOT include specific page or slide numbers.\n")
+    return format_context_for_prompt(chunks, include_document_locations), source_numbers
 
-    return "\n".join(context_parts)
+
+def context_chunk_key(chunk: Dict[str, Any]) -> Any:
+    """Identity of a chunk across contexts (format_shared_context includes each once)"""
+    # Stored contexts hold ids as strings, fresh ones as UUIDs
+    return str(chunk['chunk_id']) if chunk.get('chunk_id') else (chunk['document_title'], chunk['text'])
+
+
+def context_frame_tokens(include_document_locations: bool = True) -> int:
+    """Tokens of the header and instruction block around formatted course material"""
+    return count_tokens("\n".join(_context_header() + _context_footer(include_document_locations)))
+
+
+def context_chunk_tokens(number: int, chunk: Dict[str, Any]) -> int:
+    """Tokens one chunk adds to formatted course material (source line and text)"""
+    return count_tokens(f"\n{_source_reference(number, chunk)}\n") + count_tokens(chunk['text'])
+
+
+def pack_context_chunks(
+    chunks: List[Dict[str, Any]],
+    token_budget: int,
+    include_document_locations: bool = True
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Choose the chunks (and how much of each) that fit a prompt token budget
+
+    The budget covers the whole formatted context: the fixed header and
+    instructions, one source line per chunk and the chunk texts. Chunks are
+    added greedily by similarity per token, so short relevant passages beat
+    long loosely related ones; the first chunk that no longer fits is cut at
+    a sentence boundary if at least CONTEXT_MIN_CHUNK_TOKENS remain.
+
+    Args:
+        chunks: Ranked chunk dicts (as returned by retrieval)
+        token_budget: Tokens available for the formatted context
+        include_document_locations: Selects the instruction block that is counted
+
+    Returns:
+        (chunks to format, in their original rank order, truncated ones with
+        'truncated': True; token usage per component)
+    """
+    frame_tokens = context_frame_tokens(include_document_locations)
+    available = token_budget - frame_tokens
+
+    candidates = []
+    for position, chunk in enumerate(chunks):
+        # Source numbers are assigned after packing; a provisional one is close enough
+        reference_tokens = count_tokens(f"\n{_source_reference(position + 1, chunk)}\n")
+        text_tokens = count_tokens(chunk['text'])
+        candidates.append((position, reference_tokens, text_tokens))
+
+    candidates.sort(key=lambda c: chunks[c[0]]['similarity'] / max(c[1] + c[2], 1), reverse=True)
+
+    packed: Dict[int, Dict[str, Any]] = {}
+    usage = {'budget': token_budget, 'frame': frame_tokens, 'sources': 0, 'chunk_text': 0}
+
+    for position, reference_tokens, text_tokens in candidates:
+        if reference_tokens + text_tokens <= available:
+            packed[position] = chunks[position]
+        elif available - reference_tokens >= CONTEXT_MIN_CHUNK_TOKENS:
+            text = truncate_to_sentences(chunks[position]['text'], available - reference_tokens)
+            text_tokens = count_tokens(text)
+            packed[position] = {**chunks[position], 'text': text, 'truncated': True}
+        else:
+            continue
+        available -= reference_tokens + text_tokens
+        usage['sources'] += reference_tokens
+        usage['chunk_text'] += text_tokens
+
+    usage['total'] = usage['frame'] + usage['sources'] + usage['chunk_text']
+    usage['chunks_used'] = len(packed)
+    usage['chunks_truncated'] = sum(1 for chunk in packed.values() if chunk.get('truncated'))
+    usage['chunks_dropped'] = len(chunks) - len(packed)
+
+    return [packed[position] for position in sorted(packed)], usage
+
+
+def context_token_budget(rag_settings: Dict[str, Any], question_type: Optional[str]) -> int:
+    """
+    Context token budget for a question type ("mcq", "short", "long" or "chat")
+
+    rag_settings.max_context_tokens may be a single budget or one per question type.
+    Long-answer questions use the "essay" budget, like the rubric's essay settings.
+    """
+    if question_type == 'long':
+        question_type = 'essay'
+
+    defaults = {
+        'mcq': RAG_CONTEXT_TOKENS_MCQ,
+        'short': RAG_CONTEXT_TOKENS_SHORT,
+        'essay': RAG_CONTEXT_TOKENS_ESSAY,
+        'chat': CHAT_CONTEXT_TOKENS,
+    }
+    default = defaults.get(question_type, RAG_CONTEXT_TOKENS_SHORT)
+
+    configured = rag_settings.get("max_context_tokens")
+    if isinstance(configured, dict):
+        return configured.get(question_type, default)
+    if configured is not None:
+        return configured
+    return default
 
 
 def get_context_summary(context: Dict[str, Any]) -> str:
@@ -0,0 +1,107 @@
+"""
+Retrieval result cache
+Bounded in-memory LRU of get_context_for_feedback() results, so repeated
+identical lookups (class-wide FAQ questions, the same MCQ option picked by
+many students) skip embedding, search and prompt formatting
+"""
+import copy
+import re
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import RETRIEVAL_CACHE_SIZE
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class RetrievalResultCache:
+    """
+    LRU cache of retrieval results
+
+    Keys include the module's embedding_version and the embedding generation,
+    both of which change whenever a document finishes embedding, is deleted
+    or the embedding model is switched, so an entry can never serve context
+    from an outdated set of documents. Outdated entries simply age out.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @staticmethod
+    def make_key(
+        module_id: str,
+        query: str,
+        embedding_version: int,
+        generation_id: Optional[int],
+        **options: Any
+    ) -> Tuple:
+        """
+        Args:
+            module_id: Module searched
+            query: Query text (normalized and hashed here)
+            embedding_version: Module embedding version at lookup time
+            generation_id: Active embedding generation
+            **options: Everything else that shapes the result
+                (max_chunks, similarity_threshold, include_document_locations, ...)
+        """
+        query_hash = sha256(normalize_query(query).encode('utf-8')).hexdigest()
+        return (str(module_id), query_hash, embedding_version, generation_id, tuple(sorted(options.items())))
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+
+        # Callers get their own copy to annotate
+        return copy.deepcopy(entry)
+
+    def put(self, key: Tuple, result: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        # The caller keeps using (and may modify) the result it stores
+        entry = copy.deepcopy(result)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and hit rate for this worker"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_size'] = self.max_size
+
+        lookups = stats['hits'] + stats['misses']
+        stats['lookups'] = lookups
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+retrieval_cache = RetrievalResultCache(max_size=RETRIEVAL_CACHE_SIZE)
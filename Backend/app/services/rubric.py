@@ -289,6 +289,30 @@ def validate_rubric(rubric: Dict[str, Any]) -> List[str]:
             elif chunks < 1 or chunks > 10:
                 errors.append("Max context chunks must be between 1 and 10")
 
+        valid_retrieval_modes = ["vector", "hybrid", "lexical_first"]
+        if "retrieval_mode" in rag and rag["retrieval_mode"] not in valid_retrieval_modes:
+            errors.append(f"Retrieval mode must be one of: {', '.join(valid_retrieval_modes)}")
+
+        if "lexical_confidence" in rag:
+            confidence = rag["lexical_confidence"]
+            if not isinstance(confidence, (int, float)):
+                errors.append("Lexical confidence must be a number")
+            elif confidence < 0.0 or confidence > 1.0:
+                errors.append("Lexical confidence must be between 0.0 and 1.0")
+
+        if "max_context_tokens" in rag:
+            budgets = rag["max_context_tokens"]
+            if isinstance(budgets, dict):
+                # Long-answer questions use the "essay" budget
+                valid_budget_types = ["mcq", "short", "essay", "chat"]
+                for question_type, budget in budgets.items():
+                    if question_type not in valid_budget_types:
+                        errors.append(f"Max context tokens keys must be one of: {', '.join(valid_budget_types)}")
+                    elif not isinstance(budget, int) or budget < 0:
+                        errors.append(f"Max context tokens for {question_type} must be a non-negative integer")
+            elif not isinstance(budgets, int) or budgets < 0:
+                errors.append("Max context tokens must be a non-negative integer or a per question type mapping")
+
     return errors
 
 
@@ -0,0 +1,478 @@
+"""
+In-process vector index for module-scoped similarity search
+Holds normalized float32 embeddings per module (plus an int8 quantized copy
+for a fast first pass), backed by memory-mapped per-document index files
+under INDEX_DIR
+"""
+import os
+import glob
+import uuid
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import INDEX_DIR, VECTOR_QUANTIZATION, QUANTIZED_RESCORE_FACTOR
+from app.models.module import Module
+from app.models.document import Document
+from app.models.document_embedding import DocumentEmbedding
+from app.services.embedding_generation import get_active_generation
+from app.utils.vector_codec import decode_embedding, quantize_rows_int8
+
+
+VECTORS_SUFFIX = ".vectors.npy"
+CHUNK_IDS_SUFFIX = ".chunk_ids.npy"
+INT8_SUFFIX = ".i8.npy"
+SCALES_SUFFIX = ".scales.npy"
+INDEX_SUFFIXES = (VECTORS_SUFFIX, CHUNK_IDS_SUFFIX, INT8_SUFFIX, SCALES_SUFFIX)
+
+# Rows scored per block in the int8 first pass (bounds the float32 temporary)
+FIRST_PASS_BLOCK_ROWS = 8192
+
+
+class VectorSegment:
+    """
+    Normalized float32 embedding matrix for one document
+
+    The matrices are either read-only np.memmap arrays over the document's
+    index files (shared through the page cache by every worker on the host)
+    or in-memory arrays when the files could not be written. The optional
+    int8 copy is a quarter of the size and is used for first-pass scoring.
+    """
+
+    def __init__(
+        self,
+        document_id: str,
+        matrix: np.ndarray,
+        chunk_ids: np.ndarray,
+        quantized: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None
+    ):
+        self.document_id = document_id
+        self.matrix = matrix        # (n_chunks, dims) float32, rows L2-normalized
+        self.chunk_ids = chunk_ids  # (n_chunks,) chunk UUID strings
+        self.quantized = quantized  # (n_chunks, dims) int8, or None
+        self.scales = scales        # (n_chunks,) float32 int8 scale per row, or None
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def chunk_id(self, row: int) -> uuid.UUID:
+        return uuid.UUID(str(self.chunk_ids[row]))
+
+    def exact_scores(self, query: np.ndarray) -> np.ndarray:
+        return self.matrix @ query
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """First-pass scores from the int8 copy, in row blocks"""
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), FIRST_PASS_BLOCK_ROWS):
+            block = self.quantized[start:start + FIRST_PASS_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores * self.scales
+
+
+class ModuleVectorIndex:
+    """
+    All retrievable document segments of one module
+
+    Rows are L2-normalized at write time, so cosine similarity against a
+    normalized query is one matrix-vector product per segment. With int8
+    quantization enabled the product runs on the int8 copy first and only
+    the top limit * QUANTIZED_RESCORE_FACTOR candidates are rescored exactly.
+    """
+
+    def __init__(self, module_id: str, version: int, segments: List[VectorSegment], generation_id: Optional[int] = None):
+        self.module_id = module_id
+        self.version = version
+        self.generation_id = generation_id
+        self.segments = [segment for segment in segments if len(segment) > 0]
+
+        # Global row offset of each segment
+        sizes = [len(segment) for segment in self.segments]
+        self.offsets = np.cumsum([0] + sizes)
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def documents(self) -> List[str]:
+        return [segment.document_id for segment in self.segments]
+
+    def subset(self, document_ids: List[Any]) -> "ModuleVectorIndex":
+        """Index over only the given documents' segments (shares their arrays)"""
+        wanted = {str(document_id) for document_id in document_ids}
+        return ModuleVectorIndex(
+            module_id=self.module_id,
+            version=self.version,
+            segments=[segment for segment in self.segments if segment.document_id in wanted],
+            generation_id=self.generation_id
+        )
+
+    def search(self, query_vector: List[float], limit: int = 5) -> List[Tuple[Any, str, float]]:
+        """
+        Return the top-k rows for a query vector
+
+        Args:
+            query_vector: The query embedding vector
+            limit: Number of results to return
+
+        Returns:
+            List of (chunk_id, document_id, similarity) sorted by similarity
+        """
+        if len(self) == 0 or limit <= 0:
+            return []
+
+        query = normalize_vector(query_vector)
+
+        if self.is_quantized:
+            # Fast first pass on int8 vectors, then exact rescoring of the candidates
+            approximate = np.concatenate([segment.approximate_scores(query) for segment in self.segments])
+            candidates = top_positions(approximate, limit * max(QUANTIZED_RESCORE_FACTOR, 1))
+            exact = np.array([
+                float(self._row_vector(position) @ query) for position in candidates
+            ], dtype=np.float32)
+            order = np.argsort(-exact)[:limit]
+            ranked = [(candidates[i], float(exact[i])) for i in order]
+        else:
+            scores = np.concatenate([segment.exact_scores(query) for segment in self.segments])
+            ranked = [(position, float(scores[position])) for position in top_positions(scores, limit)]
+
+        results = []
+        for position, similarity in ranked:
+            segment, row = self._locate(position)
+            results.append((segment.chunk_id(row), segment.document_id, similarity))
+        return results
+
+    @property
+    def is_quantized(self) -> bool:
+        return VECTOR_QUANTIZATION == "int8" and all(
+            segment.quantized is not None for segment in self.segments
+        )
+
+    def _locate(self, position: int) -> Tuple[VectorSegment, int]:
+        s = int(np.searchsorted(self.offsets, position, side="right")) - 1
+        return self.segments[s], int(position - self.offsets[s])
+
+    def _row_vector(self, position: int) -> np.ndarray:
+        segment, row = self._locate(position)
+        return segment.matrix[row]
+
+
+def top_positions(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the `limit` highest scores, sorted descending (argpartition + sort)"""
+    if limit < len(scores):
+        top = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+def normalize_vector(vector: List[float]) -> np.ndarray:
+    """L2-normalize a single vector as float32"""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize every row of a matrix in place (zero rows stay zero)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+# === On-disk per-document index files ===
+
+def _document_index_dir(document: Document) -> str:
+    index_path = document.index_path or f"indices/{document.teacher_id}/{document.file_hash}"
+    return os.path.join(INDEX_DIR, index_path)
+
+
+def get_document_index_base(document: Document, generation: Dict[str, Any]) -> str:
+    """
+    Base path (without suffix) of a document's index files
+
+    Files live under INDEX_DIR/<document.index_path>/ and are keyed by
+    document id, because the same file uploaded to two modules shares an
+    index_path but has different chunk ids, and by embedding generation.
+    """
+    return os.path.join(_document_index_dir(document), f"{document.id}.g{generation['id']}")
+
+
+def write_document_index(
+    db: Session,
+    document: Document,
+    generation: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    Materialize a document's normalized embeddings as index files
+
+    Writes <base>.vectors.npy (float32 matrix), <base>.chunk_ids.npy
+    (chunk UUID sidecar), <base>.i8.npy and <base>.scales.npy (int8 copy
+    and per-row scales), each atomically via rename.
+
+    Args:
+        db: Database session
+        document: Document whose embeddings to write
+        generation: Embedding generation to write (default: the active one)
+
+    Returns:
+        Base path of the written files, or None if the document has no embeddings
+    """
+    if generation is None:
+        generation = get_active_generation(db)
+
+    matrix, chunk_ids = _read_document_vectors(db, document, generation)
+    if len(chunk_ids) == 0:
+        return None
+    quantized, scales = quantize_rows_int8(matrix)
+
+    base = get_document_index_base(document, generation)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+
+    arrays = (
+        (VECTORS_SUFFIX, matrix),
+        (CHUNK_IDS_SUFFIX, chunk_ids),
+        (INT8_SUFFIX, quantized),
+        (SCALES_SUFFIX, scales),
+    )
+    for suffix, array in arrays:
+        tmp_path = f"{base}{suffix}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, f"{base}{suffix}")
+
+    return base
+
+
+def load_document_index(
+    document: Document,
+    expected_rows: int,
+    generation: Dict[str, Any]
+) -> Optional[VectorSegment]:
+    """
+    Memory-map a document's index files
+
+    Args:
+        document: Document to load
+        expected_rows: Number of embeddings the database holds for it
+        generation: Embedding generation the files were written for
+
+    Returns:
+        VectorSegment over np.memmap arrays, or None if the files are missing
+        or do not match the database
+    """
+    base = get_document_index_base(document, generation)
+    try:
+        arrays = [np.load(f"{base}{suffix}", mmap_mode="r") for suffix in INDEX_SUFFIXES]
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+
+    if any(len(array) != expected_rows for array in arrays):
+        return None
+
+    matrix, chunk_ids, quantized, scales = arrays
+    return VectorSegment(str(document.id), matrix, chunk_ids, quantized, scales)
+
+
+def remove_document_index(document: Document) -> None:
+    """Delete a document's index files (all generations) if present"""
+    pattern = os.path.join(glob.escape(_document_index_dir(document)), f"{document.id}.*")
+    for path in glob.glob(pattern):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[WARNING] Failed to delete index file {path}: {e}")
+
+
+def _read_document_vectors(
+    db: Session,
+    document: Document,
+    generation: Dict[str, Any]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Read a document's embeddings from Postgres as (normalized float32 matrix, chunk id array)"""
+    rows = db.query(
+        DocumentEmbedding.chunk_id,
+        DocumentEmbedding.embedding,
+        DocumentEmbedding.embedding_f32,
+        DocumentEmbedding.embedding_vector
+    ).filter(
+        DocumentEmbedding.document_id == document.id,
+        DocumentEmbedding.embedding_model == generation['embedding_model'],
+        DocumentEmbedding.embedding_dimensions == generation['embedding_dimensions']
+    ).order_by(DocumentEmbedding.chunk_id).all()
+
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype="U36")
+
+    matrix = normalize_rows(np.array(
+        [decode_embedding(row.embedding, row.embedding_f32, row.embedding_vector) for row in rows],
+        dtype=np.float32
+    ))
+    chunk_ids = np.array([str(row.chunk_id) for row in rows], dtype="U36")
+    return matrix, chunk_ids
+
+
+def _load_segment_from_database(db: Session, document: Document, generation: Dict[str, Any]) -> VectorSegment:
+    """Fallback: read a document's embeddings from Postgres into memory"""
+    matrix, chunk_ids = _read_document_vectors(db, document, generation)
+    if len(chunk_ids) == 0:
+        return VectorSegment(str(document.id), matrix, chunk_ids)
+
+    quantized, scales = quantize_rows_int8(matrix)
+    return VectorSegment(str(document.id), matrix, chunk_ids, quantized, scales)
+
+
+# === Per-worker module index cache ===
+
+# module_id -> ModuleVectorIndex
+_indexes: Dict[str, ModuleVectorIndex] = {}
+_lock = threading.Lock()
+
+
+def get_module_embedding_version(db: Session, module_id: str) -> Optional[int]:
+    """Read the module's current embedding version (None if the module is gone)"""
+    row = db.query(Module.embedding_version).filter(Module.id == module_id).first()
+    if row is None:
+        return None
+    return row[0] or 0
+
+
+def bump_module_embedding_version(db: Session, module_id) -> None:
+    """
+    Mark a module's embeddings as changed
+
+    Increments modules.embedding_version so every worker rebuilds its copy
+    of the index on its next query, and drops this worker's copy now.
+    """
+    db.query(Module).filter(Module.id == module_id).update(
+        {Module.embedding_version: Module.embedding_version + 1},
+        synchronize_session=False
+    )
+    db.commit()
+    invalidate_module_index(str(module_id))
+
+
+def invalidate_module_index(module_id: str) -> None:
+    """Drop this worker's cached index for a module"""
+    with _lock:
+        _indexes.pop(str(module_id), None)
+
+
+def invalidate_all_module_indexes() -> None:
+    """Drop every cached module index in this worker (e.g. after a generation switch)"""
+    with _lock:
+        _indexes.clear()
+
+
+def build_module_index(
+    db: Session,
+    module_id: str,
+    version: int,
+    generation: Optional[Dict[str, Any]] = None
+) -> ModuleVectorIndex:
+    """
+    Assemble a module index from its documents' memory-mapped index files
+
+    Documents whose files are missing or stale are read from Postgres once
+    and their files are (re)written, so the next cold start maps them from disk.
+
+    Args:
+        db: Database session
+        module_id: Module ID
+        version: Module embedding version the index is built from
+        generation: Embedding generation to read (default: the active one)
+
+    Returns:
+        ModuleVectorIndex
+    """
+    if generation is None:
+        generation = get_active_generation(db)
+
+    # Retrievable (embedded, non-testbank) documents and their row counts in one indexed query
+    counts = dict(
+        db.query(
+            DocumentEmbedding.document_id,
+            func.count(DocumentEmbedding.id)
+        ).filter(
+            DocumentEmbedding.module_id == module_id,
+            DocumentEmbedding.retrievable == True,
+            DocumentEmbedding.embedding_model == generation['embedding_model'],
+            DocumentEmbedding.embedding_dimensions == generation['embedding_dimensions']
+        ).group_by(DocumentEmbedding.document_id).all()
+    )
+
+    documents = db.query(Document).filter(
+        Document.id.in_(list(counts))
+    ).all() if counts else []
+
+    segments = []
+    for doc in documents:
+        segment = load_document_index(doc, counts.get(doc.id, 0), generation)
+        if segment is None:
+            try:
+                write_document_index(db, doc, generation)
+                segment = load_document_index(doc, counts.get(doc.id, 0), generation)
+            except OSError as e:
+                print(f"[WARNING] Could not write index file for document {doc.id}: {e}")
+        if segment is None:
+            segment = _load_segment_from_database(db, doc, generation)
+        segments.append(segment)
+
+    return ModuleVectorIndex(
+        module_id=module_id,
+        version=version,
+        segments=segments,
+        generation_id=generation['id']
+    )
+
+
+def get_module_index(db: Session, module_id: str) -> Optional[ModuleVectorIndex]:
+    """
+    Get the cached index for a module, building it lazily
+
+    Each uvicorn worker keeps its own index object, but the vectors are
+    memory-mapped from INDEX_DIR, so the pages are shared between workers.
+    Before serving a cached index the module's embedding_version is re-read
+    (a primary-key lookup), so an index built before another worker changed
+    the module's embeddings is rebuilt. An index built from another embedding
+    generation than the active one is rebuilt as well.
+
+    Args:
+        db: Database session
+        module_id: Module ID
+
+    Returns:
+        ModuleVectorIndex, or None if the module no longer exists
+    """
+    module_id = str(module_id)
+    version = get_module_embedding_version(db, module_id)
+
+    if version is None:
+        invalidate_module_index(module_id)
+        return None
+
+    generation = get_active_generation(db)
+
+    with _lock:
+        index = _indexes.get(module_id)
+    if index is not None and index.version == version and index.generation_id == generation['id']:
+        return index
+
+    print(f"🧮 Building vector index for module {module_id} (version {version}, generation {generation['id']})")
+    index = build_module_index(db, module_id, version, generation)
+
+    with _lock:
+        current = _indexes.get(module_id)
+        # Keep whichever copy reflects the newest version
+        if current is None or current.version <= version:
+            _indexes[module_id] = index
+
+    print(f"   Indexed {len(index)} chunks from {len(index.documents)} documents")
+    return index
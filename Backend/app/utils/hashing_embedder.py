@@ -0,0 +1,57 @@
+"""
+Deterministic hashing embedder
+Projects word unigrams and bigrams into a fixed number of signed buckets
+(the "hashing trick") and L2-normalizes the result. Needs no model files or
+network access, so it is used by the local embedding provider.
+
+Kept free of app imports so process-pool workers start quickly.
+"""
+import re
+from hashlib import blake2b
+from typing import List
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def _features(text: str) -> List[str]:
+    words = _WORD_PATTERN.findall(text.lower())
+    bigrams = [f"{first} {second}" for first, second in zip(words, words[1:])]
+    return words + bigrams
+
+
+def _bucket(feature: str, dimensions: int):
+    digest = int.from_bytes(blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    sign = 1.0 if digest & 1 else -1.0
+    return (digest >> 1) % dimensions, sign
+
+
+def hash_embed(texts: List[str], dimensions: int) -> List[List[float]]:
+    """
+    Embed texts into unit vectors of the given size
+
+    Term frequencies are dampened (1 + log tf) so repeated words do not
+    dominate. Identical texts always get identical vectors.
+
+    Args:
+        texts: Texts to embed
+        dimensions: Output vector size
+
+    Returns:
+        One list of floats per text
+    """
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+
+    for row, text in enumerate(texts):
+        counts = {}
+        for feature in _features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+
+        for feature, count in counts.items():
+            column, sign = _bucket(feature, dimensions)
+            matrix[row, column] += sign * (1.0 + np.log(count))
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).tolist()
@@ -0,0 +1,120 @@
+"""
+Token counting utilities
+Uses tiktoken's cl100k_base encoding (ada-002, text-embedding-3-*, gpt-4) and
+falls back to a character-based estimate when the encoding is unavailable
+(e.g. offline, where tiktoken cannot fetch its BPE file)
+"""
+import re
+import threading
+from typing import List, Optional
+
+# Average characters per token for English prose with cl100k_base
+CHARS_PER_TOKEN = 4.0
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"⚠️ tiktoken unavailable, estimating token counts from length: {str(e)}")
+                _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (exact with tiktoken, estimated otherwise)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, int(len(text) / CHARS_PER_TOKEN + 0.5))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+    return text[:int(max_tokens * CHARS_PER_TOKEN)]
+
+
+# End of a sentence: terminal punctuation (plus closing quotes/brackets) before whitespace or the end
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s|$)")
+
+
+def truncate_to_sentences(text: str, max_tokens: int) -> str:
+    """
+    Cut text to at most max_tokens tokens, ending on a sentence boundary
+
+    Falls back to a hard token cut (marked with "...") when even the first
+    sentence does not fit.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    end = 0
+    for match in _SENTENCE_END.finditer(text):
+        if count_tokens(text[:match.end()]) > max_tokens:
+            break
+        end = match.end()
+
+    if end:
+        return text[:end]
+    return truncate_to_tokens(text, max(max_tokens - 1, 0)).rstrip() + "..."
+
+
+def pack_by_tokens(
+    token_counts: List[int],
+    max_tokens: int,
+    max_items: Optional[int] = None
+) -> List[List[int]]:
+    """
+    Group item positions into consecutive batches under a token budget
+
+    Items are kept in order; an item larger than max_tokens gets a batch
+    of its own.
+
+    Args:
+        token_counts: Tokens per item
+        max_tokens: Token budget per batch
+        max_items: Optional cap on items per batch
+
+    Returns:
+        List of batches, each a list of item positions
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for position, tokens in enumerate(token_counts):
+        full = current and (
+            current_tokens + tokens > max_tokens
+            or (max_items is not None and len(current) >= max_items)
+        )
+        if full:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(position)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,55 @@
+"""
+Compact binary encodings for embedding vectors
+- float32: little-endian packed bytes (4 bytes per dimension)
+- int8: symmetric scalar quantization with one float scale per row (in-memory first pass)
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+FLOAT32_DTYPE = np.dtype("<f4")
+
+
+def pack_float32(vector: Sequence[float]) -> bytes:
+    """Encode a vector as little-endian float32 bytes"""
+    return np.asarray(vector, dtype=FLOAT32_DTYPE).tobytes()
+
+
+def unpack_float32(data: bytes) -> np.ndarray:
+    """Decode little-endian float32 bytes into a float32 array"""
+    return np.frombuffer(data, dtype=FLOAT32_DTYPE).astype(np.float32)
+
+
+def quantize_rows_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row-wise int8 quantization of a matrix
+
+    Returns:
+        (int8 matrix, float32 scale per row)
+    """
+    max_abs = np.max(np.abs(matrix), axis=1) if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def decode_embedding(
+    embedding: Optional[Sequence[float]],
+    embedding_f32: Optional[bytes] = None,
+    embedding_vector: Optional[List[float]] = None
+) -> Optional[np.ndarray]:
+    """
+    Read an embedding row's exact vector
+
+    Prefers the pgvector column and falls back to the packed float32 column
+    (older rows without a pgvector copy) and the legacy float[] column
+    (rows that have not been migrated yet).
+    """
+    if embedding is not None:
+        return np.asarray(embedding, dtype=np.float32)
+    if embedding_f32 is not None:
+        return unpack_float32(embedding_f32)
+    if embedding_vector is not None:
+        return np.asarray(embedding_vector, dtype=np.float32)
+    return None
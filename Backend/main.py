@@ -25,9 +25,11 @@ from app.api.routes.student_answers import router as student_answers_router
 from app.api.routes.chat import router as chat_router
 from app.api.routes.survey import router as survey_router
 from app.api.routes.export import router as export_router
+from app.api.routes.rag import router as rag_router
 
 from app.core.config import add_cors
 from app.database import engine
+from sqlalchemy import text
 from app.models import Base
 
 
@@ -63,16 +65,45 @@ app.include_router(student_answers_router, prefix="/api/student-answers", tags=[
 app.include_router(chat_router, prefix="/api", tags=["Chat"])
 app.include_router(survey_router, prefix="/api", tags=["Survey"])
 app.include_router(export_router, prefix="/api", tags=["Export"])
+app.include_router(rag_router, prefix="/api")
 
 # 🚀 Startup event to create all tables and import all models
 @app.on_event("startup")
 def on_startup():
     # ✅ Ensure all models are imported for table creation
-    from app.models import user, document, question, module, student_answer, student_enrollment, survey_response, question_queue, document_chunk, document_embedding, ai_feedback, chat_conversation, chat_message
+    from app.models import user, document, question, module, student_answer, student_enrollment, survey_response, question_queue, document_chunk, document_embedding, ai_feedback, chat_conversation, chat_message, query_embedding_cache, embedding_generation, document_summary_embedding, question_context, feedback_memo, feedback_job
     print("🚀 App started! Creating tables...")
+    # pgvector must exist before document_embeddings (vector column + HNSW index) is created
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
     Base.metadata.create_all(bind=engine)
     print("✅ All tables created successfully (including student_enrollments, survey_responses, ai_feedback and chat tables)")
 
+    # 🧬 Make sure the active embedding generation has its (per-dimension) HNSW index
+    from app.database import SessionLocal
+    from app.services.embedding_generation import (
+        get_active_generation,
+        get_target_generation,
+        ensure_generation_vector_index
+    )
+    db = SessionLocal()
+    try:
+        generation = get_active_generation(db)
+        ensure_generation_vector_index(db, generation['embedding_dimensions'])
+        if get_target_generation() != (generation['embedding_model'], generation['embedding_dimensions']):
+            model, dimensions = get_target_generation()
+            print(f"⚠️ EMBED_MODEL/EMBED_DIMENSIONS ({model}, {dimensions}) differ from the active embedding generation "
+                  f"({generation['embedding_model']}, {generation['embedding_dimensions']}); "
+                  f"run scripts/reembed_generation.py to switch")
+    finally:
+        db.close()
+
+# 🛑 Shutdown event to write this worker's batched feedback memo hit counts
+@app.on_event("shutdown")
+def on_shutdown():
+    from app.services.feedback_memo import flush_memo_hits
+    flush_memo_hits()
+
 # 📎 Test route
 @app.get("/")
 def read_root():
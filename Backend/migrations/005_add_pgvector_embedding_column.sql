@@ -0,0 +1,38 @@
+-- Migration: Add pgvector embedding column with HNSW index
+-- Date: 2025-11-03
+-- Description: Store embeddings as pgvector vectors so top-k similarity search
+--              runs inside Postgres instead of scanning every row in Python
+
+-- Enable pgvector (available on Supabase and most managed Postgres)
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Add the vector column next to the legacy float[] column
+ALTER TABLE document_embeddings
+ADD COLUMN IF NOT EXISTS embedding vector(1536);
+
+-- Backfill existing rows from the legacy float[] column
+UPDATE document_embeddings
+SET embedding = embedding_vector::vector(1536)
+WHERE embedding IS NULL
+AND embedding_vector IS NOT NULL
+AND array_length(embedding_vector, 1) = 1536;
+
+-- Create HNSW index for cosine distance (used by: ORDER BY embedding <=> :q LIMIT k)
+CREATE INDEX IF NOT EXISTS idx_embeddings_embedding_hnsw
+ON document_embeddings
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Add comments for documentation
+COMMENT ON COLUMN document_embeddings.embedding IS 'pgvector copy of embedding_vector, indexed with HNSW for cosine top-k search';
+
+-- Verify the backfill
+SELECT
+    COUNT(*) AS total_embeddings,
+    COUNT(embedding) AS vector_embeddings,
+    COUNT(*) - COUNT(embedding) AS missing_vectors
+FROM document_embeddings;
+
+-- Rollback (if needed):
+-- DROP INDEX IF EXISTS idx_embeddings_embedding_hnsw;
+-- ALTER TABLE document_embeddings DROP COLUMN IF EXISTS embedding;
@@ -0,0 +1,18 @@
+-- Migration: Add embedding_version to modules
+-- Date: 2025-11-05
+-- Description: Version counter bumped whenever a module's retrievable embeddings
+--              change, so per-worker in-memory vector indexes can detect stale copies
+
+ALTER TABLE modules
+ADD COLUMN IF NOT EXISTS embedding_version INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN modules.embedding_version IS 'Incremented when a document finishes embedding or is deleted; invalidates cached retrieval indexes';
+
+-- Verify the column
+SELECT column_name, data_type, column_default
+FROM information_schema.columns
+WHERE table_name = 'modules'
+AND column_name = 'embedding_version';
+
+-- Rollback (if needed):
+-- ALTER TABLE modules DROP COLUMN IF EXISTS embedding_version;
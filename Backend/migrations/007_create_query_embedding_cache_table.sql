@@ -0,0 +1,23 @@
+-- Migration: Create query_embedding_cache table
+-- Date: 2025-11-07
+-- Description: Optional persistent layer of the query-embedding cache
+--              (enabled with QUERY_EMBEDDING_CACHE_PERSIST=true)
+
+CREATE TABLE IF NOT EXISTS query_embedding_cache (
+    embedding_model VARCHAR NOT NULL,
+    text_hash VARCHAR(64) NOT NULL,
+    embedding_vector float[] NOT NULL,
+    embedding_dimensions INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+
+    PRIMARY KEY (embedding_model, text_hash)
+);
+
+COMMENT ON TABLE query_embedding_cache IS 'Cached query embeddings keyed by (model, sha256 of query text)';
+COMMENT ON COLUMN query_embedding_cache.text_hash IS 'sha256 hex digest of the exact query text';
+
+-- Optional cleanup of old entries:
+-- DELETE FROM query_embedding_cache WHERE created_at < NOW() - INTERVAL '90 days';
+
+-- Rollback (if needed):
+-- DROP TABLE IF EXISTS query_embedding_cache;
@@ -0,0 +1,38 @@
+-- Migration: Add content_hash to document_embeddings
+-- Date: 2025-11-10
+-- Description: Content-address chunk embeddings (model + normalized chunk text)
+--              so identical chunks in re-uploaded or edited documents reuse
+--              existing vectors instead of calling the embedding API again
+
+ALTER TABLE document_embeddings
+ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+-- Backfill: must match app.services.embedding.compute_content_hash
+-- sha256(model || '\n' || whitespace-collapsed, trimmed chunk text)
+UPDATE document_embeddings e
+SET content_hash = encode(
+    sha256(convert_to(
+        e.embedding_model || E'\n' || btrim(regexp_replace(c.chunk_text, '\s+', ' ', 'g')),
+        'UTF8'
+    )),
+    'hex'
+)
+FROM document_chunks c
+WHERE e.chunk_id = c.id
+AND e.content_hash IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_content_hash_model
+ON document_embeddings(content_hash, embedding_model);
+
+COMMENT ON COLUMN document_embeddings.content_hash IS 'sha256 of embedding model + normalized chunk text, used for embedding reuse';
+
+-- Verify the backfill
+SELECT
+    COUNT(*) AS total_embeddings,
+    COUNT(content_hash) AS hashed_embeddings,
+    COUNT(DISTINCT content_hash) AS distinct_contents
+FROM document_embeddings;
+
+-- Rollback (if needed):
+-- DROP INDEX IF EXISTS idx_embeddings_content_hash_model;
+-- ALTER TABLE document_embeddings DROP COLUMN IF EXISTS content_hash;
@@ -0,0 +1,106 @@
+"""
+Migration script to store embeddings compactly.
+Adds a packed float32 column (embedding_f32) to document_embeddings and
+backfills it from the legacy float[] column (embedding_vector), which becomes
+nullable. (The int8 copy this migration once added is dropped by migration 020.)
+
+Usage:
+    python migrations/009_compact_embedding_storage.py
+    python migrations/009_compact_embedding_storage.py --drop-legacy
+    python migrations/009_compact_embedding_storage.py down
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app.database import engine, SessionLocal
+from app.models.document_embedding import DocumentEmbedding
+from app.utils.vector_codec import pack_float32, unpack_float32
+
+BATCH_SIZE = 500
+
+
+def upgrade(drop_legacy: bool = False):
+    """Add the compact columns and backfill them"""
+    print("Adding compact embedding columns...")
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE document_embeddings ADD COLUMN IF NOT EXISTS embedding_f32 BYTEA"))
+        conn.execute(text("ALTER TABLE document_embeddings ALTER COLUMN embedding_vector DROP NOT NULL"))
+
+    print("Backfilling from embedding_vector...")
+
+    db = SessionLocal()
+    try:
+        converted = 0
+        while True:
+            rows = db.query(DocumentEmbedding).filter(
+                DocumentEmbedding.embedding_f32.is_(None),
+                DocumentEmbedding.embedding_vector.isnot(None)
+            ).limit(BATCH_SIZE).all()
+
+            if not rows:
+                break
+
+            for row in rows:
+                row.embedding_f32 = pack_float32(row.embedding_vector)
+
+            db.commit()
+            converted += len(rows)
+            print(f"  converted {converted} embeddings")
+
+        print(f"✅ Backfilled {converted} embeddings")
+
+        if drop_legacy:
+            result = db.execute(text(
+                "UPDATE document_embeddings SET embedding_vector = NULL "
+                "WHERE embedding_f32 IS NOT NULL AND embedding_vector IS NOT NULL"
+            ))
+            db.commit()
+            print(f"✅ Cleared legacy embedding_vector on {result.rowcount} rows")
+            print("   Run VACUUM FULL document_embeddings to reclaim the space")
+
+    finally:
+        db.close()
+
+
+def downgrade():
+    """Restore embedding_vector from embedding_f32 and drop the compact columns"""
+    print("Restoring embedding_vector and dropping compact columns...")
+
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.query(DocumentEmbedding).filter(
+                DocumentEmbedding.embedding_vector.is_(None),
+                DocumentEmbedding.embedding_f32.isnot(None)
+            ).limit(BATCH_SIZE).all()
+
+            if not rows:
+                break
+
+            for row in rows:
+                row.embedding_vector = unpack_float32(row.embedding_f32).tolist()
+
+            db.commit()
+    finally:
+        db.close()
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE document_embeddings DROP COLUMN IF EXISTS embedding_f32"))
+        conn.execute(text("ALTER TABLE document_embeddings DROP COLUMN IF EXISTS embedding_i8"))
+        conn.execute(text("ALTER TABLE document_embeddings DROP COLUMN IF EXISTS embedding_scale"))
+
+    print("✅ Compact embedding columns dropped")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "down":
+        downgrade()
+    else:
+        upgrade(drop_legacy="--drop-legacy" in sys.argv)
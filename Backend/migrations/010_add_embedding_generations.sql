@@ -0,0 +1,74 @@
+-- Migration: Add embedding generations
+-- Date: 2025-11-17
+-- Description: Allow chunks to hold embeddings from several (model, dimensions)
+--              generations so a new model or reduced dimension can be backfilled
+--              while retrieval keeps reading the active generation
+
+CREATE TABLE IF NOT EXISTS embedding_generations (
+    id SERIAL PRIMARY KEY,
+    embedding_model VARCHAR NOT NULL,
+    embedding_dimensions INTEGER NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'building',  -- building | active | retired
+    created_at TIMESTAMP DEFAULT NOW(),
+    activated_at TIMESTAMP,
+    retired_at TIMESTAMP,
+
+    CONSTRAINT uix_embedding_generation_model_dims UNIQUE (embedding_model, embedding_dimensions)
+);
+
+-- At most one active generation
+CREATE UNIQUE INDEX IF NOT EXISTS uix_embedding_generations_active
+ON embedding_generations(status)
+WHERE status = 'active';
+
+-- Seed the active generation from the embeddings that already exist
+INSERT INTO embedding_generations (embedding_model, embedding_dimensions, status, activated_at)
+SELECT embedding_model, embedding_dimensions, 'active', NOW()
+FROM (
+    SELECT embedding_model, embedding_dimensions, COUNT(*) AS n
+    FROM document_embeddings
+    GROUP BY embedding_model, embedding_dimensions
+    ORDER BY n DESC
+    LIMIT 1
+) most_common
+WHERE NOT EXISTS (SELECT 1 FROM embedding_generations WHERE status = 'active')
+ON CONFLICT (embedding_model, embedding_dimensions) DO NOTHING;
+
+-- One embedding per chunk per generation (was: one per chunk)
+ALTER TABLE document_embeddings DROP CONSTRAINT IF EXISTS uix_embedding_chunk_id;
+ALTER TABLE document_embeddings
+ADD CONSTRAINT uix_embedding_chunk_generation UNIQUE (chunk_id, embedding_model, embedding_dimensions);
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_generation_document
+ON document_embeddings(embedding_model, embedding_dimensions, document_id);
+
+-- Untyped vector column; HNSW indexes become partial expression indexes per dimension
+DROP INDEX IF EXISTS idx_embeddings_embedding_hnsw;
+ALTER TABLE document_embeddings ALTER COLUMN embedding TYPE vector;
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_embedding_hnsw_1536
+ON document_embeddings
+USING hnsw ((embedding::vector(1536)) vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE embedding_dimensions = 1536;
+
+-- Other sizes get their index when scripts/reembed_generation.py starts a generation, e.g.:
+-- CREATE INDEX IF NOT EXISTS idx_embeddings_embedding_hnsw_512
+-- ON document_embeddings
+-- USING hnsw ((embedding::vector(512)) vector_cosine_ops)
+-- WITH (m = 16, ef_construction = 64)
+-- WHERE embedding_dimensions = 512;
+
+COMMENT ON TABLE embedding_generations IS 'Embedding model/dimension generations; retrieval reads the active one';
+
+-- Verify
+SELECT id, embedding_model, embedding_dimensions, status FROM embedding_generations ORDER BY id;
+
+-- Rollback (if needed, only with a single 1536-dim generation):
+-- DROP INDEX IF EXISTS idx_embeddings_embedding_hnsw_1536;
+-- ALTER TABLE document_embeddings ALTER COLUMN embedding TYPE vector(1536);
+-- CREATE INDEX idx_embeddings_embedding_hnsw ON document_embeddings USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+-- ALTER TABLE document_embeddings DROP CONSTRAINT IF EXISTS uix_embedding_chunk_generation;
+-- ALTER TABLE document_embeddings ADD CONSTRAINT uix_embedding_chunk_id UNIQUE (chunk_id);
+-- DROP INDEX IF EXISTS idx_embeddings_generation_document;
+-- DROP TABLE IF EXISTS embedding_generations;
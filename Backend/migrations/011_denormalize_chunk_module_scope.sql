@@ -0,0 +1,51 @@
+-- Migration: Denormalize module_id and retrievable onto chunks and embeddings
+-- Date: 2025-11-18
+-- Description: Module-scoped retrieval filters chunk/embedding rows directly
+--              (module_id + retrievable) instead of looking up the module's
+--              embedded, non-testbank documents first.
+--              retrievable = document is 'embedded' and not a testbank; kept in
+--              sync by app.services.document_status.update_document_status
+
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS module_id UUID REFERENCES modules(id) ON DELETE CASCADE,
+ADD COLUMN IF NOT EXISTS retrievable BOOLEAN NOT NULL DEFAULT FALSE;
+
+ALTER TABLE document_embeddings
+ADD COLUMN IF NOT EXISTS module_id UUID REFERENCES modules(id) ON DELETE CASCADE,
+ADD COLUMN IF NOT EXISTS retrievable BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Backfill from the parent documents
+UPDATE document_chunks c
+SET module_id = d.module_id,
+    retrievable = (d.processing_status = 'embedded' AND NOT COALESCE(d.is_testbank, FALSE))
+FROM documents d
+WHERE c.document_id = d.id;
+
+UPDATE document_embeddings e
+SET module_id = d.module_id,
+    retrievable = (d.processing_status = 'embedded' AND NOT COALESCE(d.is_testbank, FALSE))
+FROM documents d
+WHERE e.document_id = d.id;
+
+-- Composite indexes for module-scoped retrieval
+CREATE INDEX IF NOT EXISTS idx_chunks_module_retrievable
+ON document_chunks(module_id, retrievable);
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_module_retrievable_generation
+ON document_embeddings(module_id, retrievable, embedding_model, embedding_dimensions);
+
+COMMENT ON COLUMN document_embeddings.module_id IS 'Copy of documents.module_id for single-query module retrieval';
+COMMENT ON COLUMN document_embeddings.retrievable IS 'Parent document is embedded and not a testbank';
+
+-- Verify the backfill (mismatches should be 0)
+SELECT COUNT(*) AS mismatched_embeddings
+FROM document_embeddings e
+JOIN documents d ON d.id = e.document_id
+WHERE e.module_id IS DISTINCT FROM d.module_id
+OR e.retrievable <> (d.processing_status = 'embedded' AND NOT COALESCE(d.is_testbank, FALSE));
+
+-- Rollback (if needed):
+-- DROP INDEX IF EXISTS idx_embeddings_module_retrievable_generation;
+-- DROP INDEX IF EXISTS idx_chunks_module_retrievable;
+-- ALTER TABLE document_embeddings DROP COLUMN IF EXISTS retrievable, DROP COLUMN IF EXISTS module_id;
+-- ALTER TABLE document_chunks DROP COLUMN IF EXISTS retrievable, DROP COLUMN IF EXISTS module_id;
@@ -0,0 +1,21 @@
+-- Migration: Add token_count to document_chunks
+-- Date: 2025-11-20
+-- Description: Store each chunk's token count (cl100k_base) at chunk creation so
+--              embedding batches can be packed by tokens and prompt packing /
+--              cost accounting can use exact numbers
+
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS token_count INTEGER;
+
+-- Rows created before this migration keep NULL and are counted with the
+-- tokenizer the next time their document is embedded
+-- (generate_embeddings_for_document fills NULLs); readers fall back to
+-- app.utils.tokens.count_tokens when the column is NULL.
+
+COMMENT ON COLUMN document_chunks.token_count IS 'Tokens in chunk_text (cl100k_base), used for batch packing and prompt budgets';
+
+-- Verify
+SELECT COUNT(*) AS total_chunks, COUNT(token_count) AS counted_chunks FROM document_chunks;
+
+-- Rollback (if needed):
+-- ALTER TABLE document_chunks DROP COLUMN IF EXISTS token_count;
@@ -0,0 +1,30 @@
+-- Migration: Create document_summary_embeddings table
+-- Date: 2025-11-21
+-- Description: Per-document centroid vectors (one per embedding generation) for
+--              coarse-to-fine retrieval: large modules first pick the top documents
+--              by centroid similarity and only score those documents' chunks
+
+CREATE TABLE IF NOT EXISTS document_summary_embeddings (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    embedding_model VARCHAR NOT NULL,
+    embedding_dimensions INTEGER NOT NULL,
+    embedding vector NOT NULL,
+    embedding_f32 BYTEA NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+
+    CONSTRAINT uix_summary_document_generation UNIQUE (document_id, embedding_model, embedding_dimensions)
+);
+
+-- Existing documents get their centroid from scripts/backfill_document_summaries.py;
+-- until then retrieval scores their chunks directly (documents without a summary
+-- always pass the coarse stage)
+
+COMMENT ON TABLE document_summary_embeddings IS 'Normalized mean chunk embedding per document and generation, for coarse document selection';
+
+-- Verify
+SELECT embedding_model, embedding_dimensions, COUNT(*) FROM document_summary_embeddings GROUP BY 1, 2;
+
+-- Rollback (if needed):
+-- DROP TABLE IF EXISTS document_summary_embeddings;
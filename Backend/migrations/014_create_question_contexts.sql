@@ -0,0 +1,28 @@
+-- Migration: Create question_contexts table
+-- Date: 2025-11-22
+-- Description: Retrieval context precomputed when questions are approved (question
+--              stem + each MCQ option), so MCQ feedback skips the embedding call
+--              and vector search
+
+CREATE TABLE IF NOT EXISTS question_contexts (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    question_id UUID NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    module_id UUID NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    answer_key VARCHAR NOT NULL,           -- 'stem' or MCQ option letter
+    question_hash VARCHAR NOT NULL,
+    settings_hash VARCHAR NOT NULL,
+    embedding_version INTEGER NOT NULL,
+    generation_id INTEGER,
+    context JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+
+    CONSTRAINT uix_question_context_answer UNIQUE (question_id, answer_key)
+);
+
+COMMENT ON TABLE question_contexts IS 'Precomputed RAG context per question stem / MCQ option; valid while embedding_version, question_hash and settings_hash match';
+
+-- Verify
+SELECT COUNT(*) FROM question_contexts;
+
+-- Rollback (if needed):
+-- DROP TABLE IF EXISTS question_contexts;
@@ -0,0 +1,32 @@
+-- Migration: Create feedback_memos table
+-- Date: 2025-11-23
+-- Description: Feedback reused across students who give the same answer (MCQ option
+--              or normalized short answer) to the same question, keyed by a hash of
+--              the question, answer, correct answer, rubric, model and module
+--              embedding version
+
+CREATE TABLE IF NOT EXISTS feedback_memos (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    memo_key VARCHAR NOT NULL UNIQUE,
+    question_id UUID NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    module_id UUID NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    answer_key VARCHAR NOT NULL,
+    feedback JSONB NOT NULL,
+    used_rag BOOLEAN NOT NULL DEFAULT FALSE,
+    rag_sources JSONB,
+    model_used VARCHAR NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    last_used_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_feedback_memos_memo_key ON feedback_memos (memo_key);
+CREATE INDEX IF NOT EXISTS ix_feedback_memos_question_id ON feedback_memos (question_id);
+
+COMMENT ON TABLE feedback_memos IS 'Generated feedback shared by identical answers; outdated keys are never looked up again';
+
+-- Verify
+SELECT COUNT(*), SUM(hit_count) FROM feedback_memos;
+
+-- Rollback (if needed):
+-- DROP TABLE IF EXISTS feedback_memos;
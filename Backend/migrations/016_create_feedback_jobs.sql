@@ -0,0 +1,34 @@
+-- Migration: Create feedback_jobs table
+-- Date: 2025-11-24
+-- Description: Durable queue for AI feedback generation. submit-test enqueues one
+--              job per answer; workers claim jobs with FOR UPDATE SKIP LOCKED under
+--              a lease, retry with exponential backoff and give up after max_attempts
+
+CREATE TABLE IF NOT EXISTS feedback_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    answer_id UUID NOT NULL UNIQUE REFERENCES student_answers(id) ON DELETE CASCADE,
+    student_id VARCHAR NOT NULL,
+    module_id UUID NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    attempt INTEGER NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'queued',  -- queued, running, succeeded, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR,
+    lease_expires_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_feedback_jobs_claim ON feedback_jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS ix_feedback_jobs_attempt ON feedback_jobs (student_id, module_id, attempt);
+
+COMMENT ON TABLE feedback_jobs IS 'AI feedback work queue; one job per submitted answer';
+
+-- Verify
+SELECT status, COUNT(*) FROM feedback_jobs GROUP BY status;
+
+-- Rollback (if needed):
+-- DROP TABLE IF EXISTS feedback_jobs;
@@ -0,0 +1,15 @@
+-- Migration: Add batch_id to feedback_jobs
+-- Date: 2025-11-25
+-- Description: Jobs queued by POST /student-answers/modules/{id}/feedback/batch share a
+--              batch_id, so the batch's progress can be polled
+
+ALTER TABLE feedback_jobs ADD COLUMN IF NOT EXISTS batch_id UUID;
+
+CREATE INDEX IF NOT EXISTS ix_feedback_jobs_batch_id ON feedback_jobs (batch_id);
+
+-- Verify
+SELECT batch_id, status, COUNT(*) FROM feedback_jobs WHERE batch_id IS NOT NULL GROUP BY batch_id, status;
+
+-- Rollback (if needed):
+-- DROP INDEX IF EXISTS ix_feedback_jobs_batch_id;
+-- ALTER TABLE feedback_jobs DROP COLUMN IF EXISTS batch_id;
@@ -0,0 +1,26 @@
+-- Migration: Clear duplicate packed float32 embeddings
+-- Date: 2025-11-26
+-- Description: The pgvector column (embedding) already holds every row's exact vector, so the
+--              packed float32 copy (embedding_f32) doubled the exact storage. It is no longer
+--              written; clear it on rows that have a pgvector copy. Rows without one (sizes the
+--              005 backfill skipped) keep it as their exact copy.
+
+UPDATE document_embeddings
+SET embedding_f32 = NULL
+WHERE embedding_f32 IS NOT NULL
+AND embedding IS NOT NULL;
+
+-- Reclaim the space afterwards (locks the table):
+-- VACUUM FULL document_embeddings;
+
+-- Verify
+SELECT
+    COUNT(*) AS total_embeddings,
+    COUNT(embedding) AS vector_embeddings,
+    COUNT(embedding_f32) AS float32_copies,
+    COUNT(*) FILTER (WHERE embedding IS NULL AND embedding_f32 IS NULL AND embedding_vector IS NULL) AS missing_exact_vector
+FROM document_embeddings;
+
+-- Rollback (if needed):
+-- Not reversible in SQL; the current code reads exact vectors from the pgvector column.
+-- Code from before this migration needs embedding_f32 re-packed from embedding.
@@ -0,0 +1,17 @@
+-- Migration: Drop the pgvector copy of document summary centroids
+-- Date: 2025-11-26
+-- Description: The coarse retrieval stage scores centroids in process from the packed
+--              float32 copy (embedding_f32); the pgvector column was written but never
+--              read, so every centroid was stored twice
+
+ALTER TABLE document_summary_embeddings DROP COLUMN IF EXISTS embedding;
+
+-- Verify
+SELECT column_name FROM information_schema.columns
+WHERE table_name = 'document_summary_embeddings'
+ORDER BY ordinal_position;
+
+-- Rollback (if needed):
+-- ALTER TABLE document_summary_embeddings ADD COLUMN embedding vector;
+-- Code from before this migration also needs the column filled (re-run
+-- scripts/backfill_document_summaries.py) and made NOT NULL again.
@@ -0,0 +1,21 @@
+-- Migration: Drop the stored int8 embedding copy
+-- Date: 2025-11-27
+-- Description: embedding_i8 and embedding_scale were written on every embedding row but never
+--              read. The pgvector backend scores the pgvector column, and the numpy backend
+--              quantizes its in-memory module matrix itself (app/services/vector_index.py)
+
+ALTER TABLE document_embeddings DROP COLUMN IF EXISTS embedding_i8;
+ALTER TABLE document_embeddings DROP COLUMN IF EXISTS embedding_scale;
+
+-- Reclaim the space afterwards (locks the table):
+-- VACUUM FULL document_embeddings;
+
+-- Verify
+SELECT column_name FROM information_schema.columns
+WHERE table_name = 'document_embeddings'
+ORDER BY ordinal_position;
+
+-- Rollback (if needed):
+-- ALTER TABLE document_embeddings ADD COLUMN embedding_i8 BYTEA;
+-- ALTER TABLE document_embeddings ADD COLUMN embedding_scale DOUBLE PRECISION;
+-- (code from before this migration writes them again for new rows only)
@@ -0,0 +1,69 @@
+"""
+Script to compute document summary (centroid) vectors for documents embedded
+before coarse-to-fine retrieval existed
+
+Documents without a summary are always searched chunk by chunk, so this only
+makes retrieval in large modules cheaper; it is safe to run at any time.
+
+Usage:
+    python scripts/backfill_document_summaries.py
+"""
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.models.document import Document
+from app.models.document_embedding import DocumentEmbedding
+from app.models.document_summary_embedding import DocumentSummaryEmbedding
+from app.services.document_summary import compute_document_summary
+from app.services.embedding_generation import get_active_generation
+from app.services.vector_index import bump_module_embedding_version
+
+
+def backfill_document_summaries() -> None:
+    db = SessionLocal()
+
+    try:
+        generation = get_active_generation(db)
+        print(f"🧬 Generation: {generation['embedding_model']} ({generation['embedding_dimensions']} dims)")
+
+        has_summary = db.query(DocumentSummaryEmbedding.id).filter(
+            DocumentSummaryEmbedding.document_id == Document.id,
+            DocumentSummaryEmbedding.embedding_model == generation['embedding_model'],
+            DocumentSummaryEmbedding.embedding_dimensions == generation['embedding_dimensions']
+        ).exists()
+
+        has_embeddings = db.query(DocumentEmbedding.id).filter(
+            DocumentEmbedding.document_id == Document.id,
+            DocumentEmbedding.embedding_model == generation['embedding_model'],
+            DocumentEmbedding.embedding_dimensions == generation['embedding_dimensions']
+        ).exists()
+
+        documents = db.query(Document.id, Document.module_id).filter(has_embeddings, ~has_summary).all()
+        print(f"📋 {len(documents)} documents without a summary vector\n")
+
+        modules = set()
+        for document_id, module_id in documents:
+            try:
+                count = compute_document_summary(db, document_id, generation)
+                print(f"   ✅ {document_id}: averaged {count} chunks")
+                modules.add(module_id)
+            except Exception as e:
+                db.rollback()
+                print(f"   ❌ {document_id}: {str(e)}")
+
+        # Workers reload a module's summaries when its embedding version changes
+        for module_id in modules:
+            bump_module_embedding_version(db, module_id)
+
+        print(f"\n🎉 Done! Updated {len(modules)} modules")
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    backfill_document_summaries()
@@ -0,0 +1,424 @@
+"""
+Script to benchmark retrieval on synthetic modules
+Generates documents x chunks x dimensions of seeded random or clustered vectors
+and reports p50/p95 latency, memory and recall@k against exact search
+
+In-process mode (default) times the numpy module index directly and needs no
+database. --database mode writes a throwaway module into the configured
+(local) Postgres and times search_similar_chunks(),
+search_similar_chunks_in_module() and get_context_for_feedback() end to end;
+queries are embedded by a stub provider, so no API calls are made.
+
+Usage:
+    python scripts/benchmark_retrieval.py --documents 100 --chunks 50 --dims 512
+    python scripts/benchmark_retrieval.py --distribution random --queries 500
+    python scripts/benchmark_retrieval.py --database --backend numpy --documents 200
+    python scripts/benchmark_retrieval.py --database --backend pgvector --keep
+    python scripts/benchmark_retrieval.py --database --backend pgvector --distractor-documents 2000
+"""
+import sys
+import os
+import re
+import time
+import uuid
+import argparse
+import resource
+import tracemalloc
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+# === Synthetic corpus ===
+
+def synthetic_corpus(documents: int, chunks: int, dims: int, distribution: str, seed: int):
+    """
+    Normalized (documents * chunks, dims) matrix and the document of each row
+
+    "clustered" gives every document its own topic center (so documents are
+    separable, like real course material); "random" is isotropic noise, the
+    worst case for both quantization and the coarse document stage.
+    """
+    from app.services.vector_index import normalize_rows
+
+    rng = np.random.default_rng(seed)
+    rows = documents * chunks
+    row_documents = np.repeat(np.arange(documents), chunks)
+
+    if distribution == "clustered":
+        centers = rng.standard_normal((documents, dims)).astype(np.float32)
+        matrix = centers[row_documents] + 0.7 * rng.standard_normal((rows, dims)).astype(np.float32)
+    else:
+        matrix = rng.standard_normal((rows, dims)).astype(np.float32)
+
+    return normalize_rows(matrix), row_documents
+
+
+def synthetic_queries(matrix: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Perturbed corpus rows, like real questions about the material"""
+    from app.services.vector_index import normalize_rows
+
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.integers(0, len(matrix), count)
+    return normalize_rows(
+        matrix[picks] + 0.3 * rng.standard_normal((count, matrix.shape[1])).astype(np.float32)
+    )
+
+
+def exact_top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> set:
+    from app.services.vector_index import top_positions
+    return set(top_positions(matrix @ query, k).tolist())
+
+
+# === Measurement ===
+
+class Measurement:
+    """Latencies and recall of one retrieval path"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies_ms = []
+        self.hits = 0
+        self.expected = 0
+
+    def time(self, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.latencies_ms.append((time.perf_counter() - start) * 1000)
+        return result
+
+    def add_recall(self, expected: set, returned: set) -> None:
+        self.hits += len(expected & returned)
+        self.expected += len(expected)
+
+    def report(self) -> str:
+        latencies = np.array(self.latencies_ms)
+        line = (
+            f"   {self.name:<34} p50 {np.percentile(latencies, 50):8.2f} ms   "
+            f"p95 {np.percentile(latencies, 95):8.2f} ms"
+        )
+        if self.expected:
+            line += f"   recall {self.hits / self.expected:.4f}"
+        return line
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (Linux reports KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def print_memory(index_bytes: int, traced_peak: int) -> None:
+    print(f"\n💾 Index arrays: {index_bytes / 1024 ** 2:.1f} MB")
+    print(f"💾 Peak allocations while searching: {traced_peak / 1024 ** 2:.1f} MB")
+    print(f"💾 Peak process RSS: {peak_rss_mb():.1f} MB")
+
+
+# === In-process benchmark (no database) ===
+
+def benchmark_in_process(args) -> None:
+    from app.core.config import VECTOR_QUANTIZATION
+    from app.services.vector_index import VectorSegment, ModuleVectorIndex, normalize_rows
+    from app.utils.vector_codec import quantize_rows_int8
+
+    matrix, row_documents = synthetic_corpus(args.documents, args.chunks, args.dims, args.distribution, args.seed)
+    queries = synthetic_queries(matrix, args.queries, args.seed)
+
+    exact_segments, quantized_segments = [], []
+    for document in range(args.documents):
+        rows = np.flatnonzero(row_documents == document)
+        document_matrix = matrix[rows]
+        chunk_ids = np.array([str(uuid.UUID(int=int(row))) for row in rows])
+        quantized, scales = quantize_rows_int8(document_matrix)
+        exact_segments.append(VectorSegment(str(document), document_matrix, chunk_ids))
+        quantized_segments.append(VectorSegment(str(document), document_matrix, chunk_ids, quantized, scales))
+
+    exact_index = ModuleVectorIndex("benchmark", 0, exact_segments)
+    quantized_index = ModuleVectorIndex("benchmark", 0, quantized_segments)
+
+    # Document centroids for the coarse stage, as in document_summary
+    centroids = normalize_rows(np.vstack([segment.matrix.mean(axis=0) for segment in exact_segments]))
+
+    paths = [Measurement("exact float32")]
+    if quantized_index.is_quantized:
+        paths.append(Measurement("int8 + rescore"))
+    else:
+        print(f"⚠️ VECTOR_QUANTIZATION={VECTOR_QUANTIZATION}, skipping the int8 path")
+    coarse = Measurement(f"coarse (top {args.top_documents} docs)")
+    paths.append(coarse)
+
+    def coarse_search(query):
+        top = np.argsort(-(centroids @ query))[:args.top_documents]
+        return quantized_index.subset([str(document) for document in top]).search(query, limit=args.k)
+
+    tracemalloc.start()
+    for query in queries:
+        expected = exact_top_k(matrix, query, args.k)
+        for measurement in paths:
+            if measurement is coarse:
+                hits = measurement.time(coarse_search, query)
+            elif measurement.name == "exact float32":
+                hits = measurement.time(exact_index.search, query, limit=args.k)
+            else:
+                hits = measurement.time(quantized_index.search, query, limit=args.k)
+            measurement.add_recall(expected, {uuid.UUID(str(chunk_id)).int for chunk_id, _, _ in hits})
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\n⏱️ {args.queries} queries, recall@{args.k} against exact search")
+    for measurement in paths:
+        print(measurement.report())
+
+    index_bytes = sum(
+        segment.matrix.nbytes + segment.quantized.nbytes + segment.scales.nbytes
+        for segment in quantized_segments
+    )
+    print_memory(index_bytes, traced_peak)
+
+
+# === Database benchmark ===
+
+QUERY_MARKER = re.compile(r"benchmark-query-(\d+)")
+
+
+def make_stub_provider(queries: np.ndarray):
+    """Embeds benchmark queries as their synthetic vectors; other text gets hashed vectors"""
+    from app.services.embedding_provider import EmbeddingProvider
+    from app.utils.hashing_embedder import hash_embed
+
+    class StubEmbeddingProvider(EmbeddingProvider):
+        name = "benchmark-stub"
+
+        def supports(self, model: str) -> bool:
+            return True
+
+        def embed(self, texts, model, dimensions=None):
+            dims = queries.shape[1]
+            results = []
+            for text in texts:
+                match = QUERY_MARKER.search(text)
+                vector = queries[int(match.group(1))] if match else np.asarray(hash_embed([text], dims)[0])
+                results.append({'embedding': vector.tolist(), 'dimensions': dims, 'tokens': 0})
+            return results
+
+    return StubEmbeddingProvider()
+
+
+def create_benchmark_module(db, matrix: np.ndarray, row_documents: np.ndarray, generation: dict) -> dict:
+    """Write a module of EMBEDDED documents with the synthetic vectors; returns ids for cleanup"""
+    from app.models.user import User
+    from app.models.module import Module
+    from app.models.document import Document, ProcessingStatus
+    from app.crud.document_chunk import bulk_create_chunks
+    from app.crud.document_embedding import bulk_create_embeddings
+    from app.services.document_summary import compute_document_summary
+    from app.services.vector_index import bump_module_embedding_version
+
+    suffix = uuid.uuid4().hex[:12]
+    teacher = User(id=f"benchmark-{suffix}", hashed_password="!", role="teacher")
+    db.add(teacher)
+    db.flush()
+    module = Module(teacher_id=teacher.id, name=f"benchmark-{suffix}", access_code=f"bench-{suffix}")
+    db.add(module)
+    db.commit()
+
+    chunk_ids = [None] * len(matrix)
+    document_ids = []
+    for document in range(int(row_documents.max()) + 1):
+        doc = Document(
+            title=f"Benchmark document {document}",
+            file_name=f"benchmark_{document}.txt",
+            file_hash=f"{suffix}{document:08d}",
+            file_type="txt",
+            teacher_id=teacher.id,
+            module_id=module.id,
+            storage_path="",
+            processing_status=ProcessingStatus.EMBEDDED
+        )
+        db.add(doc)
+        db.commit()
+        document_ids.append(doc.id)
+
+        rows = np.flatnonzero(row_documents == document)
+        chunks = bulk_create_chunks(db, str(doc.id), [
+            {'text': f"Synthetic chunk {row} of benchmark document {document}", 'index': i, 'token_count': 10}
+            for i, row in enumerate(rows)
+        ])
+        bulk_create_embeddings(db, [
+            {
+                'chunk_id': chunk.id,
+                'document_id': doc.id,
+                'embedding_vector': matrix[row].tolist(),
+                'embedding_model': generation['embedding_model'],
+                'embedding_dimensions': generation['embedding_dimensions'],
+                'token_count': 10
+            }
+            for chunk, row in zip(chunks, rows)
+        ])
+        compute_document_summary(db, doc.id, generation)
+        for chunk, row in zip(chunks, rows):
+            chunk_ids[row] = chunk.id
+
+    bump_module_embedding_version(db, module.id)
+    return {'teacher_id': teacher.id, 'module_id': module.id, 'document_ids': document_ids, 'chunk_ids': chunk_ids}
+
+
+def delete_benchmark_module(db, created: dict) -> None:
+    from app.models.user import User
+    from app.models.module import Module
+    from app.models.document import Document
+    from app.services.vector_index import remove_document_index, invalidate_module_index
+
+    for document in db.query(Document).filter(Document.module_id == created['module_id']).all():
+        remove_document_index(document)
+    # Chunks, embeddings and summaries cascade with their document
+    db.query(Document).filter(Document.module_id == created['module_id']).delete(synchronize_session=False)
+    db.query(Module).filter(Module.id == created['module_id']).delete(synchronize_session=False)
+    db.query(User).filter(User.id == created['teacher_id']).delete(synchronize_session=False)
+    db.commit()
+    invalidate_module_index(str(created['module_id']))
+
+
+def benchmark_database(args) -> None:
+    from app.database import SessionLocal
+    from app.core.config import VECTOR_SEARCH_BACKEND
+    from app.services.embedding import search_similar_chunks, search_similar_chunks_in_module
+    from app.services.embedding_generation import get_active_generation
+    from app.services.embedding_provider import set_embedding_provider_override
+    from app.services.rag_retriever import get_context_for_feedback
+
+    db = SessionLocal()
+    created = None
+    distractors = None
+    try:
+        # Vectors are written into the active generation so every search path finds them
+        generation = get_active_generation(db)
+        dims = generation['embedding_dimensions']
+        if args.dims and args.dims != dims:
+            print(f"❌ --database uses the active generation's {dims} dimensions (got --dims {args.dims})")
+            return
+        print(f"🧬 Generation: {generation['embedding_model']} ({dims} dims), backend: {VECTOR_SEARCH_BACKEND}")
+
+        matrix, row_documents = synthetic_corpus(args.documents, args.chunks, dims, args.distribution, args.seed)
+        queries = synthetic_queries(matrix, args.queries, args.seed)
+        set_embedding_provider_override(make_stub_provider(queries))
+
+        start = time.perf_counter()
+        created = create_benchmark_module(db, matrix, row_documents, generation)
+        print(f"📦 Created module {created['module_id']} in {time.perf_counter() - start:.1f}s")
+
+        if args.distractor_documents:
+            # Other tenants' rows in the same table: scoped searches must still fill the top-k
+            other_matrix, other_documents = synthetic_corpus(
+                args.distractor_documents, args.chunks, dims, args.distribution, args.seed + 1
+            )
+            start = time.perf_counter()
+            distractors = create_benchmark_module(db, other_matrix, other_documents, generation)
+            print(f"📦 Created distractor module {distractors['module_id']} ({len(other_matrix)} chunks) "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+        module_id = str(created['module_id'])
+        chunk_ids = created['chunk_ids']
+
+        # The first module search builds per-worker caches; report it separately
+        warmup = Measurement("first module search (cold caches)")
+        warmup.time(search_similar_chunks_in_module, db, "benchmark-warmup", module_id, limit=args.k)
+        print(warmup.report())
+
+        module_search = Measurement("search_similar_chunks_in_module")
+        document_search = Measurement("search_similar_chunks (1 document)")
+        context = Measurement("get_context_for_feedback")
+
+        tracemalloc.start()
+        for i, query in enumerate(queries):
+            expected = exact_top_k(matrix, query, args.k)
+            expected_ids = {chunk_ids[row] for row in expected}
+
+            results = module_search.time(
+                search_similar_chunks_in_module, db, f"benchmark-query-{i}", module_id, limit=args.k
+            )
+            module_search.add_recall(expected_ids, {result['chunk_id'] for result in results})
+
+            document = int(row_documents[next(iter(expected))])
+            document_rows = np.flatnonzero(row_documents == document)
+            document_expected = {
+                chunk_ids[document_rows[row]] for row in exact_top_k(matrix[document_rows], query, args.k)
+            }
+            results = document_search.time(
+                search_similar_chunks, db, f"benchmark-query-{i}",
+                document_id=str(created['document_ids'][document]), limit=args.k
+            )
+            document_search.add_recall(document_expected, {result['chunk_id'] for result in results})
+
+            context.time(
+                get_context_for_feedback,
+                db=db,
+                question_text=f"benchmark-query-{i}",
+                student_answer="",
+                module_id=module_id,
+                max_chunks=args.k,
+                similarity_threshold=0.0
+            )
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"\n⏱️ {args.queries} queries, recall@{args.k} against exact search")
+        for measurement in (module_search, document_search, context):
+            print(measurement.report())
+        print_memory(matrix.nbytes, traced_peak)
+
+    finally:
+        set_embedding_provider_override(None)
+        if distractors is not None and not args.keep:
+            db.rollback()
+            delete_benchmark_module(db, distractors)
+        if created is not None:
+            if args.keep:
+                print(f"\n📌 Kept module {created['module_id']} (--keep)")
+            else:
+                db.rollback()
+                delete_benchmark_module(db, created)
+                print(f"\n🧹 Deleted benchmark module {created['module_id']}")
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval on synthetic modules")
+    parser.add_argument("--documents", type=int, default=50, help="Documents per module")
+    parser.add_argument("--chunks", type=int, default=40, help="Chunks per document")
+    parser.add_argument("--dims", type=int, default=None,
+                        help="Vector dimensions (in-process default 512; --database uses the active generation)")
+    parser.add_argument("--distribution", choices=["clustered", "random"], default="clustered")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--top-documents", type=int, default=8, help="Documents kept by the coarse stage (in-process)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", action="store_true", help="Benchmark against the configured Postgres")
+    parser.add_argument("--backend", choices=["pgvector", "numpy"], default=None,
+                        help="VECTOR_SEARCH_BACKEND for --database (default: from config)")
+    parser.add_argument("--use-retrieval-cache", action="store_true",
+                        help="Keep the retrieval result cache on (off by default so every query searches)")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark module after a --database run")
+    parser.add_argument("--distractor-documents", type=int, default=0,
+                        help="--database: also write a second module of this many documents (other tenants' rows)")
+    args = parser.parse_args()
+
+    # Config is read at import time, so set it before importing app modules
+    if args.backend:
+        os.environ["VECTOR_SEARCH_BACKEND"] = args.backend
+    if not args.use_retrieval_cache:
+        os.environ["RETRIEVAL_CACHE_SIZE"] = "0"
+
+    print(f"🔬 {args.documents} documents x {args.chunks} chunks, {args.distribution} vectors, seed {args.seed}")
+
+    if args.database:
+        benchmark_database(args)
+    else:
+        args.dims = args.dims or 512
+        print(f"📐 {args.dims} dimensions, in-process module index")
+        benchmark_in_process(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Script to check the recall of int8 first-pass search against exact float32 search
+Scores a module's embeddings (or synthetic vectors) both ways and reports recall@k
+
+Usage:
+    python scripts/check_quantization_recall.py --module-id <uuid>
+    python scripts/check_quantization_recall.py --synthetic 20000
+"""
+import sys
+import os
+import argparse
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.vector_index import (
+    VectorSegment,
+    ModuleVectorIndex,
+    normalize_rows,
+    top_positions,
+)
+from app.utils.vector_codec import quantize_rows_int8
+
+
+def load_module_matrix(module_id: str) -> np.ndarray:
+    """Read all retrievable embeddings of a module as a normalized float32 matrix"""
+    from app.database import SessionLocal
+    from app.services.vector_index import build_module_index, get_module_embedding_version
+
+    db = SessionLocal()
+    try:
+        version = get_module_embedding_version(db, module_id)
+        if version is None:
+            raise SystemExit(f"❌ Module {module_id} not found")
+        index = build_module_index(db, module_id, version=version)
+        if len(index) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack([np.asarray(segment.matrix) for segment in index.segments])
+    finally:
+        db.close()
+
+
+def synthetic_matrix(rows: int, dims: int, seed: int) -> np.ndarray:
+    """Clustered random vectors, closer to real embeddings than pure noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(rows // 50, 1), dims)).astype(np.float32)
+    assignments = rng.integers(0, len(centers), rows)
+    matrix = centers[assignments] + 0.5 * rng.standard_normal((rows, dims)).astype(np.float32)
+    return normalize_rows(matrix)
+
+
+def check_recall(matrix: np.ndarray, queries: int, k: int, rescore_factor: int, seed: int) -> dict:
+    """Compare int8 first pass + exact rescore against exact top-k"""
+    quantized, scales = quantize_rows_int8(matrix)
+    chunk_ids = np.array([str(i) for i in range(len(matrix))])
+    segment = VectorSegment("synthetic", matrix, chunk_ids, quantized, scales)
+    index = ModuleVectorIndex("recall-check", 0, [segment])
+
+    rng = np.random.default_rng(seed + 1)
+    # Queries are perturbed corpus rows, like real questions about the material
+    picks = rng.integers(0, len(matrix), queries)
+    query_matrix = normalize_rows(
+        matrix[picks] + 0.3 * rng.standard_normal((queries, matrix.shape[1])).astype(np.float32)
+    )
+
+    first_pass_hits = 0
+    rescored_hits = 0
+    for query in query_matrix:
+        exact = set(top_positions(matrix @ query, k).tolist())
+
+        approximate_scores = segment.approximate_scores(query)
+        first_pass = set(top_positions(approximate_scores, k).tolist())
+        first_pass_hits += len(exact & first_pass)
+
+        candidates = top_positions(approximate_scores, k * rescore_factor)
+        rescored = candidates[np.argsort(-(matrix[candidates] @ query))[:k]]
+        rescored_hits += len(exact & set(rescored.tolist()))
+
+    total = queries * k
+    return {
+        'rows': len(matrix),
+        'dimensions': matrix.shape[1],
+        'float32_bytes': matrix.nbytes,
+        'int8_bytes': quantized.nbytes + scales.nbytes,
+        'index_quantized': index.is_quantized,
+        'recall_first_pass': first_pass_hits / total,
+        'recall_rescored': rescored_hits / total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check int8 quantization recall@k")
+    parser.add_argument("--module-id", help="Module whose embeddings to test")
+    parser.add_argument("--synthetic", type=int, default=10000, help="Synthetic row count if no module is given")
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.module_id:
+        print(f"📥 Loading embeddings for module {args.module_id}")
+        matrix = load_module_matrix(args.module_id)
+    else:
+        print(f"🧪 Generating {args.synthetic} synthetic vectors ({args.dims} dims)")
+        matrix = synthetic_matrix(args.synthetic, args.dims, args.seed)
+
+    if len(matrix) == 0:
+        print("❌ No embeddings found")
+        return
+
+    stats = check_recall(matrix, args.queries, args.k, args.rescore_factor, args.seed)
+
+    print(f"\n📊 {stats['rows']} vectors x {stats['dimensions']} dims")
+    print(f"   float32: {stats['float32_bytes'] / 1024 / 1024:.1f} MB, int8: {stats['int8_bytes'] / 1024 / 1024:.1f} MB")
+    print(f"   recall@{args.k} int8 only:               {stats['recall_first_pass']:.4f}")
+    print(f"   recall@{args.k} int8 + rescore (x{args.rescore_factor}): {stats['recall_rescored']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Worker process for queued AI feedback jobs
+Claims jobs from the feedback_jobs table (FOR UPDATE SKIP LOCKED) and
+generates feedback with several jobs in flight; claimed answers of one
+submission are graded together (up to FEEDBACK_GROUP_SIZE per LLM call).
+Run as many worker processes or containers as needed; each job is
+processed by exactly one of them. Set FEEDBACK_WORKER_ENABLED=true on the
+web app once a worker (or a periodic `--once`, e.g. from cron) runs; that
+turns off the app's in-process draining (FEEDBACK_QUEUE_INLINE_DRAIN),
+which otherwise only runs after submissions and batch requests.
+
+In the backend image:
+    docker run --env-file .env <image> python scripts/feedback_worker.py
+
+Stops claiming on SIGTERM/SIGINT and exits once in-flight jobs finish
+(jobs of a killed worker are reclaimed when their lease expires).
+
+Usage:
+    python scripts/feedback_worker.py
+    python scripts/feedback_worker.py --parallelism 8
+    python scripts/feedback_worker.py --once    # drain runnable jobs and exit
+"""
+import sys
+import os
+import argparse
+import logging
+import signal
+import threading
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import FEEDBACK_WORKER_PARALLELISM, FEEDBACK_WORKER_POLL_SECONDS
+from app.services.feedback_memo import flush_memo_hits
+from app.services.feedback_queue import drain_feedback_jobs, run_feedback_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued AI feedback jobs")
+    parser.add_argument("--parallelism", type=int, default=FEEDBACK_WORKER_PARALLELISM,
+                        help="Job groups (one submission, up to FEEDBACK_GROUP_SIZE answers) processed concurrently")
+    parser.add_argument("--poll-interval", type=float, default=FEEDBACK_WORKER_POLL_SECONDS,
+                        help="Seconds between polls when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="Process runnable jobs, then exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s")
+
+    if args.once:
+        counts = drain_feedback_jobs(parallelism=args.parallelism)
+        flush_memo_hits()
+        print(f"🎉 Done! {counts['succeeded']} jobs succeeded, {counts['failed']} failed")
+        return
+
+    stop_event = threading.Event()
+
+    def stop(signum, frame):
+        print(f"🛑 Received signal {signum}, finishing in-flight jobs...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    run_feedback_worker(parallelism=args.parallelism, poll_seconds=args.poll_interval, stop_event=stop_event)
+    flush_memo_hits()
+
+
+if __name__ == "__main__":
+    main()
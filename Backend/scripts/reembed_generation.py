@@ -0,0 +1,152 @@
+"""
+Script to re-embed all retrievable chunks into a new embedding generation
+(e.g. text-embedding-3-small at 512 dimensions) and switch retrieval to it
+
+Retrieval keeps reading the current active generation while the backfill
+runs. Catch-up passes pick up documents uploaded in the meantime, then the
+switch happens in one transaction. Web workers keep the previous active
+generation cached for up to ACTIVE_GENERATION_TTL_SECONDS, so the script
+waits that long and then repeats catch-up passes until nothing embedded
+during the switch window is missing from the new generation.
+
+Usage:
+    EMBED_MODEL=text-embedding-3-small EMBED_DIMENSIONS=512 python scripts/reembed_generation.py
+    python scripts/reembed_generation.py --model text-embedding-3-small --dimensions 256
+    python scripts/reembed_generation.py --no-switch        # backfill only
+    python scripts/reembed_generation.py --prune-retired    # delete retired generations' rows
+"""
+import sys
+import os
+import argparse
+import time
+from typing import Optional
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import ACTIVE_GENERATION_TTL_SECONDS
+from app.database import SessionLocal
+from app.services.embedding import generate_embeddings_for_document
+from app.services.embedding_generation import (
+    get_target_generation,
+    get_active_generation,
+    start_generation,
+    activate_generation,
+    find_documents_missing_generation,
+    ensure_generation_vector_index,
+    prune_retired_generations,
+    invalidate_active_generation,
+)
+
+MAX_CATCH_UP_PASSES = 5
+# Margin on top of the workers' generation cache TTL before the final passes
+SWITCH_GRACE_SECONDS = 5
+
+
+def backfill_pass(db, generation, batch_size: Optional[int]) -> int:
+    """Embed every retrievable chunk still missing from the generation; returns chunks remaining before the pass"""
+    missing = find_documents_missing_generation(db, generation)
+    remaining = sum(count for _, count in missing)
+
+    print(f"📋 {len(missing)} documents / {remaining} chunks missing from generation {generation['id']}")
+
+    for document_id, count in missing:
+        print(f"   📄 {document_id}: {count} chunks")
+        try:
+            generate_embeddings_for_document(
+                db=db,
+                document_id=str(document_id),
+                batch_size=batch_size,
+                generation=generation
+            )
+        except Exception as e:
+            db.rollback()
+            print(f"   ❌ Error: {str(e)}")
+
+    return remaining
+
+
+def reembed(model: str, dimensions: int, batch_size: Optional[int], switch: bool) -> None:
+    db = SessionLocal()
+
+    try:
+        active = get_active_generation(db)
+        print(f"🧬 Active generation: {active['embedding_model']} ({active['embedding_dimensions']} dims)")
+        print(f"🎯 Target generation: {model} ({dimensions} dims)\n")
+
+        if (active['embedding_model'], active['embedding_dimensions']) == (model, dimensions):
+            generation = active
+            print("✅ Target is already active, running a catch-up pass only")
+            backfill_pass(db, generation, batch_size)
+            return
+
+        generation = start_generation(db, model, dimensions)
+        ensure_generation_vector_index(db, dimensions)
+
+        # Backfill, then catch up with documents uploaded meanwhile
+        for pass_number in range(1, MAX_CATCH_UP_PASSES + 1):
+            print(f"\n🔁 Pass {pass_number}")
+            if backfill_pass(db, generation, batch_size) == 0:
+                break
+        else:
+            remaining = sum(count for _, count in find_documents_missing_generation(db, generation))
+            if remaining:
+                print(f"\n❌ {remaining} chunks still missing after {MAX_CATCH_UP_PASSES} passes, not switching")
+                return
+
+        if not switch:
+            print("\n⏸️ Backfill complete, leaving the generation in 'building' (--no-switch)")
+            return
+
+        activate_generation(db, generation['id'])
+        invalidate_active_generation()
+
+        # Until their cached copy expires, web workers still embed uploads into the old
+        # generation only; wait that out, then catch up until nothing is missing
+        wait_seconds = ACTIVE_GENERATION_TTL_SECONDS + SWITCH_GRACE_SECONDS
+        print(f"\n⏳ Waiting {wait_seconds}s for workers to pick up the new generation")
+        time.sleep(wait_seconds)
+
+        active = get_active_generation(db)
+        for pass_number in range(1, MAX_CATCH_UP_PASSES + 1):
+            print(f"\n🔁 Final catch-up pass {pass_number}")
+            if backfill_pass(db, active, batch_size) == 0:
+                break
+        else:
+            remaining = sum(count for _, count in find_documents_missing_generation(db, active))
+            if remaining:
+                print(f"\n⚠️ {remaining} chunks still missing from the new generation; "
+                      f"re-run this script to catch up (documents are retrievable again once embedded)")
+                return
+
+        print("\n🎉 Done! Old generation is retired; run with --prune-retired to delete its rows")
+
+    finally:
+        db.close()
+
+
+def main():
+    target_model, target_dimensions = get_target_generation()
+
+    parser = argparse.ArgumentParser(description="Re-embed chunks into a new embedding generation")
+    parser.add_argument("--model", default=target_model)
+    parser.add_argument("--dimensions", type=int, default=target_dimensions)
+    parser.add_argument("--batch-size", type=int, default=None, help="Max chunks per request (default: token-packed)")
+    parser.add_argument("--no-switch", action="store_true", help="Backfill without activating")
+    parser.add_argument("--prune-retired", action="store_true", help="Delete embeddings of retired generations and exit")
+    args = parser.parse_args()
+
+    if args.prune_retired:
+        db = SessionLocal()
+        try:
+            deleted = prune_retired_generations(db)
+            print(f"🗑️ Deleted {deleted} embeddings of retired generations")
+        finally:
+            db.close()
+        return
+
+    reembed(args.model, args.dimensions, args.batch_size, switch=not args.no_switch)
+
+
+if __name__ == "__main__":
+    main()
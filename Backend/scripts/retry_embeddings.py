@@ -8,6 +8,7 @@ from app.models.document_chunk import DocumentChunk
 from app.models.document_embedding import DocumentEmbedding
 from app.services.embedding import generate_embeddings_for_document
 from app.services.document_status import update_document_status
+from app.services.embedding_generation import get_active_generation
 
 
 def retry_embeddings_for_all_documents():
@@ -45,8 +46,7 @@ def retry_embeddings_for_all_documents():
                     # Generate embeddings
                     new_embeddings = generate_embeddings_for_document(
                         db=db,
-                        document_id=str(doc.id),
-                        batch_size=100
+                        document_id=str(doc.id)
                     )
 
                     if new_embeddings > 0:
@@ -57,7 +57,7 @@ def retry_embeddings_for_all_documents():
                             ProcessingStatus.EMBEDDED,
                             {
                                 'embedding_count': new_embeddings,
-                                'embedding_model': 'text-embedding-ada-002'
+                                'embedding_model': get_active_generation(db)['embedding_model']
                             }
                         )
                         print(f"   ✅ Created {new_embeddings} embeddings\n")